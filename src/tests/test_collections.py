@@ -14,7 +14,25 @@ import unittest
 from collections.abc import MutableMapping
 from random import shuffle
 
-from xotl.tools.future.collections import DefaultDict, RankedDict, defaultdict
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from xotl.tools.future.collections import (
+    BitPascalSet,
+    CompactPascalSet,
+    DefaultDict,
+    LockedDefaultDict,
+    LockedRankedCache,
+    LockedRankedDict,
+    PascalSet,
+    RankedCache,
+    RankedDict,
+    RoaringPascalSet,
+    defaultdict,
+    ranked_cache,
+)
 
 
 class TestDefaultDict(unittest.TestCase):
@@ -33,6 +51,39 @@ class TestDefaultDict(unittest.TestCase):
             d["abc"]
 
 
+class TestLockedDefaultDict(unittest.TestCase):
+    def test_threads(self):
+        from threading import Lock, Thread
+        from time import sleep
+
+        calls = []
+        lock = Lock()
+
+        def factory(key, d):
+            with lock:
+                calls.append(key)
+            sleep(0.001)
+            return key * 2
+
+        d = LockedDefaultDict(factory)
+
+        def target():
+            for i in range(100):
+                self.assertEqual(d[i % 20], 2 * (i % 20))
+
+        threads = [Thread(target=target) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(calls), list(range(20)))
+        self.assertEqual(LockedDefaultDict(lambda: 1)["a"], 1)
+        again = pickle.loads(pickle.dumps(LockedDefaultDict(list, a=[1])))
+        self.assertEqual(type(again), LockedDefaultDict)
+        self.assertEqual(again["b"], [])
+        self.assertEqual(again, {"a": [1], "b": []})
+
+
 class TestDefaultDictAlias(unittest.TestCase):
     def test_defaultdict(self):
         d = defaultdict(lambda key, _: "a")
@@ -102,27 +153,53 @@ def test_stacked_dict():
         assert False, "Level 0 cannot be poped. It should have raised a TypeError"
 
 
+def test_stacked_dict_read_cache():
+    from xotl.tools.future.collections import StackedDict
+
+    class CachedDict(StackedDict):
+        __read_cache__ = True
+
+    sd = CachedDict(a="level-0")
+    assert sd["a"] == "level-0"
+    sd.push_level(a=1, b=2)
+    assert sd["a"] == 1
+    assert sd.get("c") is None
+    sd["c"] = 3
+    assert sd["c"] == 3
+    sd.push_level(b=4)
+    assert (sd["a"], sd["b"], sd["c"]) == (1, 4, 3)
+    del sd["b"]
+    assert sd["b"] == 2
+    sd.pop_level()
+    sd.pop_level()
+    assert sd["a"] == "level-0"
+    assert "b" not in sd and "c" not in sd
+    assert sd.a == "level-0"
+
+
 class TestRankedDict(unittest.TestCase):
+    dict_type = RankedDict
+
     def test_init(self):
         with self.assertRaises(TypeError):
             # too many args
-            RankedDict([("a", 1), ("b", 2)], None)
+            self.dict_type([("a", 1), ("b", 2)], None)
         pairs = [("a", 1), ("b", 2), ("c", 3), ("d", 4), ("e", 5)]
         # dict input
-        self.assertEqual(sorted(RankedDict(dict(pairs)).items()), pairs)
+        self.assertEqual(sorted(self.dict_type(dict(pairs)).items()), pairs)
         # kwds input
-        self.assertEqual(sorted(RankedDict(**dict(pairs)).items()), pairs)
+        self.assertEqual(sorted(self.dict_type(**dict(pairs)).items()), pairs)
         # pairs input
-        self.assertEqual(list(RankedDict(pairs).items()), pairs)
+        self.assertEqual(list(self.dict_type(pairs).items()), pairs)
         # mixed input
         self.assertNotEqual(
-            list(RankedDict([("a", 1), ("b", 2), ("c", 9), ("d", 4)], c=3, e=5).items()),
+            list(self.dict_type([("a", 1), ("b", 2), ("c", 9), ("d", 4)], c=3, e=5).items()),
             pairs,
         )
 
         # Make sure that direct calls to __init__ do not clear previous
         # contents
-        d = RankedDict([("a", 1), ("b", 2), ("c", 3), ("d", 44), ("e", 55)])
+        d = self.dict_type([("a", 1), ("b", 2), ("c", 3), ("d", 44), ("e", 55)])
         d.__init__([("f", 6), ("e", 5)], d=4)
         self.assertEqual(
             list(d.items()),
@@ -132,34 +209,34 @@ class TestRankedDict(unittest.TestCase):
     def test_update(self):
         with self.assertRaises(TypeError):
             # too many args
-            RankedDict().update([("a", 1), ("b", 2)], None)
+            self.dict_type().update([("a", 1), ("b", 2)], None)
         pairs = [("a", 1), ("b", 2), ("c", 3), ("d", 4), ("e", 5)]
-        od = RankedDict()
+        od = self.dict_type()
         od.update(dict(pairs))
         # dict input
         self.assertEqual(sorted(od.items()), pairs)
-        od = RankedDict()
+        od = self.dict_type()
         od.update(**dict(pairs))
         # kwds input
         self.assertEqual(sorted(od.items()), pairs)
-        od = RankedDict()
+        od = self.dict_type()
         od.update(pairs)
         # pairs input
         self.assertEqual(list(od.items()), pairs)
-        od = RankedDict()
+        od = self.dict_type()
         od.update([("a", 1), ("b", 2), ("c", 9), ("d", 4)], c=3, e=5)
         # mixed input
         self.assertNotEqual(list(od.items()), pairs)
 
         # Issue 9137: Named argument called 'other' or 'self'
         # shouldn't be treated specially.
-        od = RankedDict()
+        od = self.dict_type()
         od.update(self=23)
         self.assertEqual(list(od.items()), [("self", 23)])
-        od = RankedDict()
+        od = self.dict_type()
         od.update(other={})
         self.assertEqual(list(od.items()), [("other", {})])
-        od = RankedDict()
+        od = self.dict_type()
         od.update(red=5, blue=6, other=7, self=8)
         self.assertEqual(
             sorted(list(od.items())),
@@ -167,20 +244,20 @@ class TestRankedDict(unittest.TestCase):
         )
 
     def test_abc(self):
-        self.assertIsInstance(RankedDict(), MutableMapping)
-        self.assertTrue(issubclass(RankedDict, MutableMapping))
+        self.assertIsInstance(self.dict_type(), MutableMapping)
+        self.assertTrue(issubclass(self.dict_type, MutableMapping))
 
     def test_clear(self):
         pairs = [("c", 1), ("b", 2), ("a", 3), ("d", 4), ("e", 5), ("f", 6)]
         shuffle(pairs)
-        od = RankedDict(pairs)
+        od = self.dict_type(pairs)
         self.assertEqual(len(od), len(pairs))
         od.clear()
         self.assertEqual(len(od), 0)
 
     def test_delitem(self):
         pairs = [("c", 1), ("b", 2), ("a", 3), ("d", 4), ("e", 5), ("f", 6)]
-        od = RankedDict(pairs)
+        od = self.dict_type(pairs)
         del od["a"]
         self.assertNotIn("a", od)
         with self.assertRaises(KeyError):
@@ -188,7 +265,7 @@ class TestRankedDict(unittest.TestCase):
         self.assertEqual(list(od.items()), pairs[:2] + pairs[3:])
 
     def test_setitem(self):
-        od = RankedDict([("d", 1), ("b", 2), ("c", 3), ("a", 4), ("e", 5)])
+        od = self.dict_type([("d", 1), ("b", 2), ("c", 3), ("a", 4), ("e", 5)])
         od["c"] = 10  # existing element
         od["f"] = 20  # new element
         self.assertEqual(
@@ -199,7 +276,7 @@ class TestRankedDict(unittest.TestCase):
     def test_iterators(self):
         pairs = [("c", 1), ("b", 2), ("a", 3), ("d", 4), ("e", 5), ("f", 6)]
         shuffle(pairs)
-        od = RankedDict(pairs)
+        od = self.dict_type(pairs)
         self.assertEqual(list(od), [t[0] for t in pairs])
         self.assertEqual(list(od.keys()), [t[0] for t in pairs])
         self.assertEqual(list(od.values()), [t[1] for t in pairs])
@@ -209,17 +286,35 @@ class TestRankedDict(unittest.TestCase):
     def test_popitem(self):
         pairs = [("c", 1), ("b", 2), ("a", 3), ("d", 4), ("e", 5), ("f", 6)]
         shuffle(pairs)
-        od = RankedDict(pairs)
+        od = self.dict_type(pairs)
         while pairs:
             self.assertEqual(od.popitem(), pairs.pop())
         with self.assertRaises(KeyError):
             od.popitem()
         self.assertEqual(len(od), 0)
 
+    def test_ranks(self):
+        od = self.dict_type.fromkeys("abcdef")
+        od.rank("e", "b")
+        self.assertEqual(list(od), list("ebacdf"))
+        od.swap_ranks(("e", "f"), c="a")
+        self.assertEqual(list(od), list("fbcade"))
+        self.assertEqual(od.popitem(2), ("c", None))
+        self.assertEqual(od.popitem(-2), ("d", None))
+        od["x"] = 1
+        self.assertEqual(od.popitem(1), ("b", None))
+        self.assertEqual(od.popitem(0), ("f", None))
+        self.assertEqual(list(od), list("aex"))
+        self.assertEqual(list(reversed(od)), list("xea"))
+        with self.assertRaises(IndexError):
+            od.popitem(3)
+        with self.assertRaises(KeyError):
+            od.rank("z")
+
     def test_pop(self):
         pairs = [("c", 1), ("b", 2), ("a", 3), ("d", 4), ("e", 5), ("f", 6)]
         shuffle(pairs)
-        od = RankedDict(pairs)
+        od = self.dict_type(pairs)
         shuffle(pairs)
         while pairs:
             k, v = pairs.pop()
@@ -230,7 +325,7 @@ class TestRankedDict(unittest.TestCase):
         self.assertEqual(od.pop(k, 12345), 12345)
 
         # make sure pop still works when __missing__ is defined
-        class Missing(RankedDict):
+        class Missing(self.dict_type):
             def __missing__(self, key):
                 return 0
 
@@ -244,26 +339,26 @@ class TestRankedDict(unittest.TestCase):
     def test_equality(self):
         pairs = [("c", 1), ("b", 2), ("a", 3), ("d", 4), ("e", 5), ("f", 6)]
         shuffle(pairs)
-        od1 = RankedDict(pairs)
-        od2 = RankedDict(pairs)
+        od1 = self.dict_type(pairs)
+        od2 = self.dict_type(pairs)
         # same order implies equality
         self.assertEqual(od1, od2)
         pairs = pairs[2:] + pairs[:2]
-        od2 = RankedDict(pairs)
+        od2 = self.dict_type(pairs)
         # different order implies inequality
         self.assertNotEqual(od1, od2)
         # comparison to regular dict is not order sensitive
         self.assertEqual(od1, dict(od2))
         self.assertEqual(dict(od2), od1)
         # different length implied inequality
-        self.assertNotEqual(od1, RankedDict(pairs[:-1]))
+        self.assertNotEqual(od1, self.dict_type(pairs[:-1]))
 
     def test_copying(self):
         # Check that ranked dicts are copyable, deepcopyable, picklable,
         # and have a repr/eval round-trip
         pairs = [("c", 1), ("b", 2), ("a", 3), ("d", 4), ("e", 5), ("f", 6)]
-        od = RankedDict(pairs)
-        update_test = RankedDict()
+        od = self.dict_type(pairs)
+        update_test = self.dict_type()
         update_test.update(od)
         for _i, dup in enumerate([
             od.copy(),
@@ -275,7 +370,7 @@ class TestRankedDict(unittest.TestCase):
             pickle.loads(pickle.dumps(od, -1)),
             eval(repr(od)),
             update_test,
-            RankedDict(od),
+            self.dict_type(od),
         ]):
             self.assertTrue(dup is not od)
             self.assertEqual(dup, od)
@@ -288,30 +383,31 @@ class TestRankedDict(unittest.TestCase):
         # dump() feature.
         # In yaml, lists are native but tuples are not.
         pairs = [("c", 1), ("b", 2), ("a", 3), ("d", 4), ("e", 5), ("f", 6)]
-        od = RankedDict(pairs)
+        od = self.dict_type(pairs)
         # yaml.dump(od) -->
         # '!!python/object/apply:__main__.RankedDict\n- - [a, 1]\n  - [b, 2]\n'
         self.assertTrue(all(type(pair) is list for pair in od.__reduce__()[1]))
 
     def test_repr(self):
-        od = RankedDict([("c", 1), ("b", 2), ("a", 3)])
-        self.assertEqual(repr(od), "RankedDict([('c', 1), ('b', 2), ('a', 3)])")
+        name = self.dict_type.__name__
+        od = self.dict_type([("c", 1), ("b", 2), ("a", 3)])
+        self.assertEqual(repr(od), name + "([('c', 1), ('b', 2), ('a', 3)])")
         self.assertEqual(eval(repr(od)), od)
-        self.assertEqual(repr(RankedDict()), "RankedDict()")
+        self.assertEqual(repr(self.dict_type()), name + "()")
 
     def test_repr_recursive(self):
         # See issue #9826
-        od = RankedDict.fromkeys("abc")
+        od = self.dict_type.fromkeys("abc")
         od["x"] = od
         self.assertEqual(
             repr(od),
-            ("RankedDict([('a', None), ('b', None), ('c', None), ('x', ...)])"),
+            self.dict_type.__name__ + "([('a', None), ('b', None), ('c', None), ('x', ...)])",
         )
 
     def test_setdefault(self):
         pairs = [("c", 1), ("b", 2), ("a", 3), ("d", 4), ("e", 5), ("f", 6)]
         shuffle(pairs)
-        od = RankedDict(pairs)
+        od = self.dict_type(pairs)
         pair_order = list(od.items())
         self.assertEqual(od.setdefault("a", 10), 3)
         # make sure order didn't change
@@ -321,7 +417,7 @@ class TestRankedDict(unittest.TestCase):
         self.assertEqual(list(od.items())[-1], ("x", 10))
 
         # make sure setdefault still works when __missing__ is defined
-        class Missing(RankedDict):
+        class Missing(self.dict_type):
             def __missing__(self, key):
                 return 0
 
@@ -330,7 +426,7 @@ class TestRankedDict(unittest.TestCase):
     def test_reinsert(self):
         # Given insert a, insert b, delete a, re-insert a,
         # verify that a is now later than b.
-        od = RankedDict()
+        od = self.dict_type()
         od["a"] = 1
         od["b"] = 2
         del od["a"]
@@ -338,7 +434,7 @@ class TestRankedDict(unittest.TestCase):
         self.assertEqual(list(od.items()), [("b", 2), ("a", 1)])
 
     def test_move_to_end(self):
-        od = RankedDict.fromkeys("abcde")
+        od = self.dict_type.fromkeys("abcde")
         self.assertEqual(list(od), list("abcde"))
         od.move_to_end("c")
         self.assertEqual(list(od), list("abdec"))
@@ -356,15 +452,143 @@ class TestRankedDict(unittest.TestCase):
         # Wimpy test: Just verify the reported size is larger than a regular
         # dict
         d = dict(a=1)
-        od = RankedDict(**d)
+        od = self.dict_type(**d)
         self.assertGreater(sys.getsizeof(od), sys.getsizeof(d))
 
 
+class TestLockedRankedDict(TestRankedDict):
+    dict_type = LockedRankedDict
+
+    def test_threads(self):
+        from random import randint
+        from threading import Thread
+
+        d = self.dict_type()
+
+        def target():
+            for i in range(2000):
+                key = randint(0, 100)
+                d[key] = i
+                d.get(randint(0, 100))
+                d.pop(randint(0, 100), None)
+                try:
+                    d.move_to_end(key)
+                except KeyError:
+                    pass  # popped by other thread
+                list(d)
+
+        threads = [Thread(target=target) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(d), sorted(dict(d.items())))
+        self.assertEqual(list(reversed(d)), list(d)[::-1])
+
+
+class TestRankedCache(unittest.TestCase):
+    cache_type = RankedCache
+
+    def test_lru(self):
+        evicted = []
+        cache = self.cache_type(3, on_evict=lambda k, v: evicted.append((k, v)))
+        cache.update(a=1, b=2, c=3)
+        self.assertEqual(cache["a"], 1)
+        self.assertIsNone(cache.get("x"))
+        cache["d"] = 4
+        self.assertEqual(list(cache), ["c", "a", "d"])
+        self.assertEqual(evicted, [("b", 2)])
+        self.assertEqual(tuple(cache.cache_info()), (1, 1, 1, 3, 3))
+        self.assertEqual(cache.peek("c"), 3)
+        del cache["c"]
+        self.assertEqual(list(cache.items()), [("a", 1), ("d", 4)])
+        self.assertEqual(evicted, [("b", 2)])
+        with self.assertRaises(KeyError):
+            cache["c"]
+        cache.cache_clear()
+        self.assertEqual(tuple(cache.cache_info()), (0, 0, 0, 3, 0))
+
+    def test_lfu(self):
+        cache = self.cache_type(3, policy="lfu")
+        cache.update(a=1, b=2, c=3)
+        cache["a"], cache["a"], cache["c"]
+        cache["d"] = 4
+        self.assertEqual(list(cache), ["a", "c", "d"])
+        cache["e"] = 5
+        self.assertEqual(list(cache), ["a", "c", "e"])
+        with self.assertRaises(ValueError):
+            self.cache_type(3, policy="mru")
+
+    def test_ttl(self):
+        now = 0
+        cache = self.cache_type(10, ttl=5, timer=lambda: now)
+        cache["a"] = 1
+        now = 3
+        cache["b"] = 2
+        now = 6
+        self.assertNotIn("a", cache)
+        self.assertIn("b", cache)
+        self.assertEqual(cache.expire(), 1)
+        self.assertEqual(list(cache), ["b"])
+        now = 9
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.cache_info().evictions, 2)
+
+    def test_copying(self):
+        cache = self.cache_type(3, policy="lfu")
+        cache.update([("c", 1), ("b", 2), ("a", 3)])
+        for dup in (cache.copy(), copy.deepcopy(cache), pickle.loads(pickle.dumps(cache))):
+            self.assertEqual(type(dup), type(cache))
+            self.assertEqual(list(dup.items()), list(cache.items()))
+            self.assertEqual((dup.capacity, dup.policy), (3, "lfu"))
+
+    def test_decorator(self):
+        calls = []
+
+        @ranked_cache(2, locked=self.cache_type is LockedRankedCache)
+        def square(x):
+            calls.append(x)
+            return x * x
+
+        self.assertIsInstance(square.cache, self.cache_type)
+        self.assertEqual([square(i) for i in (2, 3, 2, 4, 3)], [4, 9, 4, 16, 9])
+        self.assertEqual(calls, [2, 3, 4, 3])
+        self.assertEqual(tuple(square.cache_info()), (1, 4, 2, 2, 2))
+        square.cache_clear()
+        self.assertEqual(square.cache_info().size, 0)
+
+
+class TestLockedRankedCache(TestRankedCache):
+    cache_type = LockedRankedCache
+
+    def test_threads(self):
+        from random import randint
+        from threading import Thread
+
+        cache = self.cache_type(50)
+
+        def target():
+            for i in range(2000):
+                cache[randint(0, 100)] = i
+                cache.get(randint(0, 100))
+
+        threads = [Thread(target=target) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        info = cache.cache_info()
+        self.assertEqual(len(list(cache)), 50)
+        self.assertEqual(info.hits + info.misses, 8000)
+
+
 class TestPascalSet(unittest.TestCase):
+    set_type = PascalSet
+
     def test_consistency(self):
         from random import randint
 
-        from xotl.tools.future.collections import PascalSet
+        PascalSet = self.set_type
 
         count = 5
         for test in range(count):
@@ -393,8 +617,184 @@ class TestPascalSet(unittest.TestCase):
             self.assertGreaterEqual(s1, s1 - s2)
             self.assertGreaterEqual(s1, ss1 - ss2)
 
+    def test_invalid_values(self):
+        PascalSet = self.set_type
+
+        with self.assertRaises(TypeError):
+            PascalSet([1.5])
+        with self.assertRaises(TypeError):
+            PascalSet(["a"])
+        with self.assertRaises(TypeError):
+            PascalSet.from_sorted([3, 1, "a"])
+        with self.assertRaises(TypeError):
+            PascalSet().discard("a")
+        s1 = PascalSet([1, 2])
+        with self.assertRaises(TypeError):
+            s1.discard(2.0)
+        self.assertEqual(s1, {1, 2})
+
+    def test_merged_intervals(self):
+        from random import randint
+
+        PascalSet = self.set_type
+
+        for test in range(50):
+            ss1 = {randint(-30, 60) for _ in range(randint(0, 40))}
+            ss2 = {randint(-30, 60) for _ in range(randint(0, 40))}
+            ss3 = {randint(-30, 60) for _ in range(randint(0, 40))}
+            s1, s2 = PascalSet(ss1), PascalSet(ss2)
+            # Results must keep the canonical (coalesced) layout of intervals.
+            self.assertEqual((s1 | s2)._items, PascalSet(sorted(ss1 | ss2))._items)
+            self.assertEqual((s1 & s2)._items, PascalSet(sorted(ss1 & ss2))._items)
+            self.assertEqual((s1 - s2)._items, PascalSet(sorted(ss1 - ss2))._items)
+            self.assertEqual((s1 ^ s2)._items, PascalSet(sorted(ss1 ^ ss2))._items)
+            self.assertEqual(s1.union(s2, ss3), ss1 | ss2 | ss3)
+            self.assertEqual(s1.intersection(s2, ss3), ss1 & ss2 & ss3)
+            self.assertEqual(s1.difference(s2, ss3), ss1 - ss2 - ss3)
+            self.assertEqual(s1.symmetric_difference(ss2), ss1 ^ ss2)
+
+    def test_cardinality(self):
+        PascalSet = self.set_type
+
+        s1 = PascalSet[-5:1, 9, 15:18]
+        self.assertEqual(len(s1), 10)
+        self.assertEqual(list(s1), [-5, -4, -3, -2, -1, 0, 9, 15, 16, 17])
+        s1.add(9)
+        s1.add(1)
+        self.assertEqual(len(s1), 11)
+        s1.discard(-3)
+        s1.discard(100)
+        self.assertEqual(len(s1), 10)
+        s1.pop()
+        self.assertEqual(len(s1), 9)
+        s1 |= PascalSet[0:20]
+        self.assertEqual(len(s1), len(set(s1)))
+        s1 ^= PascalSet[10:30]
+        self.assertEqual(len(s1), len(set(s1)))
+        s1.clear()
+        self.assertEqual(len(s1), 0)
+
+    def test_from_sorted(self):
+        PascalSet = self.set_type
+
+        s1 = PascalSet.from_sorted(iter([-3, -2, -1, 0, 0, 1, 5, 7, 8, 9]))
+        self.assertIs(type(s1), PascalSet)
+        self.assertEqual(str(s1), "{-3..1, 5, 7..9}")
+        self.assertEqual(len(s1), 9)
+        # Out of order values fallback to the general path
+        s2 = PascalSet.from_sorted([1, 2, 3, 10, 11, 2, 4, 30, 5])
+        self.assertEqual(str(s2), "{1..5, 10, 11, 30}")
+        self.assertEqual(len(s2), 8)
+        self.assertFalse(PascalSet.from_sorted([]))
+        with self.assertRaises(TypeError):
+            PascalSet.from_sorted([1, 2, "3"])
+
+    def test_rank_and_select(self):
+        PascalSet = self.set_type
+
+        s1 = PascalSet[1:4, 9, 15:18]
+        members = list(s1)
+        for value in range(-2, 20):
+            self.assertEqual(s1.rank(value), sum(1 for i in members if i < value))
+        for index in range(-len(members), len(members)):
+            self.assertEqual(s1.select(index), members[index])
+        with self.assertRaises(IndexError):
+            s1.select(len(members))
+        self.assertEqual(s1.count_range(2, 15), 4)
+        self.assertEqual(s1.count_range(15, 2), 0)
+        self.assertEqual(list(s1.iter_range(2, 15)), [2, 3, 9, 15])
+        s1.add(10)
+        self.assertEqual(s1.rank(16), 6)
+        self.assertEqual(s1.select(4), 10)
+
+    def test_contains_many(self):
+        PascalSet = self.set_type
+
+        s1 = PascalSet[-5:1, 9, 15:18]
+        values = [-6, -5, 0, 1, 9, 10, 14, 15, 17, 18, -5, "x"]
+        flags = [v in s1 for v in values]
+        self.assertEqual(list(s1.contains_many(values)), flags)
+        ordered = sorted(values[:-1])
+        self.assertEqual(list(s1.contains_many(ordered)), [v in s1 for v in ordered])
+        self.assertEqual(s1.filter(iter(values)), [-5, 0, 9, 15, 17, -5])
+        self.assertEqual(PascalSet().contains_many(values), bytearray(len(values)))
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_contains_many_numpy(self):
+        PascalSet = self.set_type
+
+        s1 = PascalSet[-5:1, 9, 15:18]
+        values = numpy.array([-6, -5, 0, 1, 9, 10, 14, 15, 17, 18, -5])
+        flags = [v in s1 for v in values.tolist()]
+        self.assertEqual(s1.contains_many(values).tolist(), flags)
+        self.assertEqual(s1.filter(values).tolist(), [-5, 0, 9, 15, 17, -5])
+        self.assertFalse(PascalSet().contains_many(values).any())
+
+    def test_binary_format(self):
+        import mmap
+        import tempfile
+
+        PascalSet = self.set_type
+
+        s1 = PascalSet[-5:1, 9, 15:18, 2**40 : 2**40 + 3]
+        data = s1.to_bytes()
+        s2 = PascalSet.from_buffer(data)
+        self.assertEqual(s1, s2)
+        self.assertEqual(len(s2), len(s1))
+        self.assertEqual(s2.rank(16), 8)
+        for again in (pickle.loads(pickle.dumps(s2)), copy.deepcopy(s2), copy.copy(s2)):
+            self.assertEqual(type(again), PascalSet)
+            self.assertEqual(again, s1)
+            self.assertEqual(len(again), len(s1))
+        with tempfile.TemporaryFile() as f:
+            f.write(b"prefix" + data)
+            f.flush()
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            s3 = PascalSet.from_buffer(buffer, 6)
+            self.assertEqual(s3, s1)
+            self.assertEqual(s3 | PascalSet[100], s1 | PascalSet[100])
+            # Changes are private
+            s3.add(100)
+            s3.pop()
+            self.assertEqual(s3, (s1 | PascalSet[100]) - PascalSet[-5])
+            self.assertEqual(PascalSet.from_buffer(buffer, 6), s1)
+            del s3
+            buffer.close()
+        with self.assertRaises(ValueError):
+            PascalSet.from_buffer(data[:-1])
+        with self.assertRaises(ValueError):
+            PascalSet.from_buffer(b"garbage" + data)
+        with self.assertRaises(OverflowError):
+            PascalSet[2**70].to_bytes()
+
+    def test_comparisons(self):
+        PascalSet = self.set_type
+
+        s1 = PascalSet[-5:1, 9, 15:18]
+        s2 = PascalSet[-10:20]
+        h = hash(s1)
+        self.assertEqual(h, hash(frozenset(s1)))
+        self.assertEqual(hash(s1), h)
+        s1.add(100)
+        self.assertEqual(hash(s1), hash(frozenset(s1)))
+        s1.remove(100)
+        self.assertEqual(hash(s1), h)
+        self.assertTrue(s1 < s2 and s1 <= s2 and s2 > s1 and s2 >= s1)
+        self.assertFalse(s1 < s1 or s1 > s1)
+        self.assertTrue(s1 <= s1 and s1 >= s1 and s1 >= PascalSet())
+        self.assertFalse(PascalSet() < PascalSet())
+        self.assertFalse(s1.issubset(PascalSet[-5:1, 9, 15:17, 18:100]))
+        b1 = BitPascalSet(s1)
+        self.assertEqual(s1, b1)
+        self.assertEqual(b1, s1)
+        self.assertTrue(s1.issubset(b1) and s1.issuperset(b1))
+        self.assertTrue(b1.issubset(s2) and not b1.issuperset(s2))
+        b1.add(63)
+        self.assertNotEqual(s1, b1)
+        self.assertTrue(s1 < b1)
+
     def test_syntax_sugar(self):
-        from xotl.tools.future.collections import PascalSet
+        PascalSet = self.set_type
 
         s1 = PascalSet[1:4, 9, 15:18]
         s2 = PascalSet[3:18]
@@ -403,7 +803,7 @@ class TestPascalSet(unittest.TestCase):
         self.assertEqual(list(PascalSet[3:18]), list(range(3, 18)))
 
     def test_operators(self):
-        from xotl.tools.future.collections import PascalSet
+        PascalSet = self.set_type
 
         g = lambda s: (i for i in s)
         s1 = PascalSet[1:4, 9, 15:18]
@@ -438,7 +838,7 @@ class TestPascalSet(unittest.TestCase):
 
     def test_errors(self):
         """Test that stacked.pop has the same semantics has dict.pop."""
-        from xotl.tools.future.collections import PascalSet
+        PascalSet = self.set_type
 
         s1 = PascalSet[1:4, 9, 15:18]
         s2 = PascalSet(s1, 20)
@@ -461,11 +861,32 @@ class TestPascalSet(unittest.TestCase):
         self.assertEqual(state, "ok")
 
 
+class TestCompactPascalSet(TestPascalSet):
+    set_type = CompactPascalSet
+
+    def test_storage(self):
+        from array import array
+
+        s1 = CompactPascalSet[1:4, 9, 15:18]
+        self.assertIsInstance(s1._items, array)
+        self.assertIsInstance((s1 | PascalSet[20:30])._items, array)
+        self.assertEqual(s1, PascalSet[1:4, 9, 15:18])
+        self.assertEqual(PascalSet[1:4, 9, 15:18], s1)
+        view = s1.as_memoryview()
+        self.assertEqual(view.tolist(), [1, 3, 9, 9, 15, 17])
+        self.assertTrue(view.readonly)
+        view.release()
+        with self.assertRaises(OverflowError):
+            CompactPascalSet(2**64)
+
+
 class TestBitPascalSet(unittest.TestCase):
+    set_type = BitPascalSet
+
     def test_consistency(self):
         from random import randint
 
-        from xotl.tools.future.collections import BitPascalSet
+        BitPascalSet = self.set_type
 
         count = 5
         for test in range(count):
@@ -494,8 +915,48 @@ class TestBitPascalSet(unittest.TestCase):
             self.assertGreaterEqual(s1, s1 - s2)
             self.assertGreaterEqual(s1, ss1 - ss2)
 
+    def test_cardinality(self):
+        BitPascalSet = self.set_type
+
+        s1 = BitPascalSet[1:4, 9, 15:180]
+        self.assertEqual(len(s1), 169)
+        s1.add(9)
+        s1.add(1000)
+        self.assertEqual(len(s1), 170)
+        s1.discard(2)
+        s1.discard(-100)
+        self.assertEqual(len(s1), 169)
+        self.assertIn(s1.pop(), set(range(1, 1001)))
+        self.assertEqual(len(s1), 168)
+        s1 &= {1, 3, 9, 1000, 2000}
+        self.assertEqual(len(s1), len(set(s1)))
+        s1 ^= BitPascalSet[0:10]
+        self.assertEqual(len(s1), len(set(s1)))
+        s1.clear()
+        self.assertEqual(len(s1), 0)
+
+    def test_binary_format(self):
+        s1 = BitPascalSet[-70, 1:4, 9, 15:180]
+        s2 = BitPascalSet.from_buffer(s1.to_bytes())
+        self.assertEqual(s1, s2)
+        self.assertEqual(len(s2), len(s1))
+        s2.add(1000)
+        self.assertIn(1000, s2)
+        with self.assertRaises(ValueError):
+            PascalSet.from_buffer(s1.to_bytes())
+
+    def test_chunks(self):
+        BitPascalSet = self.set_type
+
+        members = [-70, -1, 0, 1, 61, 62, 63, 200, 2**70]
+        s1 = BitPascalSet(members)
+        self.assertEqual(list(s1), members)
+        self.assertEqual([i for chunk in s1.iter_chunks() for i in chunk], members)
+        self.assertEqual(len(list(s1.iter_chunks())), 6)
+        self.assertEqual(BitPascalSet(members[:-1]).to_array().tolist(), members[:-1])
+
     def test_syntax_sugar(self):
-        from xotl.tools.future.collections import BitPascalSet
+        BitPascalSet = self.set_type
 
         s1 = BitPascalSet[1:4, 9, 15:18]
         s2 = BitPascalSet[3:18]
@@ -504,7 +965,7 @@ class TestBitPascalSet(unittest.TestCase):
         self.assertEqual(list(BitPascalSet[3:18]), list(range(3, 18)))
 
     def test_operators(self):
-        from xotl.tools.future.collections import BitPascalSet
+        BitPascalSet = self.set_type
 
         g = lambda s: (i for i in s)
         s1 = BitPascalSet[1:4, 9, 15:18]
@@ -539,7 +1000,7 @@ class TestBitPascalSet(unittest.TestCase):
 
     def test_errors(self):
         """Test that stacked.pop has the same semantics has dict.pop."""
-        from xotl.tools.future.collections import BitPascalSet
+        BitPascalSet = self.set_type
 
         s1 = BitPascalSet[1:4, 9, 15:18]
         s2 = BitPascalSet(s1, 20)
@@ -562,6 +1023,38 @@ class TestBitPascalSet(unittest.TestCase):
         self.assertEqual(state, "ok")
 
 
+class TestRoaringPascalSet(TestBitPascalSet):
+    set_type = RoaringPascalSet
+
+    def test_chunks(self):
+        members = [-70000, -1, 0, 1, 65536, 2**70]
+        s1 = RoaringPascalSet(members)
+        self.assertEqual(list(s1), members)
+        self.assertEqual(list(s1.iter_chunks()), [[-70000], [-1], [0, 1], [65536], [2**70]])
+        self.assertEqual(RoaringPascalSet(members[:-1]).to_array().tolist(), members[:-1])
+
+    def test_containers(self):
+        from array import array
+
+        s1 = RoaringPascalSet(range(0, 65536, 2), 70000, range(140000, 200000))
+        self.assertEqual(len(s1), 32768 + 1 + 60000)
+        self.assertIsInstance(s1._items[0], bytearray)
+        self.assertIsInstance(s1._items[1], array)
+        self.assertIsInstance(s1._items[2], tuple)
+        self.assertIn(65534, s1)
+        self.assertNotIn(65535, s1)
+        self.assertIn(70000, s1)
+        self.assertIn(199999, s1)
+        self.assertNotIn(200000, s1)
+        s1 -= RoaringPascalSet[0:60000]
+        self.assertEqual(len(s1), 2768 + 1 + 60000)
+        self.assertIsInstance(s1._items[0], array)
+        s1 |= RoaringPascalSet[0:70001]
+        self.assertEqual(s1._items[0], (0, 65535))
+        self.assertEqual(s1, PascalSet[0:70001, 140000:200000])
+        self.assertEqual(str(s1), "{0..70000, 140000..199999}")
+
+
 class TestCodeDict(unittest.TestCase):
     def test_formatter(self):
         from xotl.tools.future.collections import codedict
@@ -603,6 +1096,192 @@ def test_opendict():
     assert dict(bar) == {"spam": Bar.spam}
 
 
+def test_opendict_attributes():
+    from xotl.tools.future.collections import opendict
+
+    d = opendict({"a-b": 1, "c": 3, "keys": 4})
+    assert d.a_b == 1 and d.c == 3
+    assert callable(d.keys)
+    d["x y"] = 5
+    assert d.x_y == 5
+    d["a_b"] = 2
+    assert d.a_b == 2
+    del d["a_b"]
+    assert d.a_b == 1
+    del d["c"]
+    assert not hasattr(d, "c")
+    d.pop("x y")
+    d["z"] = 6
+    assert d.z == 6
+    assert not hasattr(d, "x_y")
+    d.update(w=7)
+    assert d.w == 7
+    assert sorted(~d) == ["a_b", "keys", "w", "z"]
+
+
+def test_record_batch():
+    from xotl.tools.future.collections import RecordBatch, RecordRow, opendict
+
+    batch = RecordBatch(["name", "age", "e-mail"], [("John", 30, "j@x")], typecodes={"age": "l"})
+    batch.append(dict(name="Jane", age=28, extra=1, **{"e-mail": "k@x"}))
+    assert len(batch) == 2
+    row = batch[-1]
+    assert isinstance(row, RecordRow)
+    assert (row.name, row["age"], row.e_mail) == ("Jane", 28, "k@x")
+    assert row == {"name": "Jane", "age": 28, "e-mail": "k@x"}
+    assert ~row == {"name": "name", "age": "age", "e_mail": "e-mail"}
+    row.age = 29
+    row["name"] = "Jo"
+    assert batch.column("age").tolist() == [30, 29]
+    assert list(batch.rows())[1] == ("Jo", 29, "k@x")
+    try:
+        row.other = 1
+    except AttributeError:
+        pass
+    else:
+        assert False, "Should have raised an AttributeError"
+    try:
+        batch.append(("Bob",))
+    except ValueError:
+        pass
+    else:
+        assert False, "Should have raised a ValueError"
+    try:
+        batch.append({"name": "Bob", "age": "x", "e-mail": "b@x"})
+    except TypeError:
+        pass
+    else:
+        assert False, "Should have raised a TypeError"
+    assert len(batch) == 2 and all(len(batch.column(key)) == 2 for key in batch.keys)
+    assert copy.copy(row) == row and copy.copy(row)._batch is batch
+    again = pickle.loads(pickle.dumps(row))
+    assert type(again) is RecordRow and again == row and len(again._batch) == 2
+
+    dicts = batch.to_dicts()
+    assert all(type(d) is opendict for d in dicts)
+    assert dicts[0].e_mail == "j@x"
+    again = RecordBatch.from_dicts(dicts)
+    assert again.keys == batch.keys
+    assert [dict(r) for r in again] == [dict(r) for r in batch]
+    assert batch[1:].to_dicts() == dicts[1:]
+    assert len(RecordBatch.from_dicts([])) == 0
+
+
+def test_smart_dict_search():
+    import pickle
+
+    from xotl.tools.future.collections import IndexedSmartDict, SmartDict
+
+    data = {"db_host": 1, "db_port": 2, "db": 3, "debug": 4, "x_db_user": 5}
+    for cls in (SmartDict, IndexedSmartDict):
+        d = cls(data)
+        assert d.search("^db_") == {"db_host": 1, "db_port": 2}
+        assert type(d.search("^db_")) is cls
+        assert d.search("^db_p.*$") == {"db_port": 2}
+        assert d.search("^d?b") == {"db_host": 1, "db_port": 2, "db": 3}
+        assert d.search("db_") == {"db_host": 1, "db_port": 2, "x_db_user": 5}
+        assert d.search("^(db|debug)$") == {"db": 3, "debug": 4}
+        view = d.search("^db_", lazy=True)
+        assert len(view) == 2 and "db_host" in view and "db" not in view
+        d["db_name"] = 6
+        del d["db_host"]
+        assert dict(view) == {"db_port": 2, "db_name": 6}
+        try:
+            view["db"]
+        except KeyError:
+            pass
+        else:
+            assert False, "Should have raised a KeyError"
+
+    d = IndexedSmartDict(data)
+    d.pop("db_port")
+    d.setdefault("db_a", 0)
+    d |= {"db_b": 1}
+    merged = d | {"db_c": 2}
+    assert type(merged) is IndexedSmartDict and merged._index == sorted(merged)
+    assert list(d.search("^db_")) == ["db_a", "db_b", "db_host"]
+    assert d._index == sorted(d)
+    d.popitem()
+    assert d._index == sorted(d)
+    again = pickle.loads(pickle.dumps(d))
+    assert type(again) is IndexedSmartDict and again == d
+    assert again._index == sorted(again)
+    d.clear()
+    assert d.search("^db") == {} and d._index == []
+
+
+def test_stacked_dict_snapshot():
+    import pickle
+
+    from xotl.tools.future.collections import StackedDict
+    from xotl.tools.symbols import Unset
+
+    sd = StackedDict(a=1, b=2)
+    first = sd.snapshot()
+    sd.push_level(a=10, c=3)
+    second = sd.snapshot()
+    del sd["a"]
+    sd["b"] = 20
+    assert dict(first) == {"a": 1, "b": 2} and len(first) == 2
+    assert dict(second) == {"a": 10, "b": 2, "c": 3} and len(second) == 3
+    assert sd.diff(first) == {"b": (2, 20), "c": (Unset, 3)}
+    assert sd.diff(second) == {"a": (10, 1), "b": (2, 20)}
+    sd.pop_level()
+    assert sd.diff(first) == {}
+    assert sd.diff(second) == {"a": (10, 1), "c": (3, Unset)}
+    assert "c" not in first and first["a"] == 1
+    try:
+        sd.diff(StackedDict().snapshot())
+    except ValueError:
+        pass
+    else:
+        assert False, "Should have raised a ValueError"
+
+    # Copies don't change the snapshots of the original
+    again = pickle.loads(pickle.dumps(sd))
+    again["a"] = 100
+    assert sd.diff(first) == {} and again.snapshot()["a"] == 100
+
+
+def test_bulk_update():
+    from xotl.tools.future.collections import (
+        OrderedSmartDict,
+        RankedCache,
+        RankedDict,
+        SmartDict,
+        StackedDict,
+    )
+    from xotl.tools.symbols import Unset
+
+    class Doubled(dict):
+        def __getitem__(self, key):
+            return 2 * super().__getitem__(key)
+
+    for cls in (SmartDict, OrderedSmartDict, RankedDict, StackedDict):
+        d = cls({"a": 1}, Doubled(b=1), [("c", 1), ("d", 1)], ("e", 1), f=1)
+        assert dict(d) == {"a": 1, "b": 2, "c": 1, "d": 1, "e": 1, "f": 1}
+
+    rd = RankedDict(a=1, b=2, c=3)
+    rd.popitem(1)  # builds the positional index
+    rd.update({"a": 10, "d": 4}, [("c", 30)])
+    assert list(rd) == ["a", "d", "c"] and list(reversed(rd)) == ["c", "d", "a"]
+    assert rd._index in (None, ["a", "d", "c"])
+    rd.update(rd)
+    assert list(rd.items()) == [("a", 10), ("d", 4), ("c", 30)]
+    assert rd.popitem(1) == ("d", 4) and rd.popitem() == ("c", 30)
+
+    cache = RankedCache(2)
+    cache.update({1: 1, 2: 2, 3: 3})
+    assert list(cache) == [2, 3]
+
+    sd = StackedDict(a=1)
+    sd.push_level()
+    snapshot = sd.snapshot()
+    sd.update({"a": 2, "b-c": 3})
+    assert sd.peek() == {"a": 2, "b-c": 3} and sd.b_c == 3
+    assert sd.diff(snapshot) == {"a": (1, 2), "b-c": (Unset, 3)}
+
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main(verbosity=2)
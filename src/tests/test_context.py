@@ -86,6 +86,18 @@ def test_stacking_of_data_does_not_leak():
         pass
 
 
+def test_reading_after_changes():
+    with context("A", a=1) as c:
+        assert c["a"] == 1
+        with context("A", a=2):
+            assert c["a"] == 2
+            del c["a"]
+            assert c["a"] == 1
+            c["a"] = 3
+            assert c["a"] == 3
+        assert c["a"] == 1
+
+
 def test_data_is_an_opendict():
     c1 = object()
     with context(c1, a=1, b=1) as cc1:
@@ -222,3 +234,57 @@ def test_greenlet_contexts():
 
     root = greenlet.greenlet(run=loop_determ)
     root.switch(5)
+
+
+def test_contextvars_storage():
+    import asyncio
+
+    from xotl.tools.context import use_contextvars
+
+    async def request(i):
+        with context("REQUEST", id=i) as c:
+            await asyncio.sleep(0)
+            assert context["REQUEST"]["id"] == i
+            c["step"] = 1
+            with context("REQUEST", id=-i) as c2:
+                assert c2 is c
+                await asyncio.sleep(0)
+                assert (c["id"], c["step"], c.level) == (-i, 1, 2)
+            await asyncio.sleep(0)
+            assert (c["id"], c["step"], c.level) == (i, 1, 1)
+        assert "REQUEST" not in context
+
+    async def main():
+        with context("APP", debug=True):
+            await asyncio.gather(*(request(i) for i in range(10)))
+            assert context["APP"]["debug"]
+            assert list(context) == ["APP"]
+
+    use_contextvars()
+    try:
+        asyncio.run(main())
+        assert not list(context)
+    finally:
+        use_contextvars(False)
+
+
+def test_context_snapshot():
+    from xotl.tools.context import use_contextvars
+    from xotl.tools.symbols import Unset
+
+    def check(name):
+        with context(name, a=1, b=2) as c:
+            snap = c.snapshot()
+            with context(name, a=10, c=3):
+                c["b"] = 20
+                assert dict(snap) == {"a": 1, "b": 2}
+                assert c.diff(snap) == {"a": (1, 10), "b": (2, 20), "c": (Unset, 3)}
+            assert c.diff(snap) == {}
+            assert dict(snap) == {"a": 1, "b": 2}
+
+    check("SNAPSHOT")
+    use_contextvars()
+    try:
+        check("SNAPSHOT-VARS")
+    finally:
+        use_contextvars(False)
@@ -13,6 +13,7 @@ import pickle
 import pytest
 from hypothesis import given, settings, strategies
 from xotl.tools.future.datetime import (
+    WEEKDAY,
     DateTimeSpan,
     EmptyTimeSpan,
     TimeSpan,
@@ -87,6 +88,57 @@ def test_daterange_invalid_step():
         daterange(None, date(1978, 10, 21), 0)
 
 
+@given(
+    strategies.dates(min_value=date(1900, 1, 1), max_value=date(2100, 1, 1)),
+    strategies.integers(min_value=-70, max_value=70),
+    strategies.sampled_from([1, 2, 7, -1, -3]),
+)
+def test_daterange_ordinals(start, stop, step):
+    from xotl.tools.future.datetime import (
+        daterange_ordinals,
+        get_month_first_many,
+        get_month_last_many,
+        get_next_weekday_many,
+    )
+
+    dates = list(daterange(start, stop, step))
+    ordinals = daterange_ordinals(start, stop, step)
+    assert list(ordinals) == [d.toordinal() for d in dates]
+    assert list(get_month_first_many(ordinals)) == [get_month_first(d).toordinal() for d in dates]
+    assert list(get_month_last_many(ordinals)) == [get_month_last(d).toordinal() for d in dates]
+    assert list(get_next_weekday_many(ordinals, WEEKDAY.MONDAY)) == [
+        get_next_monday(d).toordinal() for d in dates
+    ]
+    assert list(get_next_weekday_many(ordinals, WEEKDAY.SUNDAY)) == [
+        get_next_sunday(d).toordinal() for d in dates
+    ]
+
+
+def test_daterange_datetime64():
+    numpy = pytest.importorskip("numpy")
+    from xotl.tools.future.datetime import (
+        daterange_datetime64,
+        daterange_ordinals,
+        get_month_first_many,
+        get_month_last_many,
+        get_next_weekday_many,
+    )
+
+    start = datetime(2020, 1, 30, 12)
+    days = daterange_datetime64(start, datetime(2020, 3, 2, 10))
+    ordinals = daterange_ordinals(start, datetime(2020, 3, 2, 10))
+    assert days.dtype == numpy.dtype("datetime64[D]")
+    assert [d.toordinal() for d in days.tolist()] == list(ordinals)
+    firsts = [date(2020, 1, 1)] * 2 + [date(2020, 2, 1)] * 29 + [date(2020, 3, 1)]
+    assert get_month_first_many(days).tolist() == firsts
+    assert get_month_last_many(days)[-3:].tolist() == [date(2020, 2, 29)] * 2 + [date(2020, 3, 31)]
+    fridays = [date(2020, 1, 31)] + [date(2020, 2, 7)] * 2
+    assert get_next_weekday_many(days[:3], WEEKDAY.FRIDAY).tolist() == fridays
+    values = numpy.array(ordinals, dtype=numpy.int64)
+    assert get_month_last_many(values).tolist() == list(get_month_last_many(ordinals))
+    assert get_next_weekday_many(values, 2).tolist() == list(get_next_weekday_many(ordinals, 2))
+
+
 @given(timespans(), timespans())
 def test_intersection_commutable(ts1, ts2):
     # Commutable
@@ -538,6 +590,47 @@ def add_dtspans(x, y):
         raise ValueError
 
 
+def test_parse_cache():
+    assert parse_date("2020-03-04") is parse_date("2020-03-04") == date(2020, 3, 4)
+    assert parse_datetime("2020-03-04 10:11") is parse_datetime("2020-03-04 10:11")
+    with pytest.raises(ValueError):
+        parse_date("2020-13-04")
+
+
+@given(
+    strategies.datetimes(min_value=datetime(1000, 1, 1)),
+    strategies.sampled_from([
+        "%Y-%m-%d",
+        "%Y-%m-%d %H:%M:%S",
+        "%Y-%m-%dT%H:%M:%S",
+        "%Y-%m-%dT%H:%M",
+        "%d/%m/%Y %H:%M",
+    ]),
+)
+def test_compiled_parsers(dt, fmt):
+    from xotl.tools.future.datetime import compile_date_parser, compile_datetime_parser
+
+    def parse(parser, value):
+        try:
+            return parser(value)
+        except ValueError:
+            return ValueError
+
+    def strptime(value):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            return ValueError
+
+    parse_date, parse_datetime = compile_date_parser(fmt), compile_datetime_parser(fmt)
+    value = dt.strftime(fmt)
+    assert parse_datetime(value) == strptime(value)
+    assert parse_date(value) == strptime(value).date()
+    # Same size and separators as the ISO formats, but not canonical.
+    for value in ("2020-02-30", "2020-3-4 10:1", "2020-03-04T1:02:03", "2020-03-04 10:1a:12"):
+        assert parse(parse_datetime, value) == strptime(value)
+
+
 def test_type_of_parse_date():
     assert isinstance(parse_date(), date)
 
@@ -672,5 +765,203 @@ def test_get_previous_sunday(ref: date):
     _assert_previous_WD(ref, get_previous_sunday, calendar.SUNDAY)
 
 
+@given(timespans(), timespans(), strategies.integers(min_value=-1000, max_value=1000))
+def test_frozen_timespans(ts1, ts2, delta):
+    from xotl.tools.future.datetime import FrozenTimeSpan
+
+    fs1, fs2 = FrozenTimeSpan(*ts1), FrozenTimeSpan(*ts2)
+    assert fs1 == ts1 and hash(fs1) == hash(ts1)
+    inter = fs1 & fs2
+    assert inter == ts1 & ts2
+    assert not inter or type(inter) is FrozenTimeSpan
+    assert fs1 & ts2 == ts1 & ts2
+    if ts1.bound and ts2.bound:
+        assert fs1.diff(fs2) == ts1.diff(ts2)
+    try:
+        shifted = ts1 << delta
+    except OverflowError:
+        pass
+    else:
+        assert fs1 << delta == shifted and type(fs1 << delta) is FrozenTimeSpan
+    assert pickle.loads(pickle.dumps(fs1)) == fs1
+    with pytest.raises(AttributeError):
+        fs1.start_date = None
+
+
+@given(datetimespans(), datetimespans())
+def test_frozen_datetimespans(dts1, dts2):
+    from xotl.tools.future.datetime import FrozenDateTimeSpan
+
+    fs1, fs2 = FrozenDateTimeSpan(*dts1), FrozenDateTimeSpan(*dts2)
+    assert fs1 == dts1 and hash(fs1) == hash(dts1)
+    assert (fs1.start_date, fs1.end_date) == (dts1.start_date, dts1.end_date)
+    assert fs1 & fs2 == dts1 & dts2
+    if dts1.bound and dts2.bound:
+        assert fs1.diff(fs2) == dts1.diff(dts2)
+    assert fs1.replace(end_datetime=None) == dts1.replace(end_datetime=None)
+    with pytest.raises(AttributeError):
+        fs1.end_datetime = None
+
+
+_day_offsets = strategies.integers(min_value=0, max_value=60)
+_spans = strategies.builds(
+    lambda start, end: TimeSpan(
+        None if start is None else date(2020, 1, 1) + timedelta(start),
+        None if end is None else date(2020, 1, 1) + timedelta(end),
+    ),
+    _day_offsets | strategies.none(),
+    _day_offsets | strategies.none(),
+)
+
+
+@given(strategies.lists(_spans, max_size=5), strategies.lists(_spans, max_size=5))
+def test_timespan_sets(spans1, spans2):
+    import operator
+
+    from xotl.tools.future.datetime import TimeSpanSet
+
+    days = [date(2020, 1, 1) + timedelta(i) for i in range(-3, 64)]
+    a, b = TimeSpanSet(*spans1), TimeSpanSet(*spans2)
+    assert all((d in a) == any(d in ts for ts in spans1 if ts.valid) for d in days)
+    assert all((d in b) == any(d in ts for ts in spans2 if ts.valid) for d in days)
+    ops = [
+        (operator.or_, operator.or_),
+        (operator.and_, operator.and_),
+        (operator.sub, lambda x, y: x and not y),
+        (operator.xor, operator.xor),
+    ]
+    for op, test in ops:
+        result = op(a, b)
+        assert all((d in result) == test(d in a, d in b) for d in days)
+        spans = list(result)
+        # sorted, disjoint and not adjacent
+        for first, second in zip(spans, spans[1:]):
+            assert first.end_date + timedelta(1) < second.start_date
+    assert all((d in ~a) != (d in a) for d in days)
+    assert ~~a == a
+    assert (a <= b) == all(d in b for d in days if d in a)
+    assert (a < b) == (a <= b and a != b)
+    assert (a & b) <= a <= (a | b)
+    assert a.isdisjoint(b) == (not any(d in a and d in b for d in days))
+    assert pickle.loads(pickle.dumps(a)) == a and hash(TimeSpanSet(*a)) == hash(a)
+
+
+def test_datetimespan_sets():
+    from xotl.tools.future.datetime import DateTimeSpanSet, FrozenTimeSpan, TimeSpanSet
+
+    a = DateTimeSpanSet(
+        DateTimeSpan("2020-01-01 10:00", "2020-01-01 12:00"),
+        DateTimeSpan("2020-01-01 12:00:01", "2020-01-01 13:00"),
+        date(2020, 1, 3),
+    )
+    assert list(a) == [
+        DateTimeSpan("2020-01-01 10:00", "2020-01-01 13:00"),
+        DateTimeSpan("2020-01-03 00:00", "2020-01-03 23:59:59"),
+    ]
+    assert datetime(2020, 1, 1, 11) in a and date(2020, 1, 3) in a
+    assert date(2020, 1, 1) not in a and datetime(2020, 1, 2) in ~a
+    assert list(~a)[0] == DateTimeSpan(None, "2020-01-01 09:59:59")
+    assert a - TimeSpan("2020-01-03", None) == DateTimeSpanSet(
+        DateTimeSpan("2020-01-01 10:00", "2020-01-01 13:00")
+    )
+
+    t = TimeSpanSet(TimeSpan("2020-01-01", "2020-01-02"))
+    assert list(DateTimeSpanSet(t)) == [DateTimeSpan("2020-01-01", "2020-01-02 23:59:59")]
+    assert date(2020, 1, 2) in DateTimeSpanSet(t)
+    assert a | t == DateTimeSpanSet(t, date(2020, 1, 3))
+    assert a & t == DateTimeSpanSet(a - date(2020, 1, 3))
+    assert a - t == DateTimeSpanSet(date(2020, 1, 3))
+    assert t & a == TimeSpanSet(date(2020, 1, 1))
+    assert t | a == TimeSpanSet(TimeSpan("2020-01-01", "2020-01-03"))
+    assert type(t & a) is TimeSpanSet and t - a == TimeSpanSet(date(2020, 1, 2))
+
+    # Sets are only equal to sets of the same kind.
+    assert t != TimeSpan("2020-01-01", "2020-01-02") and t != DateTimeSpanSet(t)
+    assert TimeSpanSet(date(2020, 1, 1)) != date(2020, 1, 1)
+    assert len({t, FrozenTimeSpan("2020-01-01", "2020-01-02"), DateTimeSpanSet(t)}) == 3
+    assert t == TimeSpanSet(t) and hash(t) == hash(TimeSpanSet(t))
+
+    # Microseconds are dropped, so there are no gaps between a set and its
+    # complement.
+    b = DateTimeSpanSet(
+        DateTimeSpan(datetime(2020, 1, 1, 10), datetime(2020, 1, 1, 10)),
+        DateTimeSpan(datetime(2020, 1, 1, 10, 0, 2, 500000), datetime(2020, 1, 1, 11, 0, 0, 200)),
+    )
+    assert list(b) == [
+        DateTimeSpan("2020-01-01 10:00", "2020-01-01 10:00"),
+        DateTimeSpan("2020-01-01 10:00:02", "2020-01-01 11:00"),
+    ]
+    assert all(span.valid for span in ~b)
+    moments = [
+        datetime(2020, 1, 1, 9, 59, 59) + timedelta(microseconds=i * 250000) for i in range(20)
+    ]
+    moments.append(datetime(2020, 1, 1, 11, 0, 0, 999999))
+    assert all((m in b) != (m in ~b) for m in moments)
+    assert datetime(2020, 1, 1, 10, 0, 1, 500000) in ~b and datetime(2020, 1, 1, 10, 0, 2, 100) in b
+    assert b - b == DateTimeSpanSet() and b ^ ~b == ~DateTimeSpanSet()
+    assert b <= ~~b and b.isdisjoint(~b)
+
+
+@given(
+    strategies.lists(_spans, max_size=20),
+    strategies.lists(strategies.booleans(), max_size=20),
+    _spans,
+    strategies.integers(min_value=-3, max_value=63),
+)
+def test_timespan_index(spans, removed, query, offset):
+    from xotl.tools.future.datetime import TimeSpanIndex
+
+    which = date(2020, 1, 1) + timedelta(offset)
+    items = [(ts, i) for i, ts in enumerate(spans) if ts.valid]
+    index = TimeSpanIndex(items[::2])
+    for ts, i in items[1::2]:
+        index.add(ts, i)
+    for (ts, i), remove in zip(list(items), removed):
+        if remove:
+            index.remove(ts, i)
+            items.remove((ts, i))
+    assert len(index) == len(items)
+    assert sorted(i for _, i in index) == [i for _, i in items]
+    if query.valid:
+        assert sorted(i for _, i in index.overlapping(query)) == [
+            i for ts, i in items if ts & query
+        ]
+    assert sorted(i for _, i in index.containing(which)) == [i for ts, i in items if which in ts]
+
+    def distance(ts):
+        if which in ts:
+            return 0
+        elif ts.end_date is not None and ts.end_date < which:
+            return (which - ts.end_date).days
+        else:
+            return (ts.start_date - which).days
+
+    nearest = index.nearest(which)
+    if items:
+        assert distance(nearest[0]) == min(distance(ts) for ts, _ in items)
+    else:
+        assert nearest is None
+    assert list(pickle.loads(pickle.dumps(index))) == list(index)
+    with pytest.raises(KeyError):
+        index.remove(TimeSpan("2019-01-01", "2019-01-02"))
+    with pytest.raises(ValueError):
+        index.add(TimeSpan("2020-01-02", "2020-01-01"))
+
+
+def test_datetimespan_index():
+    from xotl.tools.future.datetime import DateTimeSpanIndex
+
+    index = DateTimeSpanIndex([
+        (DateTimeSpan("2020-01-01 10:00", "2020-01-01 12:00"), "a"),
+        (TimeSpan("2020-01-02", "2020-01-02"), "b"),
+        (DateTimeSpan(None, "2020-01-01 09:00"), "c"),
+    ])
+    assert [v for _, v in index.containing(datetime(2020, 1, 2, 18))] == ["b"]
+    assert [v for _, v in index.containing(date(2020, 1, 1))] == ["c"]
+    assert [v for _, v in index.overlapping(date(2020, 1, 1))] == ["c", "a"]
+    assert index.nearest(datetime(2020, 1, 1, 13))[1] == "a"
+    assert index.nearest(datetime(2020, 1, 1, 23))[1] == "b"
+
+
 def test_doctests():
     run_module_doctest("xotl.tools.future.datetime")
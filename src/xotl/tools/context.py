@@ -9,12 +9,14 @@
 
 """A context manager for execution context flags."""
 
+from collections import ChainMap
 from collections.abc import Mapping
 
-from xotl.tools.future.collections import StackedDict
+from xotl.tools.future.collections import StackedDict, smart_iter_items
+from xotl.tools.symbols import Unset
 from xotl.tools.tasking import local
 
-__all__ = ("Context", "context", "NullContext")
+__all__ = ("Context", "context", "NullContext", "use_contextvars")
 
 
 class LocalData(local):
@@ -27,16 +29,73 @@ class LocalData(local):
 
 _data = LocalData()
 
+# When not None, the `~contextvars.ContextVar`:class: keeping the active
+# contexts of each task; see `use_contextvars`:func:.
+_contexts = None
+
+
+def use_contextvars(enabled=True):
+    """Select where active contexts are kept.
+
+    By default active contexts are kept in thread-local data (greenlet-local
+    if `greenlet` is used), so all asyncio tasks running in a thread share
+    them.  After calling this function, contexts are kept in a
+    `~contextvars.ContextVar`:class:: each task starts with the contexts of
+    the code creating it, and entering, leaving or changing a context is
+    only seen by the task doing it.
+
+    A change doesn't modify the levels other tasks could be seeing, it
+    creates a new snapshot of the context sharing the unchanged levels
+    (copy-on-write).  So there's no locking, and switching tasks doesn't
+    cost anything.
+
+    Call it at start-up, contexts active when the storage is changed are
+    lost.  Call it with `enabled` False to return to thread-local data.
+
+    .. versionadded:: 3.4.0
+
+    """
+    global _contexts
+    if enabled:
+        if _contexts is None:
+            from contextvars import ContextVar
+
+            _contexts = ContextVar("xotl.tools.context", default={})
+    else:
+        _contexts = None
+
+
+class _ContextState:
+    """The state of a context as seen by a task.
+
+    Only used with `use_contextvars`:func:.  States are never modified once
+    published: changes create a new state.  So the read cache (`flat`) is
+    never invalidated.
+
+    """
+
+    __slots__ = ("context", "inner", "count", "flat")
+
+    def __init__(self, context, inner, count):
+        self.context = context
+        self.inner = inner
+        self.count = count
+        self.flat = {}
+
 
 class MetaContext(type(StackedDict)):  # type: ignore
     def __len__(self):
-        return len(_data.contexts)
+        return len(_data.contexts if _contexts is None else _contexts.get())
 
     def __iter__(self):
-        return iter(_data.contexts)
+        return iter(_data.contexts if _contexts is None else _contexts.get())
 
     def __getitem__(self, name):
-        return _data.contexts.get(name, _null_context)
+        if _contexts is None:
+            return _data.contexts.get(name, _null_context)
+        else:
+            state = _contexts.get().get(name)
+            return _null_context if state is None else state.context
 
     def __contains__(self, name):
         """Basic support for the 'A in context' idiom."""
@@ -105,14 +164,19 @@ class Context(StackedDict, metaclass=MetaContext):
 
     """
 
-    __slots__ = ("name", "count")
+    __slots__ = ("name", "_count", "_state")
+
+    __read_cache__ = True
 
     def __new__(cls, name, **data):
         self = cls[name]
         if not self:  # if self is _null_context:
             self = super().__new__(cls)
+            object.__setattr__(self, "name", name)
+            if _contexts is not None:
+                state = _ContextState(self, ChainMap(), 0)
+                object.__setattr__(self, "_state", state)
             super(Context, self).__init__()
-            self.name = name
             self.count = 0
             # TODO: Redefine all event management
         return self(**data)
@@ -166,13 +230,149 @@ class Context(StackedDict, metaclass=MetaContext):
         self.push_level(**data)
         return self
 
+    # With `use_contextvars`:func: the levels and the count are kept in the
+    # state of the context in the current task; they are never modified, a
+    # new state is published instead.
+
+    def _get_state(self):
+        state = _contexts.get().get(self.name)
+        if state is None or state.context is not self:
+            # Not active in this task
+            state = self._state
+        return state
+
+    def _set_state(self, state):
+        registry = _contexts.get()
+        current = registry.get(self.name)
+        if current is not None and current.context is self:
+            registry = dict(registry)
+            if state.count:
+                registry[self.name] = state
+            else:
+                del registry[self.name]
+                object.__setattr__(self, "_state", state)
+            _contexts.set(registry)
+        elif state.count:
+            registry = dict(registry)
+            registry[self.name] = state
+            _contexts.set(registry)
+        else:
+            object.__setattr__(self, "_state", state)
+
+    @property
+    def inner(self):
+        if _contexts is None:
+            return StackedDict.inner.__get__(self, type(self))
+        else:
+            return self._get_state().inner
+
+    @inner.setter
+    def inner(self, value):
+        if _contexts is None:
+            StackedDict.inner.__set__(self, value)
+        else:
+            self._set_inner(value)
+
+    def _set_inner(self, value):
+        state = self._get_state()
+        self._set_state(_ContextState(self, value, state.count))
+
+    @property
+    def count(self):
+        if _contexts is None:
+            return self._count
+        else:
+            return self._get_state().count
+
+    @count.setter
+    def count(self, value):
+        if _contexts is None:
+            object.__setattr__(self, "_count", value)
+        else:
+            state = self._get_state()
+            self._set_state(_ContextState(self, state.inner, value))
+
+    def push_level(self, *args, **kwargs):
+        if _contexts is None:
+            return super().push_level(*args, **kwargs)
+        else:
+            # Fill the new level before publishing it.
+            self._set_inner(self.inner.new_child(dict(smart_iter_items(*args, **kwargs))))
+            return self.level
+
+    def pop_level(self):
+        if _contexts is None:
+            return super().pop_level()
+        else:
+            stack = self.inner
+            if len(stack.maps) > 1:
+                self._set_inner(stack.parents)
+                return stack.maps[0]
+            else:
+                raise TypeError("Cannot pop from StackedDict without any levels")
+
+    def __getitem__(self, key):
+        if _contexts is None:
+            return super().__getitem__(key)
+        else:
+            state = self._get_state()
+            flat = state.flat
+            res = flat.get(key, Unset)
+            if res is Unset:
+                res = flat[key] = state.inner[key]
+            return res
+
+    def __setitem__(self, key, value):
+        if _contexts is None:
+            super().__setitem__(key, value)
+        else:
+            maps = self.inner.maps
+            level = dict(maps[0])
+            level[key] = value
+            self._set_inner(ChainMap(level, *maps[1:]))
+
+    def __delitem__(self, key):
+        if _contexts is None:
+            super().__delitem__(key)
+        else:
+            maps = self.inner.maps
+            level = dict(maps[0])
+            try:
+                del level[key]
+            except KeyError:
+                raise KeyError("Key not found in the first mapping: {!r}".format(key)) from None
+            self._set_inner(ChainMap(level, *maps[1:]))
+
+    def snapshot(self):
+        if _contexts is None:
+            return super().snapshot()
+        else:
+            # Levels are never modified in place, so the chain of levels is
+            # already an immutable view.
+            return _ContextSnapshot(self, self.inner)
+
+    def diff(self, snapshot):
+        if _contexts is None:
+            return super().diff(snapshot)
+        elif isinstance(snapshot, _ContextSnapshot) and snapshot.context is self:
+            # Only look at the levels not shared by both chains.
+            old, new = snapshot.inner.maps, self.inner.maps
+            i, j = len(old), len(new)
+            while i and j and old[i - 1] is new[j - 1]:
+                i, j = i - 1, j - 1
+            previous = snapshot.inner
+            keys = set().union(*old[:i], *new[:j])
+            return self._diff({key: previous.get(key, Unset) for key in keys}, self.get)
+        else:
+            raise ValueError("expected a snapshot of this context, not {!r}".format(snapshot))
+
     def __nonzero__(self):
         return bool(self.count)
 
     __bool__ = __nonzero__
 
     def __enter__(self):
-        if self.count == 0:
+        if self.count == 0 and _contexts is None:
             _data.contexts[self.name] = self
         if self.count + 1 == self.level:
             self.count += 1
@@ -183,12 +383,34 @@ class Context(StackedDict, metaclass=MetaContext):
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.count -= 1
-        if self.count == 0:
+        if self.count == 0 and _contexts is None:
             del _data.contexts[self.name]
         self.pop_level()
         return False
 
 
+class _ContextSnapshot(Mapping):
+    """The result of `Context.snapshot` with `use_contextvars`:func:."""
+
+    __slots__ = ("context", "inner")
+
+    def __init__(self, context, inner):
+        self.context = context
+        self.inner = inner
+
+    def __getitem__(self, key):
+        return self.inner[key]
+
+    def __iter__(self):
+        return iter(self.inner)
+
+    def __len__(self):
+        return len(self.inner)
+
+    def __repr__(self):
+        return "<snapshot of %s: %r>" % (type(self.context).__name__, dict(self))
+
+
 # A simple alias for Context
 context = Context
 
@@ -15,8 +15,16 @@ document all items here.  Refer to `collections`:mod: documentation.
 """
 
 import collections as _stdlib
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right, insort
 from collections.abc import Container, Iterable, Mapping, MutableMapping, MutableSet, Set, Sized
+from functools import lru_cache, partial, wraps
+from itertools import accumulate, chain, compress
+from operator import and_, eq, itemgetter, or_, xor
 from reprlib import recursive_repr
+from typing import Callable, MutableSequence
 
 from typing_extensions import deprecated
 from xotl.tools.objects import SafeDataItem as safe
@@ -30,13 +38,23 @@ __all__ = (
     "OpenDictMixin",
     "SmartDictMixin",
     "SmartDict",
+    "IndexedSmartDict",
     "codedict",
+    "RecordBatch",
+    "RecordRow",
     "StackedDict",
     "RankedDict",
+    "RankedCache",
+    "LockedRankedDict",
+    "LockedDefaultDict",
+    "LockedRankedCache",
+    "ranked_cache",
     "OrderedSmartDict",
     "MetaSet",
     "PascalSet",
+    "CompactPascalSet",
     "BitPascalSet",
+    "RoaringPascalSet",
     "pair",
     "smart_iter_items",
 )
@@ -153,6 +171,49 @@ class DefaultDict(_stdlib.defaultdict):
 defaultdict = deprecated("Use DefaultDict")(DefaultDict)
 
 
+class LockedDefaultDict(DefaultDict):
+    """A thread-safe `DefaultDict`:class:.
+
+    The default factory runs at most once for each missing key, even when
+    several threads look it up at the same time; the value produced is
+    stored (also for factories taking the key and the dict).  Threads
+    missing the same key wait for the first one.
+
+    Missing keys are distributed among ``__lock_stripes__`` re-entrant
+    locks by their hash, so factories for other keys run concurrently.
+    Other operations are those of `dict`:class:, which are atomic.
+
+    A factory waiting for a key being produced by another thread which in
+    turn waits for a key of this factory deadlocks.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    __lock_stripes__ = 16
+
+    def __init__(self, *args, **kwds):
+        from threading import RLock
+
+        self._locks = tuple(RLock() for _ in range(self.__lock_stripes__))
+        super().__init__(*args, **kwds)
+
+    def __missing__(self, key):
+        locks = self._locks
+        with locks[hash(key) % len(locks)]:
+            # Other thread may have produced it while we waited.
+            res = dict.get(self, key, Unset)
+            if res is Unset:
+                res = dict.setdefault(self, key, super().__missing__(key))
+            return res
+
+
+# Keys of the `OpenDictMixin.__invert__` cache
+_KEY_LENGTH = "length"
+_KEY_MAPPING = "mapping"
+_KEY_COLLISIONS = "collisions"
+
+
 class OpenDictMixin:
     """A mixin for mappings implementation that expose keys as attributes.
 
@@ -268,36 +329,89 @@ class OpenDictMixin:
 
         To obtain this mapping you can use as the unary operator "~".
 
+        The mapping is kept up to date when keys are set or deleted with
+        `__setitem__` and `__delitem__`; other changes are detected by a
+        different length and the mapping is fully calculated again.
+
         """
-        KEY_LENGTH = "length"
-        KEY_MAPPING = "mapping"
         cache = self._cache
-        cached_length = cache.setdefault(KEY_LENGTH, 0)
-        length = len(self)
-        if cached_length != length:
-            cache[KEY_LENGTH] = length
-            aux = ((self._key2identifier(k), k) for k in self)
-            res = {key: attr for key, attr in aux if key}
-            cache[KEY_MAPPING] = res
-        else:
-            res = cache.get(KEY_MAPPING)
-            if res is None:
-                assert cached_length == 0
-                res = {}
-                cache[KEY_MAPPING] = res
+        res = cache.get(_KEY_MAPPING)
+        if res is None or cache.get(_KEY_LENGTH) != len(self):
+            res = {}
+            collisions = False
+            for key in self:
+                attr = self._key2identifier(key)
+                if attr:
+                    collisions = collisions or attr in res
+                    res[attr] = key
+            cache[_KEY_MAPPING] = res
+            cache[_KEY_LENGTH] = len(self)
+            cache[_KEY_COLLISIONS] = collisions
         return res
 
+    def __setitem__(self, key, value):
+        new = key not in self
+        super().__setitem__(key, value)
+        if new:
+            cache = self._cache
+            mapping = cache.get(_KEY_MAPPING)
+            length = cache.get(_KEY_LENGTH)
+            if mapping is None:
+                pass
+            elif length == len(self) - 1:
+                attr = self._key2identifier(key)
+                if attr:
+                    if attr in mapping:
+                        cache[_KEY_COLLISIONS] = True
+                    mapping[attr] = key
+                cache[_KEY_LENGTH] = length + 1
+            else:
+                # Changed by other means (e.g. `dict.pop`)
+                del cache[_KEY_MAPPING]
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        cache = self._cache
+        mapping = cache.get(_KEY_MAPPING)
+        length = cache.get(_KEY_LENGTH)
+        if mapping is None:
+            pass
+        elif length == len(self) + 1:
+            attr = self._key2identifier(key)
+            if attr and mapping.get(attr) == key:
+                if cache[_KEY_COLLISIONS]:
+                    # Another key could have the same identifier
+                    del cache[_KEY_MAPPING]
+                    return
+                del mapping[attr]
+            cache[_KEY_LENGTH] = length - 1
+        else:
+            del cache[_KEY_MAPPING]
+
     @property
     def _cache(self):
-        from xotl.tools.future.inspect import get_attr_value
+        cls = type(self)
+        name = cls.__cache_name__
+        # Read the slot of the safe descriptor directly, it's much faster.
+        slot = getattr(getattr(cls, name, None), "inner_name", None)
+        if slot is not None:
+            try:
+                return object.__getattribute__(self, slot)
+            except AttributeError:
+                pass
+        else:
+            from xotl.tools.future.inspect import get_attr_value
 
-        try:
-            return get_attr_value(self, type(self).__cache_name__)
-        except AttributeError:
-            res = setattr(self, type(self).__cache_name__, dict())
-            return res
+            try:
+                return get_attr_value(self, name)
+            except AttributeError:
+                pass
+        res = {}
+        setattr(self, name, res)
+        return res
 
     @staticmethod
+    @lru_cache(maxsize=4096, typed=True)
     def _key2identifier(key):
         """Convert keys to valid identifiers.
 
@@ -305,6 +419,8 @@ class OpenDictMixin:
         This function must return a valid identifier or None if the conversion
         is not possible.
 
+        Results are memoized, so it must be a pure function.
+
         """
         # TODO: Improve this in order to obtain a full-mapping.  For example,
         # the corresponding attribute names for the keys ``'-x-y'`` and
@@ -340,17 +456,34 @@ class SmartDictMixin:
 
         - an iterable of (key, value) pairs.
 
+        If the class doesn't redefine the ``__setitem__`` of `dict`:class: (or
+        `~collections.OrderedDict`:class:), the items are stored in bulk by
+        the `update` of that class instead of one by one.
+
+        .. versionchanged:: 3.4.0 Added the bulk path.
+
         """
         from xotl.tools.params import issue_9137
 
         self, args = issue_9137(args)
-        for key, value in smart_iter_items(*args, **kwds):
-            self[key] = value
+        setitem = type(self).__setitem__
+        if setitem is dict.__setitem__:
+            bulk = dict.update
+        elif setitem is _stdlib.OrderedDict.__setitem__:
+            bulk = _stdlib.OrderedDict.update
+        else:
+            bulk = None
+        if bulk is not None:
+            for mapping in _bulk_mappings(args, kwds):
+                bulk(self, mapping)
+        else:
+            for key, value in smart_iter_items(*args, **kwds):
+                self[key] = value
 
     # TODO: Include new argument ``full=True`` to also search in string
     #       values.  Maybe this kind of feature will be better in a function
     #       instead a method.
-    def search(self, pattern):
+    def search(self, pattern, lazy=False):
         """Return new mapping with items which key match a `pattern` regexp.
 
         This function always tries to return a valid new mapping of the same
@@ -359,10 +492,20 @@ class SmartDictMixin:
         variable named `__search_result_type__` or return a standard
         Python dictionary if not found.
 
-        """
-        from re import compile
+        If `lazy` is True, return instead a read-only view of the matching
+        items; it doesn't copy anything and reflects later changes.
+
+        Compiled patterns are cached.  When every match must start with a
+        literal prefix (e.g. ``"^db_"``) other keys are discarded without
+        matching the regexp; `IndexedSmartDict`:class: doesn't even visit
+        them.
 
-        regexp = compile(pattern)
+        .. versionchanged:: 3.4.0 Added the `lazy` parameter.
+
+        """
+        regexp, prefix = _search_regexp(pattern)
+        if lazy:
+            return _SearchView(self, regexp, prefix)
         cls = type(self)
         try:
             res = cls()
@@ -371,11 +514,78 @@ class SmartDictMixin:
 
             creator = get_attr_value(cls, "__search_result_type__", None)
             res = creator() if creator else {}
-        for key in self:
-            if regexp.search(key):
-                res[key] = self[key]
+        for key in self._search_keys(regexp, prefix):
+            res[key] = self[key]
         return res
 
+    def _search_keys(self, regexp, prefix):
+        """Protected method to iterate the keys matching `regexp`.
+
+        `prefix` is the literal prefix of the matches, or None.
+
+        """
+        search = regexp.search
+        if prefix:
+            startswith = str.startswith
+            return (key for key in self if startswith(key, prefix) and search(key))
+        else:
+            return (key for key in self if search(key))
+
+
+@lru_cache(maxsize=256)
+def _search_regexp(pattern):
+    """Compile `pattern` and find the literal prefix of its matches.
+
+    Return a pair ``(regexp, prefix)``; the prefix is None if not found.
+
+    """
+    from re import IGNORECASE, MULTILINE, VERBOSE, compile
+
+    regexp = compile(pattern)
+    pattern = regexp.pattern
+    if (
+        not isinstance(pattern, str)
+        or regexp.flags & (IGNORECASE | MULTILINE | VERBOSE)
+        or "|" in pattern
+        or not pattern.startswith("^")
+    ):
+        return regexp, None
+    i, count = 1, len(pattern)
+    while i < count and pattern[i] not in ".^$*+?{}[]\\|()":
+        i += 1
+    if i < count and pattern[i] in "*?{":
+        i -= 1  # the quantifier applies to the last character
+    return regexp, pattern[1:i] or None
+
+
+class _SearchView(Mapping):
+    """The result of `SmartDictMixin.search` with ``lazy=True``."""
+
+    __slots__ = ("_mapping", "_regexp", "_prefix")
+
+    def __init__(self, mapping, regexp, prefix):
+        self._mapping = mapping
+        self._regexp = regexp
+        self._prefix = prefix
+
+    def __iter__(self):
+        return self._mapping._search_keys(self._regexp, self._prefix)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._regexp.search(key) and key in self._mapping
+
+    def __getitem__(self, key):
+        if isinstance(key, str) and self._regexp.search(key):
+            return self._mapping[key]
+        else:
+            raise KeyError(key)
+
+    def __repr__(self):
+        return "<search %r in %s>" % (self._regexp.pattern, type(self._mapping).__name__)
+
 
 class SmartDict(SmartDictMixin, dict):  # type: ignore
     """A "smart" dictionary that can receive a wide variety of arguments.
@@ -388,10 +598,101 @@ class SmartDict(SmartDictMixin, dict):  # type: ignore
         from xotl.tools.params import issue_9137
 
         self, args = issue_9137(args)
-        super().__init__()
+        super(SmartDict, self).__init__()
         self.update(*args, **kwargs)
 
 
+class IndexedSmartDict(SmartDict):
+    """A `SmartDict`:class: keeping a sorted index of its string keys.
+
+    `~SmartDictMixin.search`:meth: uses the index for patterns with a literal
+    prefix (e.g. ``"^db_"``), visiting only the keys with that prefix; in
+    such case the result is sorted by key.
+
+    Adding or removing a key updates the index (a sorted list), so it suits
+    mostly static mappings searched many times.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    def __init__(*args, **kwargs):
+        from xotl.tools.params import issue_9137
+
+        self, args = issue_9137(args)
+        self._index = []
+        super(IndexedSmartDict, self).__init__(*args, **kwargs)
+
+    def _search_keys(self, regexp, prefix):
+        if prefix:
+            index = self._index
+            search = regexp.search
+            pos, count = bisect_left(index, prefix), len(index)
+            while pos < count and index[pos].startswith(prefix):
+                key = index[pos]
+                if search(key):
+                    yield key
+                pos += 1
+        else:
+            yield from super()._search_keys(regexp, prefix)
+
+    def _discard(self, key):
+        """Protected method to remove `key` from the index."""
+        if isinstance(key, str):
+            index = self._index
+            pos = bisect_left(index, key)
+            if pos < len(index) and index[pos] == key:
+                del index[pos]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, str) and key not in self:
+            insort(self._index, key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._discard(key)
+
+    def __or__(self, other):
+        if isinstance(other, dict):
+            res = type(self)(self)
+            res.update(other)
+            return res
+        else:
+            return NotImplemented
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def pop(self, key, *args):
+        """D.pop(k[,d]) -> v, remove specified key and return the value."""
+        res = super().pop(key, *args)
+        self._discard(key)
+        return res
+
+    def popitem(self):
+        """D.popitem() -> (k, v), remove and return the last pair."""
+        key, value = super().popitem()
+        self._discard(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        """D.setdefault(k[,d]) -> D.get(k,d), also set D[k]=d if k not in D"""
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def clear(self):
+        """D.clear() -> None.  Remove all items from D."""
+        super().clear()
+        self._index.clear()
+
+    def __reduce__(self):
+        """Return state information for pickling."""
+        return type(self), (), None, None, iter(self.items())
+
+
 class opendict(OpenDictMixin, dict):
     """A dictionary implementation that mirrors its keys as attributes.
 
@@ -415,6 +716,14 @@ class opendict(OpenDictMixin, dict):
 
     __slots__ = safe.slot(OpenDictMixin.__cache_name__, dict)
 
+    def __getattr__(self, name):
+        # Fast path for keys not hidden by class attributes
+        key = (~self).get(name)
+        if key and not hasattr(type(self), name):
+            return self[key]
+        else:
+            return super().__getattr__(name)
+
     @classmethod
     def from_enum(cls, enumclass):
         """Creates an opendict from an enumeration class.
@@ -493,6 +802,222 @@ class codedict(OpenDictMixin, dict):
     __rlshift__ = __rshift__
 
 
+class RecordRow(Mapping):
+    """A row of a `RecordBatch`:class:.
+
+    It's a light view (two slots) with the interface of `opendict`:class:
+    (keys are also attributes) but with the fixed set of keys of its batch.
+    Setting a key (or its attribute) changes the batch; keys can't be added
+    nor deleted.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    __slots__ = ("_batch", "_pos")
+
+    def __init__(self, batch, pos):
+        object.__setattr__(self, "_batch", batch)
+        object.__setattr__(self, "_pos", pos)
+
+    def __len__(self):
+        return len(self._batch._keys)
+
+    def __iter__(self):
+        return iter(self._batch._keys)
+
+    def __contains__(self, key):
+        return key in self._batch._positions
+
+    def __getitem__(self, key):
+        batch = self._batch
+        return batch._columns[batch._positions[key]][self._pos]
+
+    def __setitem__(self, key, value):
+        batch = self._batch
+        batch._columns[batch._positions[key]][self._pos] = value
+
+    def __getattr__(self, name):
+        batch = self._batch
+        index = batch._attrs.get(name)
+        if index is not None:
+            return batch._columns[index][self._pos]
+        else:
+            msg = "'%s' object has no attribute '%s'"
+            raise AttributeError(msg % (type(self).__name__, name))
+
+    def __setattr__(self, name, value):
+        batch = self._batch
+        index = batch._attrs.get(name)
+        if index is not None:
+            batch._columns[index][self._pos] = value
+        else:
+            super().__setattr__(name, value)
+
+    def __dir__(self):
+        return list(set(self._batch._attrs) | set(super().__dir__()))
+
+    def __invert__(self):
+        """Return the mapping from attribute names to keys; see `OpenDictMixin`."""
+        keys = self._batch._keys
+        return {attr: keys[index] for attr, index in self._batch._attrs.items()}
+
+    def __reduce__(self):
+        return type(self), (self._batch, self._pos)
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, dict(self))
+
+
+class RecordBatch:
+    """Rows with the same keys stored by columns.
+
+    Much lighter than a list of `opendict`:class: when there are many rows::
+
+      >>> batch = RecordBatch(["name", "age"], [("John", 30), ("Jane", 28)])
+      >>> batch[1].name, batch[1]["age"]
+      ('Jane', 28)
+
+    :param keys: The keys of every row.
+
+    :param rows: Initial rows, see `append`:meth:.
+
+    :param typecodes: Map from keys to the `array`:class: type code to store
+           its column.  Other columns are lists.
+
+    Items (rows) are `RecordRow`:class: views (with the interface of an
+    `opendict`:class:), slicing returns a new batch.  Use `column`:meth: to
+    access a whole column.  Rows can be appended but not removed.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    __slots__ = ("_keys", "_positions", "_attrs", "_columns", "_length")
+
+    def __init__(self, keys, rows=(), typecodes=None):
+        keys = tuple(keys)
+        positions = {key: index for index, key in enumerate(keys)}
+        if len(positions) != len(keys):
+            raise ValueError("duplicated keys in {!r}".format(keys))
+        typecodes = typecodes or {}
+        attrs = {}
+        for index, key in enumerate(keys):
+            attr = OpenDictMixin._key2identifier(key)
+            if attr:
+                attrs[attr] = index
+        self._keys = keys
+        self._positions = positions
+        self._attrs = attrs
+        self._columns = [array(typecodes[key]) if key in typecodes else [] for key in keys]
+        self._length = 0
+        self.extend(rows)
+
+    @classmethod
+    def from_dicts(cls, dicts, keys=None, typecodes=None):
+        """Create a batch from a sequence of mappings (e.g. `opendict`:class:).
+
+        If `keys` is not given use the keys of the first mapping.  Every
+        mapping must have (at least) those keys.
+
+        """
+        if keys is None:
+            dicts = iter(dicts)
+            first = next(dicts, None)
+            if first is None:
+                return cls((), typecodes=typecodes)
+            keys = list(first)
+            dicts = chain([first], dicts)
+        res = cls(keys, typecodes=typecodes)
+        res.extend(dicts)
+        return res
+
+    def to_dicts(self, factory=None):
+        """Return a list with a mapping for each row.
+
+        The type of the mappings is `factory` (default `opendict`:class:).
+
+        """
+        if factory is None:
+            factory = opendict
+        keys = self._keys
+        return [factory(zip(keys, values)) for values in zip(*self._columns)]
+
+    @property
+    def keys(self):
+        """The keys of every row."""
+        return self._keys
+
+    def column(self, key):
+        """Return the column (a list or an `array`:class:) of `key`.
+
+        It's not a copy, changes are seen by rows.
+
+        """
+        return self._columns[self._positions[key]]
+
+    def append(self, row):
+        """Add a row at the end.
+
+        `row` is either a mapping with (at least) the batch keys, or a
+        sequence of values in the same order of the keys.
+
+        """
+        self.extend((row,))
+
+    def extend(self, rows):
+        """Add several rows at the end; see `append`:meth:."""
+        keys = self._keys
+        count = len(keys)
+        getter = itemgetter(*keys) if count > 1 else lambda row: tuple(row[key] for key in keys)
+        values = []
+        for row in rows:
+            if isinstance(row, Mapping):
+                row = getter(row)
+            elif len(row) != count:
+                raise ValueError("expected {} values, got {}".format(count, len(row)))
+            values.append(row)
+        if values:
+            length = self._length
+            try:
+                for column, items in zip(self._columns, zip(*values)):
+                    column.extend(items)
+            except BaseException:
+                # A typed column rejected a value, don't keep the others
+                for column in self._columns:
+                    del column[length:]
+                raise
+            self._length = length + len(values)
+
+    def rows(self):
+        """Iterate over the rows as tuples of values."""
+        return zip(*self._columns)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return map(partial(RecordRow, self), range(self._length))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            res = type(self)(self._keys)
+            res._columns = [column[index] for column in self._columns]
+            res._length = len(range(*index.indices(self._length)))
+            return res
+        else:
+            length = self._length
+            if index < 0:
+                index += length
+            if 0 <= index < length:
+                return RecordRow(self, index)
+            else:
+                raise IndexError("record index out of range")
+
+    def __repr__(self):
+        return "<%s %r: %d rows>" % (type(self).__name__, self._keys, self._length)
+
+
 class StackedDict(OpenDictMixin, SmartDictMixin, MutableMapping):  # type: ignore
     """A multi-level mapping.
 
@@ -510,20 +1035,44 @@ class StackedDict(OpenDictMixin, SmartDictMixin, MutableMapping):  # type: ignor
 
     Setting the value for key, sets it in the current level.
 
+    Looking up a key probes every level from the top.  Sub-classes setting
+    the class attribute ``__read_cache__`` to True keep a flattened cache of
+    the keys already read, so repeated lookups are a single probe.  Every
+    change (`push_level`:meth:, `pop_level`:meth:, setting or deleting a key)
+    increments a version number which invalidates the cache.  Changes made
+    directly in the levels (e.g. in the result of `pop_level`:meth:) are not
+    tracked.
+
+    Use `snapshot`:meth: and `diff`:meth: to find out which keys change
+    while running some code.
+
     .. versionchanged:: 1.5.2 Based on the newly introduced `ChainMap`:class:.
 
+    .. versionchanged:: 3.4.0 Added the read cache, `snapshot`:meth: and
+       `diff`:meth:.
+
     """
 
     __slots__ = (
         safe.slot("inner", _stdlib.ChainMap),
         safe.slot(OpenDictMixin.__cache_name__, dict),
+        "_version",
+        "_flat",
+        "_flat_version",
+        "_epoch",
     )
 
+    __read_cache__ = False
+
     def __init__(*args, **kwargs):
         # Each data item is stored as {key: {level: value, ...}}
         from xotl.tools.params import issue_9137
 
         self, args = issue_9137(args)
+        self._version = 0
+        self._flat = {}
+        self._flat_version = 0
+        self._epoch = None
         self.update(*args, **kwargs)
 
     @property
@@ -549,6 +1098,7 @@ class StackedDict(OpenDictMixin, SmartDictMixin, MutableMapping):  # type: ignor
 
         """
         self.inner = self.inner.new_child()
+        self._changed()
         self.update(*args, **kwargs)
         return self.level
 
@@ -563,7 +1113,11 @@ class StackedDict(OpenDictMixin, SmartDictMixin, MutableMapping):  # type: ignor
         if self.level > 0:
             stack = self.inner
             res = stack.maps[0]
+            if self._epoch is not None:
+                for key in res:
+                    self._record(key)
             self.inner = stack.parents
+            self._changed()
             return res
         else:
             raise TypeError("Cannot pop from StackedDict without any levels")
@@ -599,79 +1153,246 @@ class StackedDict(OpenDictMixin, SmartDictMixin, MutableMapping):  # type: ignor
         return iter(self.inner)
 
     def __getitem__(self, key):
-        return self.inner[key]
+        if self.__read_cache__:
+            flat = self._flat
+            if self._flat_version != self._version:
+                flat.clear()
+                object.__setattr__(self, "_flat_version", self._version)
+            res = flat.get(key, Unset)
+            if res is Unset:
+                res = flat[key] = self.inner[key]
+            return res
+        else:
+            return self.inner[key]
 
     def __setitem__(self, key, value):
+        self._record(key)
         self.inner[key] = value
+        self._changed()
 
     def __delitem__(self, key):
+        self._record(key)
         del self.inner[key]
+        self._changed()
 
+    def update(*args, **kwds):
+        from xotl.tools.params import issue_9137
 
-class RankedDict(SmartDictMixin, dict):  # type: ignore
-    """Mapping that remembers modification order.
+        self, args = issue_9137(args)
+        if type(self).__setitem__ is StackedDict.__setitem__:
+            # Update the current level in bulk
+            level = self.inner.maps[0]
+            for mapping in _bulk_mappings(args, kwds):
+                if self._epoch is not None:
+                    for key in mapping:
+                        self._record(key)
+                level.update(mapping)
+            self._changed()
+        else:
+            super(StackedDict, self).update(*args, **kwds)
 
-    Differences with `OrderedDict`:class: are:
+    def _changed(self):
+        # Skip `OpenDictMixin.__setattr__`, it's too expensive here.
+        object.__setattr__(self, "_version", self._version + 1)
 
-    - Can be ranked (change precedence order) at any time; see `rank`:meth:
-      and `swap_ranks`:meth: methods for more information.
+    def snapshot(self):
+        """Return a read-only view of the current contents.
 
-    - Based in modification, not in insertion order.
+        The view doesn't copy anything.  Once a snapshot is taken, the first
+        change of each key saves its previous value; the snapshot finds the
+        value of changed keys there and reads other keys from this mapping.
+        Taking a snapshot costs O(1).
 
-    - Keeps the standard semantics of Python for `popitem`:meth: method
-      returning a random pair when called without parameters.
+        Changes made directly in the levels are not seen by snapshots.
 
-    """
+        .. versionadded:: 3.4.0
 
-    def __init__(*args, **kwds):
-        """Initialize a ranked dictionary.
+        """
+        epoch = self._epoch
+        if epoch is None or epoch.owner is not self or epoch.changes:
+            new = _Epoch(self)
+            if epoch is not None and epoch.owner is self:
+                epoch.next = new
+            object.__setattr__(self, "_epoch", new)
+            epoch = new
+        return _StackedSnapshot(self, epoch)
 
-        The signature is the same as regular dictionaries, but keyword
-        arguments are not recommended because their insertion order is
-        arbitrary.
+    def diff(self, snapshot):
+        """Return the keys whose value changed since `snapshot` was taken.
 
-        Use `rank`:meth: to change the precedence order in any moment.
+        The result is a dict mapping each changed key to a pair ``(old,
+        new)``.  A key missing in either side has the value `Unset`.  Its
+        cost is proportional to the number of keys changed, not to the size
+        of the mapping.
+
+        :param snapshot: The result of `snapshot`:meth: in this same mapping.
+
+        .. versionadded:: 3.4.0
 
         """
-        from xotl.tools.params import issue_9137
+        if not isinstance(snapshot, _StackedSnapshot) or snapshot._owner is not self:
+            raise ValueError("expected a snapshot of this mapping, not {!r}".format(snapshot))
+        return self._diff(snapshot._changes(), self.get)
 
-        self, args = issue_9137(args)
-        # Ensure direct calls to ``__init__`` don't clear previous contents
-        try:
-            self._ranks
-        except AttributeError:
-            self._ranks = []
-        self.update(*args, **kwds)
+    @staticmethod
+    def _diff(old, get):
+        """Protected method to compare the `old` values of keys with `get`."""
+        res = {}
+        for key, value in old.items():
+            new = get(key, Unset)
+            if new is not value and new != value:
+                res[key] = (value, new)
+        return res
 
-    def rank(self, *keys):
-        """Arrange mapping keys into a systematic precedence order.
+    def _record(self, key):
+        """Protected method to save the value of `key` before a change."""
+        epoch = self._epoch
+        if epoch is not None and epoch.owner is self:
+            changes = epoch.changes
+            if key not in changes:
+                changes[key] = self.get(key, Unset)
 
-        :param keys: Variable number of key values, given are ordered in the
-               highest precedence levels (0 is the most priority).  Not given
-               keys are added at the end in the its current order.
 
-        """
-        if keys:
-            ranks = []
-            for key in keys:
-                if key in self:
-                    ranks.append(key)
-                else:
-                    raise KeyError("{}".format(key))
-            aux = set(keys)
-            for key in self:
-                if key not in aux:
-                    ranks.append(key)
-            self._ranks = ranks
+class _Epoch:
+    """The first previous value of the keys changed in a `StackedDict`.
 
-    def swap_ranks(self, *args, **kwds):
-        """Exchange ranks of given keys.
+    Each call to `StackedDict.snapshot` starts a new epoch (unless nothing
+    changed), linked to the previous one by `next`.  A snapshot finds the
+    value of a key in the first epoch, from its own onwards, holding it.
 
-        :param args: Each item must be a pair of keys to exchange the order of
-               precedence.
+    """
 
-        :param kwds: Every keyword argument will have a pair to exchange
-               (name, value).
+    __slots__ = ("owner", "changes", "next")
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.changes = {}
+        self.next = None
+
+
+class _StackedSnapshot(Mapping):
+    """The result of `StackedDict.snapshot`."""
+
+    __slots__ = ("_owner", "_epoch")
+
+    def __init__(self, owner, epoch):
+        self._owner = owner
+        self._epoch = epoch
+
+    def _changes(self):
+        """Return the keys changed since the snapshot with its old value."""
+        res = {}
+        epoch = self._epoch
+        while epoch is not None:
+            for key, value in epoch.changes.items():
+                res.setdefault(key, value)
+            epoch = epoch.next
+        return res
+
+    def __getitem__(self, key):
+        epoch = self._epoch
+        while epoch is not None:
+            changes = epoch.changes
+            if key in changes:
+                res = changes[key]
+                if res is Unset:
+                    raise KeyError(key)
+                return res
+            epoch = epoch.next
+        return self._owner[key]
+
+    def __iter__(self):
+        changes = self._changes()
+        keys = [key for key in self._owner if key not in changes]
+        keys.extend(key for key, value in changes.items() if value is not Unset)
+        return iter(keys)
+
+    def __len__(self):
+        owner = self._owner
+        res = len(owner)
+        for key, value in self._changes().items():
+            res += (value is not Unset) - (key in owner)
+        return res
+
+    def __repr__(self):
+        return "<snapshot of %s: %r>" % (type(self._owner).__name__, dict(self))
+
+
+class _RankLink:
+    """A node of the doubly linked list keeping the order of a `RankedDict`."""
+
+    __slots__ = ("prev", "next", "key")
+
+
+class RankedDict(SmartDictMixin, dict):  # type: ignore
+    """Mapping that remembers modification order.
+
+    Differences with `OrderedDict`:class: are:
+
+    - Can be ranked (change precedence order) at any time; see `rank`:meth:
+      and `swap_ranks`:meth: methods for more information.
+
+    - Based in modification, not in insertion order.
+
+    - Keeps the standard semantics of Python for `popitem`:meth: method
+      returning a random pair when called without parameters.
+
+    Like in `OrderedDict`:class:, the order is kept in a doubly linked list
+    with a map from keys to its nodes; so setting, deleting, moving and
+    swapping keys cost O(1).  A positional index (a list of keys) is only
+    built when `popitem`:meth: is called with an inner position.
+
+    .. versionchanged:: 3.4.0 Use a linked list instead of a list of keys.
+
+    """
+
+    def __init__(*args, **kwds):
+        """Initialize a ranked dictionary.
+
+        The signature is the same as regular dictionaries, but keyword
+        arguments are not recommended because their insertion order is
+        arbitrary.
+
+        Use `rank`:meth: to change the precedence order in any moment.
+
+        """
+        from xotl.tools.params import issue_9137
+
+        self, args = issue_9137(args)
+        # Ensure direct calls to ``__init__`` don't clear previous contents
+        try:
+            self._links
+        except AttributeError:
+            self._clear_links()
+        self.update(*args, **kwds)
+
+    def rank(self, *keys):
+        """Arrange mapping keys into a systematic precedence order.
+
+        :param keys: Variable number of key values, given are ordered in the
+               highest precedence levels (0 is the most priority).  Not given
+               keys are added at the end in the its current order.
+
+        """
+        if keys:
+            for key in keys:
+                if key not in self:
+                    raise KeyError("{}".format(key))
+            aux = set(keys)
+            ranks = list(keys)
+            ranks.extend(key for key in self if key not in aux)
+            self._clear_links()
+            for key in ranks:
+                self._link(key)
+
+    def swap_ranks(self, *args, **kwds):
+        """Exchange ranks of given keys.
+
+        :param args: Each item must be a pair of keys to exchange the order of
+               precedence.
+
+        :param kwds: Every keyword argument will have a pair to exchange
+               (name, value).
 
         """
         from xotl.tools.params import check_count
@@ -698,59 +1419,139 @@ class RankedDict(SmartDictMixin, dict):  # type: ignore
                   ``self[key] = self[key]``.
 
         """
-        try:
-            ranks = self._ranks
+        link = self._links[key]
+        root = self._root
+        if (root.prev if last else root.next) is not link:
+            self._index = None
+            link.prev.next = link.next
+            link.next.prev = link.prev
             if last:
-                if key != ranks[-1]:
-                    ranks.remove(key)
-                    ranks.append(key)
+                last = root.prev
+                link.prev, link.next = last, root
+                last.next = root.prev = link
             else:
-                if key != ranks[0]:
-                    ranks.remove(key)
-                    ranks.insert(0, key)
-        except ValueError:
-            raise KeyError(key)
+                first = root.next
+                link.prev, link.next = root, first
+                first.prev = root.next = link
 
     def _swap_ranks(self, key1, key2):
         """Protected method to swap a pair of ranks."""
         if key1 in self and key2 in self:
-            ranks = self._ranks
-            idx1, idx2 = ranks.index(key1), ranks.index(key2)
-            if idx1 != idx2:
-                aux = ranks[idx1]
-                ranks[idx1] = ranks[idx2]
-                ranks[idx2] = aux
+            links = self._links
+            link1, link2 = links[key1], links[key2]
+            if link1 is not link2:
+                self._index = None
+                link1.key, link2.key = key2, key1
+                links[key1], links[key2] = link2, link1
         else:
             raise KeyError("{!r} and/or {!r}".format(key1, key2))
 
+    def _clear_links(self):
+        """Protected method to (re)initialize the order of keys."""
+        self._root = root = _RankLink()
+        root.prev = root.next = root
+        root.key = Unset
+        self._links = {}
+        self._index = None
+
+    def _link(self, key):
+        """Protected method to add a new key at the end of the order."""
+        self._links[key] = link = _RankLink()
+        root = self._root
+        last = root.prev
+        link.prev, link.next, link.key = last, root, key
+        last.next = root.prev = link
+        index = self._index
+        if index is not None:
+            index.append(key)
+
+    def _extend(self, mapping):
+        """Protected method to update with `mapping` in bulk.
+
+        Existing keys are moved to the end, like in `__setitem__`:meth:.
+
+        """
+        if mapping is self:
+            return  # moving every key to the end keeps the order
+        links = self._links
+        for key in [key for key in mapping if key in links]:
+            self._unlink(key)
+        dict.update(self, mapping)
+        root = self._root
+        last = root.prev
+        for key in mapping:
+            links[key] = link = _RankLink()
+            link.prev, link.key = last, key
+            last.next = last = link
+        last.next, root.prev = root, last
+        index = self._index
+        if index is not None:
+            index.extend(mapping)
+
+    def update(*args, **kwds):
+        """Update this dict from a set of iterables `args` and keyword values
+        `kwargs`.
+
+        Mappings are stored in bulk, see `SmartDictMixin.update`:meth:.
+
+        .. versionchanged:: 3.4.0 Added the bulk path.
+
+        """
+        from xotl.tools.params import issue_9137
+
+        self, args = issue_9137(args)
+        if type(self).__setitem__ is RankedDict.__setitem__:
+            for arg in args:
+                if _plain_mapping(arg):
+                    self._extend(arg)
+                else:
+                    for key, value in smart_iter_items(arg):
+                        self[key] = value
+            if kwds:
+                self._extend(kwds)
+        else:
+            super(RankedDict, self).update(*args, **kwds)
+
+    def _unlink(self, key):
+        """Protected method to remove a key from the order."""
+        link = self._links.pop(key)
+        link.prev.next = link.next
+        link.next.prev = link.prev
+        self._index = None
+
     def __setitem__(self, key, value):
         """rd.__setitem__(i, y) <==> rd[i]=y"""
-        ranks = self._ranks
         if key in self:
-            if ranks[-1] != key:
-                ranks.remove(key)
-                ranks.append(key)
+            self.move_to_end(key)
         else:
-            ranks.append(key)
+            self._link(key)
         super().__setitem__(key, value)
 
     def __delitem__(self, key):
         """rd.__delitem__(y) <==> del rd[y]"""
         super().__delitem__(key)
-        self._ranks.remove(key)
+        self._unlink(key)
 
     def __iter__(self):
         """rd.__iter__() <==> iter(rd)"""
-        return iter(self._ranks)
+        root = self._root
+        link = root.next
+        while link is not root:
+            yield link.key
+            link = link.next
 
     def __reversed__(self):
         """rd.__reversed__() <==> reversed(rd)"""
-        return reversed(self._ranks)
+        root = self._root
+        link = root.prev
+        while link is not root:
+            yield link.key
+            link = link.prev
 
     def clear(self):
         """rd.clear() -> None.  Remove all items from rd."""
         super().clear()
-        self._ranks = []
+        self._clear_links()
 
     def popitem(self, index=None):
         """rd.popitem([index]) -> (key, value), return and remove a pair.
@@ -760,11 +1561,29 @@ class RankedDict(SmartDictMixin, dict):  # type: ignore
                none the defined in method with the same name in standard
                Python mappings; here is similar to `~list.pop`:meth:.
 
+        Popping the first or the last pair costs O(1).  Other positions build
+        (once) an index of keys which is kept by successive calls, so popping
+        many pairs by position doesn't rebuild it.
+
         """
         if self:
-            if index is None or index is True:
-                index = -1
-            key = self._ranks.pop(index)
+            if index is None or index is True or index == -1:
+                key = self._root.prev.key
+                keys = self._index
+                if keys is not None:
+                    keys.pop()
+            elif index == 0:
+                key = self._root.next.key
+                keys = self._index
+                if keys is not None:
+                    del keys[0]
+            else:
+                keys = self._index
+                if keys is None:
+                    keys = list(self)
+                key = keys.pop(index)
+            self._unlink(key)
+            self._index = keys
             return key, super().pop(key)
         else:
             raise KeyError("popitem(): dictionary is empty")
@@ -776,7 +1595,10 @@ class RankedDict(SmartDictMixin, dict):  # type: ignore
                   ``obj.__sizeof__()``?
 
         """
-        return super().__sizeof__() + self._ranks.__sizeof__()
+        res = super().__sizeof__() + self._links.__sizeof__()
+        if self._index is not None:
+            res += self._index.__sizeof__()
+        return res + (len(self) + 1) * sys.getsizeof(self._root)
 
     def keys(self):
         """D.keys() -> an object providing a view on D's keys."""
@@ -801,10 +1623,8 @@ class RankedDict(SmartDictMixin, dict):  # type: ignore
         """
         res = super().__eq__(other)
         if res:
-            if isinstance(other, RankedDict):
-                return self._ranks == other._ranks
-            elif isinstance(other, _stdlib.OrderedDict):
-                return self._ranks == list(other)
+            if isinstance(other, (RankedDict, _stdlib.OrderedDict)):
+                return all(map(eq, self, other))
             else:
                 return True
         else:
@@ -833,7 +1653,7 @@ class RankedDict(SmartDictMixin, dict):  # type: ignore
             else:
                 raise KeyError(key)
         else:
-            self._ranks.remove(key)
+            self._unlink(key)
             return res
 
     def setdefault(self, key, default=None):
@@ -874,6 +1694,422 @@ class RankedDict(SmartDictMixin, dict):  # type: ignore
         return cls((key, value) for key in iterable)
 
 
+_CacheInfo = _stdlib.namedtuple("_CacheInfo", ["hits", "misses", "evictions", "capacity", "size"])
+
+
+class RankedCache(RankedDict):
+    """A bounded `RankedDict`:class: evicting entries when it's full.
+
+    :param capacity: Maximum number of entries.  Setting a new key in a full
+           cache evicts an entry following `policy`.
+
+    :param ttl: Time to live of entries in seconds since they were set, or
+           None (the default) for no limit.  Expired entries are removed
+           when they are accessed, when room is needed, or by `expire`:meth:.
+
+    :param policy: Either ``"lru"`` (the default) to evict the least recently
+           used entry, or ``"lfu"`` to evict the least frequently used one
+           (the least recently used among them).
+
+    :param on_evict: Function called as ``on_evict(key, value)`` for every
+           entry removed because of the capacity or the TTL, but not for
+           explicit deletions.
+
+    :param timer: Function returning the current time in seconds; defaults
+           to `time.monotonic`:func:.
+
+    Getting an item (``cache[key]`` or `get`:meth:) counts a hit or a miss,
+    and ranks the key as the most recently used.  Membership tests,
+    iteration and `peek`:meth: don't.  Counters are the attributes `hits`,
+    `misses` and `evictions`; see also `cache_info`:meth:.
+
+    All bookkeeping costs O(1) per operation.  This class doesn't use locks;
+    use `LockedRankedCache`:class: to share a cache among threads.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    def __init__(self, capacity=128, *, ttl=None, policy="lru", on_evict=None, timer=None):
+        from time import monotonic
+
+        if capacity < 1:
+            raise ValueError("capacity must be a positive number, not {!r}".format(capacity))
+        if policy not in ("lru", "lfu"):
+            raise ValueError("policy must be 'lru' or 'lfu', not {!r}".format(policy))
+        self.capacity = capacity
+        self.ttl = ttl
+        self.policy = policy
+        self.on_evict = on_evict
+        self.timer = timer or monotonic
+        self.hits = self.misses = self.evictions = 0
+        self._expires = _stdlib.OrderedDict()  # key -> deadline, in setting order
+        self._uses = {}  # key -> use count (LFU)
+        self._buckets = {}  # use count -> keys, in use order (LFU)
+        self._min_uses = 0
+        super().__init__()
+
+    def __getitem__(self, key):
+        res = self.get(key, Unset)
+        if res is Unset:
+            raise KeyError(key)
+        else:
+            return res
+
+    def get(self, key, default=None):
+        """Return the value for `key` if in the cache, else `default`.
+
+        Count a hit or a miss.
+
+        """
+        res = dict.get(self, key, Unset)
+        if res is not Unset and self._expired(key):
+            self._evict(key)
+            res = Unset
+        if res is Unset:
+            self.misses += 1
+            return default
+        else:
+            self.hits += 1
+            self._touch(key)
+            return res
+
+    def peek(self, key, default=None):
+        """Return the value for `key` without ranking it nor counting."""
+        if key in self:
+            return dict.__getitem__(self, key)
+        else:
+            return default
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) and not self._expired(key)
+
+    def __setitem__(self, key, value):
+        if dict.__contains__(self, key):
+            self._touch(key)
+        else:
+            self.expire()
+            if len(self) >= self.capacity:
+                self._evict(self._victim())
+            self._link(key)
+            if self.policy == "lfu":
+                self._uses[key] = self._min_uses = 1
+                self._buckets.setdefault(1, _stdlib.OrderedDict())[key] = None
+        dict.__setitem__(self, key, value)
+        if self.ttl is not None:
+            expires = self._expires
+            expires[key] = self.timer() + self.ttl
+            expires.move_to_end(key)
+
+    def __iter__(self):
+        # Iterate on a copy, so getting items while iterating is safe.
+        return iter(list(super().__iter__()))
+
+    def __reversed__(self):
+        return iter(list(super().__reversed__()))
+
+    def values(self):
+        """D.values() -> an object providing a view on D's values."""
+        getitem = dict.__getitem__
+        for key in self:
+            yield getitem(self, key)
+
+    def items(self):
+        """D.items() -> an object providing a view on D's items."""
+        getitem = dict.__getitem__
+        for key in self:
+            yield (key, getitem(self, key))
+
+    def clear(self):
+        """Remove all entries, but keep the counters."""
+        super().clear()
+        self._expires.clear()
+        self._uses.clear()
+        self._buckets.clear()
+
+    def expire(self):
+        """Remove the expired entries; return how many were removed."""
+        res = 0
+        expires = self._expires
+        if expires:
+            now = self.timer()
+            while expires:
+                key = next(iter(expires))
+                if expires[key] <= now:
+                    self._evict(key)
+                    res += 1
+                else:
+                    break
+        return res
+
+    def cache_info(self):
+        """Return a named tuple with the counters, the capacity and the size."""
+        return _CacheInfo(self.hits, self.misses, self.evictions, self.capacity, len(self))
+
+    def cache_clear(self):
+        """Remove all entries and reset the counters."""
+        self.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    @recursive_repr()
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)"""
+        aux = ", ".join("({!r}, {!r})".format(k, v) for k, v in self.items())
+        return "<{}({}) [{}]>".format(type(self).__name__, self.capacity, aux)
+
+    def __reduce__(self):
+        """Return state information for pickling."""
+        factory = partial(
+            type(self),
+            self.capacity,
+            ttl=self.ttl,
+            policy=self.policy,
+            on_evict=self.on_evict,
+            timer=self.timer,
+        )
+        return factory, (), None, None, iter(self.items())
+
+    def copy(self):
+        """D.copy() -> a shallow copy of D (the counters are not copied)."""
+        factory, args, _, _, items = self.__reduce__()
+        res = factory(*args)
+        res.update(items)
+        return res
+
+    @classmethod
+    def fromkeys(cls, iterable, value=None, **kwds):
+        """RC.fromkeys(S[, v], **options) -> New cache with keys from S.
+
+        Keyword arguments are passed to the constructor.
+
+        """
+        res = cls(**kwds)
+        res.update((key, value) for key in iterable)
+        return res
+
+    def _expired(self, key):
+        if self.ttl is None:
+            return False
+        else:
+            return self._expires[key] <= self.timer()
+
+    def _evict(self, key):
+        """Protected method to remove an entry because of the capacity or TTL."""
+        value = RankedDict.pop(self, key)
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def _victim(self):
+        """Protected method to select the key to evict."""
+        if self.policy == "lfu":
+            buckets = self._buckets
+            uses = self._min_uses
+            if uses not in buckets:
+                uses = self._min_uses = min(buckets)
+            return next(iter(buckets[uses]))
+        else:
+            return self._root.next.key
+
+    def _touch(self, key):
+        """Protected method to rank `key` as the most recently used."""
+        self.move_to_end(key)
+        if self.policy == "lfu":
+            buckets = self._buckets
+            uses = self._uses[key]
+            bucket = buckets[uses]
+            del bucket[key]
+            if not bucket:
+                del buckets[uses]
+                if self._min_uses == uses:
+                    self._min_uses = uses + 1
+            uses += 1
+            self._uses[key] = uses
+            buckets.setdefault(uses, _stdlib.OrderedDict())[key] = None
+
+    def _unlink(self, key):
+        super()._unlink(key)
+        self._expires.pop(key, None)
+        uses = self._uses.pop(key, None)
+        if uses is not None:
+            bucket = self._buckets[uses]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[uses]
+
+
+def _locked(method):
+    """Make a method holding the lock of the instance (``self._lock``)."""
+
+    @wraps(method)
+    def inner(self, *args, **kwds):
+        with self._lock:
+            return method(self, *args, **kwds)
+
+    return inner
+
+
+class LockedRankedCache(RankedCache):
+    """A thread-safe `RankedCache`:class:.
+
+    Every operation holds a re-entrant lock, so `on_evict` callbacks run
+    while the lock is held.  Iteration works on a copy of the keys taken
+    with the lock held.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    def __init__(self, *args, **kwds):
+        from threading import RLock
+
+        self._lock = RLock()
+        super().__init__(*args, **kwds)
+
+    __getitem__ = _locked(RankedCache.__getitem__)
+    __setitem__ = _locked(RankedCache.__setitem__)
+    __delitem__ = _locked(RankedCache.__delitem__)
+    __contains__ = _locked(RankedCache.__contains__)
+    __iter__ = _locked(RankedCache.__iter__)
+    __reversed__ = _locked(RankedCache.__reversed__)
+    get = _locked(RankedCache.get)
+    peek = _locked(RankedCache.peek)
+    pop = _locked(RankedCache.pop)
+    popitem = _locked(RankedCache.popitem)
+    setdefault = _locked(RankedCache.setdefault)
+    update = _locked(RankedCache.update)
+    clear = _locked(RankedCache.clear)
+    expire = _locked(RankedCache.expire)
+    rank = _locked(RankedCache.rank)
+    swap_ranks = _locked(RankedCache.swap_ranks)
+    move_to_end = _locked(RankedCache.move_to_end)
+    cache_info = _locked(RankedCache.cache_info)
+    cache_clear = _locked(RankedCache.cache_clear)
+    copy = _locked(RankedCache.copy)
+
+    def values(self):
+        """D.values() -> an object providing a view on D's values."""
+        with self._lock:
+            return iter(list(super().values()))
+
+    def items(self):
+        """D.items() -> an object providing a view on D's items."""
+        with self._lock:
+            return iter(list(super().items()))
+
+
+class LockedRankedDict(RankedDict):
+    """A thread-safe `RankedDict`:class:.
+
+    Changes hold a re-entrant lock, so the order of keys never drifts from
+    the contents.  Reading keys (``d[key]``, ``key in d``, `get`, `len`) is
+    lock-free.  Iteration works on a copy of the keys taken with the lock
+    held.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    def __init__(*args, **kwds):
+        from threading import RLock
+
+        from xotl.tools.params import issue_9137
+
+        self, args = issue_9137(args)
+        self._lock = RLock()
+        super(LockedRankedDict, self).__init__(*args, **kwds)
+
+    __setitem__ = _locked(RankedDict.__setitem__)
+    __delitem__ = _locked(RankedDict.__delitem__)
+    __eq__ = _locked(RankedDict.__eq__)
+    __repr__ = _locked(RankedDict.__repr__)
+    __reduce__ = _locked(RankedDict.__reduce__)
+    pop = _locked(RankedDict.pop)
+    popitem = _locked(RankedDict.popitem)
+    setdefault = _locked(RankedDict.setdefault)
+    clear = _locked(RankedDict.clear)
+    rank = _locked(RankedDict.rank)
+    swap_ranks = _locked(RankedDict.swap_ranks)
+    move_to_end = _locked(RankedDict.move_to_end)
+    copy = _locked(RankedDict.copy)
+
+    def update(*args, **kwds):
+        """Like `RankedDict.update`:meth: but holding the lock."""
+        from xotl.tools.params import issue_9137
+
+        self, args = issue_9137(args)
+        with self._lock:
+            super(LockedRankedDict, self).update(*args, **kwds)
+
+    def __iter__(self):
+        """rd.__iter__() <==> iter(rd)"""
+        with self._lock:
+            return iter(list(super().__iter__()))
+
+    def __reversed__(self):
+        """rd.__reversed__() <==> reversed(rd)"""
+        with self._lock:
+            return iter(list(super().__reversed__()))
+
+    def values(self):
+        """D.values() -> an object providing a view on D's values."""
+        with self._lock:
+            return iter(list(super().values()))
+
+    def items(self):
+        """D.items() -> an object providing a view on D's items."""
+        with self._lock:
+            return iter(list(super().items()))
+
+
+def ranked_cache(capacity=128, *, ttl=None, policy="lru", typed=False, locked=True, on_evict=None):
+    """Decorator to memoize a function in a `RankedCache`:class:.
+
+    Similar to `functools.lru_cache`:func:, but with the options of
+    `RankedCache`:class: (`ttl`, `policy` and `on_evict`).  If `typed` is
+    True, arguments of different types are cached separately.  The cache is
+    a `LockedRankedCache`:class: unless `locked` is False.
+
+    The decorated function has the attributes `cache` (the mapping),
+    `cache_info()` and `cache_clear()`.  It can be used without arguments::
+
+      >>> @ranked_cache
+      ... def square(x):
+      ...     return x * x
+
+      >>> square(3), square(3), square.cache_info().hits
+      (9, 9, 1)
+
+    .. versionadded:: 3.4.0
+
+    """
+    if callable(capacity):
+        return ranked_cache()(capacity)
+    factory = LockedRankedCache if locked else RankedCache
+
+    def decorator(func):
+        cache = factory(capacity, ttl=ttl, policy=policy, on_evict=on_evict)
+
+        @wraps(func)
+        def inner(*args, **kwds):
+            key = args
+            if kwds:
+                key += (Unset,) + tuple(kwds.items())
+            if typed:
+                key += tuple(type(v) for v in args) + tuple(type(v) for v in kwds.values())
+            res = cache.get(key, Unset)
+            if res is Unset:
+                res = cache[key] = func(*args, **kwds)
+            return res
+
+        inner.cache = cache
+        inner.cache_info = cache.cache_info
+        inner.cache_clear = cache.cache_clear
+        return inner
+
+    return decorator
+
+
 class OrderedSmartDict(SmartDictMixin, _stdlib.OrderedDict):  # type: ignore
     """A combination of the `OrderedDict` with the `SmartDictMixin`.
 
@@ -894,7 +2130,7 @@ class OrderedSmartDict(SmartDictMixin, _stdlib.OrderedDict):  # type: ignore
         from xotl.tools.params import issue_9137
 
         self, args = issue_9137(args)
-        super().__init__()
+        super(OrderedSmartDict, self).__init__()
         self.update(*args, **kwds)
 
 
@@ -913,99 +2149,1202 @@ class MetaSet(type):
         return cls(*ranges) if isinstance(ranges, tuple) else cls(ranges)
 
 
-class PascalSet(metaclass=MetaSet):
-    """Collection of unique integer elements (implemented with intervals).
+def _merge_intervals(a, b, op, res=None):
+    """Combine two sorted lists of interval boundaries in a single sweep.
 
-    ::
+    Both `a` and `b` are flat sequences ``[s1, e1, s2, e2, ...]`` of closed,
+    disjoint and non-adjacent intervals (the `PascalSet._items` layout).  `op`
+    is a boolean function ``op(in_a, in_b)`` defining the resulting set (union,
+    intersection, etc.)
 
-       PascalSet(*others) -> new set object
+    Return `res` (a new list if None) filled with the resulting boundaries in
+    the same layout.  The cost is linear in the total number of boundaries.
 
-    .. versionadded:: 1.7.1
+    """
+    if res is None:
+        res = []
+    i, j = 0, 0
+    na, nb = len(a), len(b)
+    tail_a, tail_b = op(True, False), op(False, True)
+    ina = inb = inres = False
+    while i < na and j < nb:
+        # Ends are moved one step right to work with half-open intervals,
+        # so adjacent intervals of both operands are coalesced.
+        x, y = a[i] + (i & 1), b[j] + (j & 1)
+        pos = x if x <= y else y
+        if x == pos:
+            ina = not ina
+            i += 1
+        if y == pos:
+            inb = not inb
+            j += 1
+        current = op(ina, inb)
+        if current != inres:
+            res.append(pos if current else pos - 1)
+            inres = current
+    # At most one of the operands is not exhausted and the other one is
+    # outside of any interval, so the rest is either copied or dropped.
+    if i < na and tail_a:
+        res.extend(a[i:])
+    elif j < nb and tail_b:
+        res.extend(b[j:])
+    return res
+
+
+def _insert_interval(ls, start, end, items_type=list):
+    """Insert the closed interval [start, end] in the flat list `ls`.
+
+    `items_type` is the type of `ls`, used to build the slice to replace.
+    Return how many integers were actually added.
 
     """
+    # Find the slice of intervals touching or adjacent to [start, end]
+    lo = bisect_left(ls, start - 1)
+    if lo & 1:  # inside an interval, go to its start
+        lo -= 1
+    hi = bisect_right(ls, end + 1)
+    if hi & 1:  # inside an interval, go after its end
+        hi += 1
+    if lo < hi:
+        start, end = min(start, ls[lo]), max(end, ls[hi - 1])
+        removed = _interval_count(ls[lo:hi])
+    else:
+        removed = 0
+    ls[lo:hi] = items_type((start, end))
+    return end - start + 1 - removed
+
+
+def _remove_interval(ls, start, end, items_type=list):
+    """Remove the closed interval [start, end] from the flat list `ls`.
+
+    Return how many integers were actually removed.
 
-    __slots__ = ("_items",)
+    """
+    # Find the slice of intervals overlapping [start, end]
+    lo = bisect_left(ls, start)
+    if lo & 1:
+        lo -= 1
+    hi = bisect_right(ls, end)
+    if hi & 1:
+        hi += 1
+    if lo < hi:
+        kept = []
+        if ls[lo] < start:
+            kept.extend((ls[lo], start - 1))
+        if ls[hi - 1] > end:
+            kept.extend((end + 1, ls[hi - 1]))
+        res = _interval_count(ls[lo:hi]) - _interval_count(kept)
+        ls[lo:hi] = items_type(kept)
+        return res
+    else:
+        return 0
 
-    def __init__(self, *others):
-        """Initialize self.
 
-        :param others: Any number of integer or collection of integers that
-               will be the set members.
+_SET_HEADER = struct.Struct("<4sBBHQQ")
+_SET_MAGIC = b"XTPS"
+_SET_VERSION = 1
 
-        """
-        self._items = []  # a list of list of two elements
-        self.update(*others)
 
-    def __str__(self):
-        def aux(s, e):
-            if s == e:
-                return str(s)
-            elif s + 1 == e:
-                return "%s, %s" % (s, e)
-            else:
-                return "%s..%s" % (s, e)
+def _words_to_bytes(typecode, items):
+    """Return the little-endian bytes of 64-bit `items`."""
+    res = array(typecode, items)
+    if sys.byteorder == "big":
+        res.byteswap()
+    return res.tobytes()
 
-        ls = self._items
-        ranges = ((ls[i], ls[i + 1]) for i in range(0, len(ls), 2))
-        return str("{%s}" % ", ".join((aux(s, e) for (s, e) in ranges)))
 
-    def __repr__(self):
-        cls = type(self)
-        cname = cls.__name__
-        return str("%s([%s])" % (cname, ", ".join((str(i) for i in self))))
+def _words_from_buffer(view, typecode):
+    """Return the little-endian 64-bit words in the bytes `view`.
+
+    In little-endian platforms the result is a read-only view over the same
+    memory.
+
+    """
+    if sys.byteorder == "little":
+        return view.cast(typecode)
+    else:
+        res = array(typecode, view.tobytes())
+        res.byteswap()
+        return res
+
+
+def _read_set_header(buffer, offset, kind, width):
+    """Validate the binary representation of a set at `offset` in `buffer`.
+
+    `kind` is 0 for interval sets and 1 for bit-wise sets; `width` is the
+    size in bytes of each item (as given in the header).
+
+    Return ``(extra, length, count, payload)``, being `payload` a bytes
+    read-only `memoryview` with the items.
+
+    """
+    view = memoryview(buffer).toreadonly().cast("B")[offset:]
+    try:
+        magic, version, found, extra, length, count = _SET_HEADER.unpack_from(view)
+    except struct.error:
+        raise ValueError("Buffer too short for a set") from None
+    if magic != _SET_MAGIC or found != kind:
+        raise ValueError("Buffer doesn't hold a valid set")
+    elif version > _SET_VERSION:
+        raise ValueError("Unsupported format version %s" % version)
+    start = _SET_HEADER.size
+    end = start + length * width
+    if len(view) < end:
+        raise ValueError("Buffer too short for a set")
+    return extra, length, count, view[start:end]
+
+
+def _intervals_cover(outer, inner):
+    """Check if every interval in `inner` is inside an interval of `outer`.
+
+    Both are flat lists of intervals (see `_merge_intervals`:func:).  Since
+    `inner` is sorted each search starts where the previous one ended.
+
+    """
+    lo, count = 0, len(outer)
+    for i in range(0, len(inner), 2):
+        start = inner[i]
+        lo = bisect_left(outer, start, lo)
+        if lo & 1:  # inside an interval
+            limit = outer[lo]
+        elif lo < count and outer[lo] == start:
+            limit = outer[lo + 1]
+        else:
+            return False
+        if inner[i + 1] > limit:
+            return False
+    return True
+
+
+def _interval_difference(a, b):
+    return a and not b
+
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+
+    def _popcount(value):
+        return bin(value).count("1")
+
+
+def _bitmap_difference(a, b):
+    return a & ~b
+
+
+def _interval_count(ls):
+    """Return how many integers are in the flat list of intervals `ls`."""
+    return sum(ls[1::2]) - sum(ls[::2]) + len(ls) // 2
+
+
+class PascalSet(metaclass=MetaSet):
+    """Collection of unique integer elements (implemented with intervals).
+
+    ::
+
+       PascalSet(*others) -> new set object
+
+    .. versionadded:: 1.7.1
+
+    """
+
+    __slots__ = ("_items", "_count", "_index", "_hash")
+    # Constructor of the (flat) boundaries storage
+    _items_type: Callable[..., MutableSequence[int]] = list
+
+    def __init__(self, *others):
+        """Initialize self.
+
+        :param others: Any number of integer or collection of integers that
+               will be the set members.
+
+        """
+        self._items = self._items_type()  # flat list of (start, end) pairs
+        self._count = 0  # cardinality, kept in sync with `_items`
+        self._index = None  # cumulative sizes of intervals, built on demand
+        self._hash = None  # cached hash value
+        self.update(*others)
+
+    @classmethod
+    def from_sorted(cls, iterable):
+        """Create a set from an iterable of integers in ascending order.
+
+        Consecutive runs are coalesced into intervals in a single streaming
+        pass with constant extra memory (besides the resulting set).
+        Duplicates are allowed.
+
+        If a value out of order is found, the rest of `iterable` is processed
+        the general (slower) way; so the result is always correct.
+
+        .. versionadded:: 3.4.0
+
+        """
+        res = cls()
+        ls = res._items
+        count = 0
+        start = end = rest = None
+        items = iter(iterable)
+        for item in items:
+            if not isinstance(item, int):
+                raise res._invalid_value(item)
+            elif end is None:
+                start = end = item
+            elif item == end + 1:
+                end = item
+            elif item > end:
+                ls.extend((start, end))
+                count += end - start + 1
+                start = end = item
+            elif item < start:
+                rest = cls(item)
+                break
+        if end is not None:
+            ls.extend((start, end))
+            count += end - start + 1
+        res._count = count
+        if rest is not None:
+            rest.update(items)
+            res._merge(rest, or_)
+        return res
+
+    def to_bytes(self):
+        """Return a compact binary representation of this set.
+
+        The format is a small versioned header followed by the boundaries of
+        the intervals as little-endian signed 64-bit integers.  Use
+        `from_buffer`:meth: to load it.
+
+        Raise an `OverflowError` if any member doesn't fit in 64 bits.
+
+        .. versionadded:: 3.4.0
+
+        """
+        ls = self._items
+        header = _SET_HEADER.pack(_SET_MAGIC, _SET_VERSION, 0, 0, len(ls), self._count)
+        return header + _words_to_bytes("q", ls)
+
+    @classmethod
+    def from_buffer(cls, buffer, offset=0):
+        """Create a set from the binary representation in `buffer`.
+
+        `buffer` is any object supporting the buffer protocol (`bytes`,
+        `mmap.mmap`, etc.) holding the result of `to_bytes`:meth: at
+        `offset`.
+
+        On little-endian platforms no data is copied: the set is a view over
+        `buffer` until it's modified in place (then it gets a private copy
+        of its intervals).  So, several processes can share a single copy
+        of a set by mapping the same file::
+
+           >>> with open(path, "rb") as f:                  # doctest: +SKIP
+           ...     data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+           >>> allowed = PascalSet.from_buffer(data)        # doctest: +SKIP
+
+        Raise `ValueError` if `buffer` doesn't hold a valid set.
+
+        .. versionadded:: 3.4.0
+
+        """
+        _extra, _length, count, payload = _read_set_header(buffer, offset, 0, 8)
+        ls = _words_from_buffer(payload, "q")
+        res = cls()
+        res._items = ls if isinstance(ls, memoryview) else res._items_type(ls)
+        res._count = count
+        return res
+
+    def __getstate__(self):
+        # Sets loaded with `from_buffer` get a copy of their intervals, since
+        # memory views can't be pickled.
+        state = {name: getattr(self, name) for name in PascalSet.__slots__}
+        state["_items"] = self._items_type(self._items)
+        return None, state
+
+    def __str__(self):
+        def aux(s, e):
+            if s == e:
+                return str(s)
+            elif s + 1 == e:
+                return "%s, %s" % (s, e)
+            else:
+                return "%s..%s" % (s, e)
+
+        ls = self._items
+        ranges = ((ls[i], ls[i + 1]) for i in range(0, len(ls), 2))
+        return str("{%s}" % ", ".join((aux(s, e) for (s, e) in ranges)))
+
+    def __repr__(self):
+        cls = type(self)
+        cname = cls.__name__
+        return str("%s([%s])" % (cname, ", ".join((str(i) for i in self))))
+
+    def __iter__(self):
+        ls = self._items
+        i, count = 0, len(ls)
+        while i < count:
+            s, e = ls[i], ls[i + 1]
+            while s <= e:
+                yield s
+                s += 1
+            i += 2
+
+    def __len__(self):
+        return self._count
+
+    def __nonzero__(self):
+        return bool(self._items)
+
+    __bool__ = __nonzero__
+
+    def __contains__(self, other):
+        """True if set has an element ``other``, else False."""
+        return isinstance(other, int) and self._search(other)[0]
+
+    def __hash__(self):
+        """Compute the hash value of a set.
+
+        The value is the same of `frozenset` (equal sets must have the same
+        hash) and it's cached until the set is modified.
+
+        """
+        res = self._hash
+        if res is None:
+            res = self._hash = Set._hash(self)
+        return res
+
+    def __eq__(self, other):
+        """Python 2 and 3 have several differences in operator definitions.
+
+        For example::
+
+          >>> from xotl.tools.future.collections import PascalSet
+          >>> s1 = PascalSet[0:10]
+          >>> assert s1 == set(s1)    # OK (True) in 2 and 3
+          >>> assert set(s1) == s1    # OK in 3, fails in 2
+
+        """
+        if isinstance(other, Set):
+            ls, lo = len(self), len(other)
+            if ls == lo:
+                if isinstance(other, PascalSet):
+                    return self._same_items(other)
+                elif isinstance(other, BitPascalSet):
+                    return list(self._items) == other._intervals()
+                else:
+                    return self.count(other) == ls
+            else:
+                return False
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __gt__(self, other):
+        if isinstance(other, Set):
+            if other:
+                return self.issuperset(other) and len(self) > len(other)
+            else:
+                return bool(self._items)
+        else:
+            return NotImplemented
+
+    def __ge__(self, other):
+        if isinstance(other, Set):
+            return self.issuperset(other)
+        else:
+            return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Set):
+            return len(self) < len(other) and self.issubset(other)
+        else:
+            return NotImplemented
+
+    def __le__(self, other):
+        if isinstance(other, Set):
+            if other:
+                return self.issubset(other)
+            else:
+                return not self._items
+        else:
+            return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Set):
+            return self.difference(other)
+        else:
+            return NotImplemented
+
+    def __isub__(self, other):
+        if isinstance(other, Set):
+            self.difference_update(other)
+            return self
+        else:
+            return NotImplemented
+
+    def __rsub__(self, other):
+        if isinstance(other, Set):
+            return other - type(other)(self)
+        else:
+            return NotImplemented
+
+    def __and__(self, other):
+        if isinstance(other, Set):
+            return self.intersection(other)
+        else:
+            return NotImplemented
+
+    def __iand__(self, other):
+        if isinstance(other, Set):
+            self.intersection_update(other)
+            return self
+        else:
+            return NotImplemented
+
+    def __rand__(self, other):
+        if isinstance(other, Set):
+            return other & type(other)(self)
+        else:
+            return NotImplemented
+
+    def __or__(self, other):
+        if isinstance(other, Set):
+            return self.union(other)
+        else:
+            return NotImplemented
+
+    def __ior__(self, other):
+        if isinstance(other, Set):
+            self.update(other)
+            return self
+        else:
+            return NotImplemented
+
+    def __ror__(self, other):
+        if isinstance(other, Set):
+            return other | type(other)(self)
+        else:
+            return NotImplemented
+
+    def __xor__(self, other):
+        if isinstance(other, Set):
+            return self.symmetric_difference(other)
+        else:
+            return NotImplemented
+
+    def __ixor__(self, other):
+        if isinstance(other, Set):
+            self.symmetric_difference_update(other)
+            return self
+        else:
+            return NotImplemented
+
+    def __rxor__(self, other):
+        if isinstance(other, Set):
+            return other ^ type(other)(self)
+        else:
+            return NotImplemented
+
+    def count(self, other):
+        """Number of occurrences of any member of other in this set.
+
+        If other is an integer, return 1 if present, 0 if not.
+
+        """
+        if isinstance(other, int):
+            return 1 if other in self else 0
+        else:
+            return sum((i in self for i in other), 0)
+
+    def add(self, other):
+        """Add an element to a set.
+
+        This has no effect if the element is already present.
+
+        """
+        self._insert(other)
+
+    def union(self, *others):
+        """Return the union of sets as a new set.
+
+        (i.e. all elements that are in either set.)
+
+        """
+        res = self.copy()
+        res.update(*others)
+        return res
+
+    def update(self, *others):
+        """Update a set with the union of itself and others."""
+        for other in others:
+            if isinstance(other, PascalSet):
+                self._merge(other, or_)
+            elif isinstance(other, int):
+                self._insert(other)
+            elif isinstance(other, Iterable):
+                for i in other:
+                    self._insert(i)
+            elif isinstance(other, slice):
+                start, stop, step = other.start, other.stop, other.step
+                if step is None:
+                    step = 1
+                if step in (1, -1):
+                    stop -= step
+                    if step == -1:
+                        start, stop = stop, start
+                    self._insert(start, stop)
+                else:
+                    for i in range(start, stop, step):
+                        self._insert(i)
+            else:
+                raise self._invalid_value(other)
+
+    def intersection(self, *others):
+        """Return the intersection of two or more sets as a new set.
+
+        (i.e. elements that are common to all of the sets.)
+
+        """
+        res = self.copy()
+        res.intersection_update(*others)
+        return res
+
+    def intersection_update(self, *others):
+        """Update a set with the intersection of itself and another."""
+        oi, count = 0, len(others)
+        while self._items and oi < count:
+            other = others[oi]
+            if not isinstance(other, PascalSet):
+                # safe mode for intersection
+                other = PascalSet(i for i in other if isinstance(i, int))
+            self._merge(other, and_)
+            oi += 1
+
+    def difference(self, *others):
+        """Return the difference of two or more sets as a new set.
+
+        (i.e. all elements that are in this set but not the others.)
+
+        """
+        res = self.copy()
+        res.difference_update(*others)
+        return res
+
+    def difference_update(self, *others):
+        """Remove all elements of another set from this set."""
+        for other in others:
+            if self._items:
+                if not isinstance(other, PascalSet):
+                    other = PascalSet(i for i in other if isinstance(i, int))
+                self._merge(other, _interval_difference)
+
+    def symmetric_difference(self, other):
+        """Return the symmetric difference of two sets as a new set.
+
+        (i.e. all elements that are in exactly one of the sets.)
+
+        """
+        res = self.copy()
+        res.symmetric_difference_update(other)
+        return res
+
+    def symmetric_difference_update(self, other):
+        "Update a set with the symmetric difference of itself and another."
+        if not isinstance(other, PascalSet):
+            other = PascalSet(other)
+        self._merge(other, xor)
+
+    def discard(self, other):
+        """Remove an element from a set if it is a member.
+
+        If the element is not a member, do nothing.
+
+        """
+        self._remove(other)
+
+    def remove(self, other):
+        """Remove an element from a set; it must be a member.
+
+        If the element is not a member, raise a KeyError.
+
+        """
+        if other in self:
+            self._remove(other)
+        else:
+            raise KeyError('"%s" is not a member!' % other)
+
+    def pop(self):
+        """Remove and return an arbitrary set element.
+
+        Raises KeyError if the set is empty.
+
+        """
+        ls = self._items
+        if ls:
+            ls = self._own_items()
+            res = ls[0]
+            if ls[0] < ls[1]:
+                ls[0] += 1
+            else:
+                del ls[0:2]
+            self._count -= 1
+            self._index = self._hash = None
+            return res
+        else:
+            raise KeyError("pop from an empty set!")
+
+    def clear(self):
+        """Remove all elements from this set."""
+        self._items = self._items_type()
+        self._count = 0
+        self._index = self._hash = None
+
+    def copy(self):
+        """Return a shallow copy of a set."""
+        return type(self)(self)
+
+    def isdisjoint(self, other):
+        """Return True if two sets have a null intersection."""
+        if isinstance(other, PascalSet):
+            if self and other:
+                ls, o = self._items, other._items
+                i, lcount, ocount = 0, len(ls), len(o)
+                maybe = True
+                while maybe and i < lcount:
+                    found, idx = other._search(ls[i])
+                    if idx == ocount:  # exhausted
+                        # assert not found
+                        i = lcount
+                    elif found or ls[i + 1] >= o[idx]:
+                        maybe = False
+                    else:
+                        i += 2
+                return maybe
+            else:
+                return True
+        else:
+            return not any(i in self for i in other)
+
+    def issubset(self, other):
+        """Report whether another set contains this set."""
+        ls = len(self)
+        if isinstance(other, (PascalSet, BitPascalSet)):
+            if ls > len(other):  # Fast check for obvious cases
+                return False
+            elif isinstance(other, PascalSet):
+                return _intervals_cover(other._items, self._items)
+            else:
+                return _intervals_cover(other._intervals(), self._items)
+        elif isinstance(other, Sized) and ls > len(other):
+            # Fast check for obvious cases
+            return False
+        elif isinstance(other, Container):
+            aux = next((i for i in self if i not in other), Unset)
+            return aux is Unset
+        else:
+            # Generator cases
+            from functools import reduce
+            from operator import add
+
+            lo = reduce(add, (i in self for i in other), 0)
+            return lo == ls
+
+    def issuperset(self, other):
+        """Report whether this set contains another set."""
+        ls = len(self)
+        if isinstance(other, (PascalSet, BitPascalSet)):
+            if ls < len(other):  # Fast check for obvious cases
+                return False
+            elif isinstance(other, PascalSet):
+                return _intervals_cover(self._items, other._items)
+            else:
+                return _intervals_cover(self._items, other._intervals())
+        elif isinstance(other, Sized) and ls < len(other):
+            # Fast check for obvious cases
+            return False
+        else:
+            aux = next((i for i in other if i not in self), Unset)
+            return aux is Unset
+
+    def contains_many(self, values):
+        """Test the membership of many values at once.
+
+        Return a `bytearray` with a flag (0 or 1) for each item in `values`.
+        Sorted batches are tested in a single merge pass over the intervals.
+
+        If `values` is a NumPy array, return a NumPy array of booleans
+        computed with ``numpy.searchsorted``.  NumPy is not required
+        otherwise.
+
+        .. versionadded:: 3.4.0
+
+        """
+        numpy = sys.modules.get("numpy")
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            return self._numpy_contains(numpy, values)
+        else:
+            return bytearray(self._iter_contains(values))
+
+    def filter(self, values):
+        """Return the items in `values` which are members of this set.
+
+        The result is a list, or a NumPy array if `values` is one.  See
+        `contains_many`:meth:.
+
+        .. versionadded:: 3.4.0
+
+        """
+        numpy = sys.modules.get("numpy")
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            return values[self._numpy_contains(numpy, values)]
+        else:
+            values = list(values)
+            return list(compress(values, self._iter_contains(values)))
+
+    def _iter_contains(self, values):
+        """Yield the membership flag of each item in `values`."""
+        ls = self._items
+        lo, last = 0, None
+        for value in values:
+            if isinstance(value, int):
+                if last is not None and value < last:
+                    lo = 0  # not sorted, search again in all intervals
+                idx = lo = bisect_right(ls, value, lo)
+                last = value
+                # inside an interval, or at the end of the previous one
+                yield 1 if idx & 1 or (idx and ls[idx - 1] == value) else 0
+            else:
+                yield 0
+
+    def _numpy_contains(self, numpy, values):
+        bounds = numpy.asarray(self._items, dtype=numpy.int64)
+        if len(bounds):
+            idx = numpy.searchsorted(bounds, values, side="right")
+            # When `idx` is 0, ``bounds[-1]`` is never equal to the value
+            return (idx & 1).astype(bool) | (bounds[idx - 1] == values)
+        else:
+            return numpy.zeros(numpy.shape(values), dtype=bool)
+
+    def rank(self, value):
+        """Return how many members are lesser than `value`.
+
+        Run in ``O(log k)`` time, being ``k`` the number of intervals.
+
+        .. versionadded:: 3.4.0
+
+        """
+        if isinstance(value, int):
+            ls = self._items
+            idx = bisect_left(ls, value)
+            if idx & 1:  # inside an interval
+                return self._cumulative()[idx >> 1] + value - ls[idx - 1]
+            else:
+                return self._cumulative()[idx >> 1]
+        else:
+            raise self._invalid_value(value)
+
+    def select(self, index):
+        """Return the member at position `index` in ascending order.
+
+        Negative values count from the end, as in sequences.  Raise an
+        `IndexError` if `index` is out of range.
+
+        Run in ``O(log k)`` time, being ``k`` the number of intervals.
+
+        .. versionadded:: 3.4.0
+
+        """
+        count = self._count
+        if index < 0:
+            index += count
+        if 0 <= index < count:
+            cumulative = self._cumulative()
+            pos = bisect_right(cumulative, index) - 1
+            return self._items[2 * pos] + index - cumulative[pos]
+        else:
+            raise IndexError("set index out of range")
+
+    def count_range(self, start, end):
+        """Return how many members are in the closed interval [start, end].
+
+        Run in ``O(log k)`` time, being ``k`` the number of intervals.
+
+        .. versionadded:: 3.4.0
+
+        """
+        if start <= end:
+            return self.rank(end + 1) - self.rank(start)
+        else:
+            return 0
+
+    def iter_range(self, start, end):
+        """Iterate (ascending) over the members in the interval [start, end].
+
+        Run in ``O(log k + m)`` time, being ``k`` the number of intervals and
+        ``m`` the number of members yielded.
+
+        .. versionadded:: 3.4.0
+
+        """
+        ls = self._items
+        idx = bisect_left(ls, start)
+        if idx & 1:
+            idx -= 1
+        count = len(ls)
+        while idx < count and ls[idx] <= end:
+            yield from range(max(ls[idx], start), min(ls[idx + 1], end) + 1)
+            idx += 2
+
+    def _cumulative(self):
+        """Return the list of how many members are before each interval.
+
+        It has an extra last item with the total.  It's cached until the set
+        is modified.
+
+        """
+        res = self._index
+        if res is None:
+            ls = self._items
+            sizes = (ls[i + 1] - ls[i] + 1 for i in range(0, len(ls), 2))
+            res = self._index = list(accumulate(sizes, initial=0))
+        return res
+
+    def _search(self, other):
+        """Search the pair where ``other`` is placed.
+
+        Return a duple :``(if found or not, index)``.
+
+        """
+        if isinstance(other, int):
+            ls = self._items
+            start, end = 0, len(ls)
+            res, pivot = False, 2 * (end // 4)
+            while not res and start < end:
+                s, e = ls[pivot], ls[pivot + 1]
+                if other < s:
+                    end = pivot
+                elif other > e:
+                    start = pivot + 2
+                else:
+                    res = True
+                pivot = start + 2 * ((end - start) // 4)
+            return res, pivot
+        else:
+            raise self._invalid_value(other)
+
+    def _insert(self, start, end=None):
+        """Insert an interval of integers."""
+        if end is None:
+            end = start
+        if not isinstance(start, int):
+            raise self._invalid_value(start)
+        elif not isinstance(end, int):
+            raise self._invalid_value(end)
+        assert start <= end
+        self._count += _insert_interval(self._own_items(), start, end, self._items_type)
+        self._index = self._hash = None
+
+    def _remove(self, start, end=None):
+        """Remove an interval of integers."""
+        if end is None:
+            end = start
+        if not isinstance(start, int):
+            raise self._invalid_value(start)
+        elif not isinstance(end, int):
+            raise self._invalid_value(end)
+        assert start <= end
+        delta = _remove_interval(self._own_items(), start, end, self._items_type)
+        if delta:
+            self._count -= delta
+            self._index = self._hash = None
+
+    def _own_items(self):
+        """Return `_items` ready to be modified in place.
+
+        Sets loaded with `from_buffer`:meth: share the buffer until they are
+        modified.
+
+        """
+        ls = self._items
+        if isinstance(ls, memoryview):
+            ls = self._items = self._items_type(ls)
+        return ls
+
+    def _merge(self, other, op):
+        """Replace the intervals of this set by ``op(self, other)``.
+
+        See `_merge_intervals`:func:.
+
+        """
+        ls = _merge_intervals(self._items, other._items, op, self._items_type())
+        self._items = ls
+        self._count = _interval_count(ls)
+        self._index = self._hash = None
+
+    def _same_items(self, other):
+        """Compare the boundaries of two (maybe differently stored) sets."""
+        ls, o = self._items, other._items
+        if type(ls) is type(o):
+            return ls == o
+        else:
+            return len(ls) == len(o) and all(s == e for s, e in zip(ls, o))
+
+    def _invalid_value(self, value):
+        cls_name = type(self).__name__
+        vname = type(value).__name__
+        msg = 'Unsupported type for  value "%s" of type "%s" for a "%s", must be an integer!'
+        return TypeError(msg % (value, vname, cls_name))
+
+    @classmethod
+    def _prime_numbers_until(cls, limit):
+        """This is totally a funny test method."""
+        res = cls[2:limit]
+        for i in range(2, limit // 2 + 1):
+            if i in res:
+                aux = i + i
+                while aux < limit:
+                    if aux in res:
+                        res.remove(aux)
+                    aux += i
+        return res
+
+
+MutableSet.register(PascalSet)
+
+
+class CompactPascalSet(PascalSet):
+    """A `PascalSet`:class: storing its intervals in a compact array.
+
+    ::
+
+       CompactPascalSet(*others) -> new set object
+
+    Boundaries are kept in an ``array('q')`` (machine 64-bit signed integers)
+    instead of a list of Python integers.  This takes 8 bytes per boundary,
+    but members are limited to the range of a signed 64-bit integer;
+    otherwise an `OverflowError` is raised.
+
+    The API is the same of `PascalSet`:class:; both types can be freely
+    combined.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    __slots__ = ()
+    _items_type = partial(array, "q")
+
+    def as_memoryview(self):
+        """Return a read-only `memoryview` over the interval boundaries.
+
+        No data is copied.  The view has the format ``'q'`` and holds the
+        flat sequence ``[start1, end1, start2, end2, ...]`` of closed
+        intervals.
+
+        While the view is alive, some in-place modifications of the set
+        may raise a `BufferError`; release it as soon as possible.
+
+        """
+        return memoryview(self._items).toreadonly()
+
+
+class BitPascalSet(metaclass=MetaSet):
+    """Collection of unique integer elements (implemented with bit-wise sets).
+
+    ::
+
+        BitPascalSet(*others) -> new bit-set object
+
+    .. versionadded:: 1.7.1
+
+    """
+
+    __slots__ = ("_items", "_count", "_hash")
+    _bit_length = 62  # How many values are stored in each item
+
+    def __init__(self, *others):
+        """Initialize self.
+
+        :param others: Any number of integer or collection of integers that
+               will be the set members.
+
+        In this case `_items` is a dictionary with keys containing number
+        division seeds and values bit-wise integers (each bit is the division
+        modulus position).
+
+        """
+        self._items = {}
+        self._count = 0  # cardinality, kept in sync with `_items`
+        self._hash = None  # cached hash value
+        self.update(*others)
+
+    def __str__(self):
+        if self:
+            return str(PascalSet(self))
+        else:
+            cname = type(self).__name__
+            return str("%s([])") % cname
+
+    def __repr__(self):
+        cname = type(self).__name__
+        res = str(", ").join(str(i) for i in self)
+        return str("%s([%s])") % (cname, res)
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+    def to_bytes(self):
+        """Return a compact binary representation of this bit-set.
+
+        The format is the same versioned header of `PascalSet.to_bytes`:meth:
+        followed by the sorted keys of the bit-wise items as little-endian
+        signed 64-bit integers, and then the items as little-endian unsigned
+        64-bit words.  Use `from_buffer`:meth: to load it.
+
+        .. versionadded:: 3.4.0
+
+        """
+        sm = self._items
+        keys = sorted(sm)
+        header = _SET_HEADER.pack(
+            _SET_MAGIC, _SET_VERSION, 1, self._bit_length, len(keys), self._count
+        )
+        words = _words_to_bytes("Q", (sm[k] for k in keys))
+        return header + _words_to_bytes("q", keys) + words
+
+    @classmethod
+    def from_buffer(cls, buffer, offset=0):
+        """Create a bit-set from the binary representation in `buffer`.
+
+        See `PascalSet.from_buffer`:meth:.  The keys and words are read
+        directly from `buffer` but, unlike interval sets, the bit-set is
+        always built in its own memory.
+
+        .. versionadded:: 3.4.0
+
+        """
+        bit_length, length, count, payload = _read_set_header(buffer, offset, 1, 16)
+        if bit_length != cls._bit_length:
+            raise ValueError("Bit-set items of %s bits are not supported" % bit_length)
+        keys = _words_from_buffer(payload[: 8 * length], "q")
+        words = _words_from_buffer(payload[8 * length :], "Q")
+        res = cls()
+        res._items = dict(zip(keys, words))
+        res._count = count
+        return res
+
+    def iter_chunks(self):
+        """Iterate over the members in sorted chunks.
+
+        Each chunk is a list with the members stored in the same bit-wise
+        item (at most `_bit_length` members).  This avoids a generator round
+        trip per member when processing big sets.
+
+        .. versionadded:: 3.4.0
+
+        """
+        bl = self._bit_length
+        sm = self._items
+        for k in sorted(sm):
+            yield self._decode(k * bl, sm[k])
+
+    def to_array(self, typecode="q"):
+        """Return all members, sorted, in an `array.array`.
+
+        :param typecode: The type code of the array.  The default (``'q'``)
+               is a signed 64-bit integer.
+
+        .. versionadded:: 3.4.0
+
+        """
+        res = array(typecode)
+        for chunk in self.iter_chunks():
+            res.extend(chunk)
+        return res
+
+    def _intervals(self):
+        """Return the members as a flat list of intervals.
+
+        The layout is the same of `PascalSet`:class: items.  Runs of bits are
+        found with bit-wise tricks, so the cost depends on the number of
+        runs, not on the number of members.
 
-    def __iter__(self):
-        ls = self._items
-        i, count = 0, len(ls)
-        while i < count:
-            s, e = ls[i], ls[i + 1]
-            while s <= e:
-                yield s
-                s += 1
-            i += 2
+        """
+        bl = self._bit_length
+        sm = self._items
+        res = []
+        for k in sorted(sm):
+            v = sm[k]
+            base = k * bl
+            starts = self._decode(base, v & ~(v << 1))
+            ends = self._decode(base, v & ~(v >> 1))
+            if res and res[-1] + 1 == starts[0]:
+                # The run continues from the previous item
+                res[-1] = ends[0]
+                del starts[0], ends[0]
+            for start, end in zip(starts, ends):
+                res.extend((start, end))
+        return res
 
-    def __len__(self):
-        res = 0
-        ls = self._items
-        i, count = 0, len(ls)
-        while i < count:
-            res += ls[i + 1] - ls[i] + 1
-            i += 2
+    @staticmethod
+    def _decode(base, value):
+        """Return the list of members encoded in a bit-wise `value`."""
+        res = []
+        base -= 1
+        while value:
+            low = value & -value  # jump to the lowest set bit
+            res.append(base + low.bit_length())
+            value ^= low
         return res
 
+    def __len__(self):
+        return self._count
+
     def __nonzero__(self):
         return bool(self._items)
 
     __bool__ = __nonzero__
 
     def __contains__(self, other):
-        """True if set has an element ``other``, else False."""
-        return isinstance(other, int) and self._search(other)[0]
+        """True if this bit-set has the element ``other``, else False."""
+        res = self._search(other)
+        if res:
+            _k, ref, v = res
+            return bool(v & (1 << ref))
+        else:
+            return False
 
     def __hash__(self):
-        """Compute the hash value of a set."""
-        return Set._hash(self)
+        """Compute the hash value of a set.
+
+        See `PascalSet.__hash__`:meth:.
+
+        """
+        res = self._hash
+        if res is None:
+            res = self._hash = Set._hash(self)
+        return res
 
     def __eq__(self, other):
         """Python 2 and 3 have several differences in operator definitions.
 
         For example::
 
-          >>> from xotl.tools.future.collections import PascalSet
-          >>> s1 = PascalSet[0:10]
+          >>> from xotl.tools.future.collections import BitPascalSet
+          >>> s1 = BitPascalSet[0:10]
           >>> assert s1 == set(s1)    # OK (True) in 2 and 3
           >>> assert set(s1) == s1    # OK in 3, fails in 2
 
         """
         if isinstance(other, Set):
-            ls, lo = len(self), len(other)
-            if ls == lo:
-                if isinstance(other, PascalSet):
-                    return self._items == other._items
-                else:
-                    return self.count(other) == ls
+            if isinstance(other, BitPascalSet):
+                return self._items == other._items
+            elif isinstance(other, PascalSet):
+                return self._count == other._count and self._intervals() == list(other._items)
             else:
-                return False
+                ls, lo = len(self), len(other)
+                return ls == lo == self.count(other)
         else:
             return False
 
@@ -1023,28 +3362,19 @@ class PascalSet(metaclass=MetaSet):
 
     def __ge__(self, other):
         if isinstance(other, Set):
-            if other:
-                return self.issuperset(other)
-            else:
-                return bool(self._items)
+            return self.issuperset(other)
         else:
             return NotImplemented
 
     def __lt__(self, other):
         if isinstance(other, Set):
-            if other:
-                return self.issubset(other) and len(self) < len(other)
-            else:
-                return not self._items
+            return len(self) < len(other) and self.issubset(other)
         else:
             return NotImplemented
 
     def __le__(self, other):
         if isinstance(other, Set):
-            if other:
-                return self.issubset(other)
-            else:
-                return not self._items
+            return self.issubset(other) if other else not self._items
         else:
             return NotImplemented
 
@@ -1136,7 +3466,7 @@ class PascalSet(metaclass=MetaSet):
             return sum((i in self for i in other), 0)
 
     def add(self, other):
-        """Add an element to a set.
+        """Add an element to a bit-set.
 
         This has no effect if the element is already present.
 
@@ -1144,7 +3474,7 @@ class PascalSet(metaclass=MetaSet):
         self._insert(other)
 
     def union(self, *others):
-        """Return the union of sets as a new set.
+        """Return the union of bit-sets as a new set.
 
         (i.e. all elements that are in either set.)
 
@@ -1154,18 +3484,22 @@ class PascalSet(metaclass=MetaSet):
         return res
 
     def update(self, *others):
-        """Update a set with the union of itself and others."""
+        """Update a bit-set with the union of itself and others."""
         for other in others:
-            if isinstance(other, PascalSet):
-                ls = other._items
-                if self._items:
-                    count = len(ls)
-                    i = 0
-                    while i < count:
-                        self._insert(ls[i], ls[i + 1])
-                        i += 2
-                else:
-                    self._items = ls[:]
+            if isinstance(other, BitPascalSet):
+                sm = self._items
+                om = other._items
+                count = self._count
+                for k, v in safe_dict_iter(om).items():
+                    if k in sm:
+                        old = sm[k]
+                        v |= old
+                        count += _popcount(v) - _popcount(old)
+                    else:
+                        count += _popcount(v)
+                    sm[k] = v
+                self._count = count
+                self._hash = None
             elif isinstance(other, int):
                 self._insert(other)
             elif isinstance(other, Iterable):
@@ -1175,19 +3509,13 @@ class PascalSet(metaclass=MetaSet):
                 start, stop, step = other.start, other.stop, other.step
                 if step is None:
                     step = 1
-                if step in (1, -1):
-                    stop -= step
-                    if step == -1:
-                        start, stop = stop, start
-                    self._insert(start, stop)
-                else:
-                    for i in range(start, stop, step):
-                        self._insert(i)
+                for i in range(start, stop, step):
+                    self._insert(i)
             else:
                 raise self._invalid_value(other)
 
     def intersection(self, *others):
-        """Return the intersection of two or more sets as a new set.
+        """Return the intersection of two or more bit-sets as a new set.
 
         (i.e. elements that are common to all of the sets.)
 
@@ -1197,34 +3525,30 @@ class PascalSet(metaclass=MetaSet):
         return res
 
     def intersection_update(self, *others):
-        """Update a set with the intersection of itself and another."""
-        ls = self._items
+        """Update a bit-set with the intersection of itself and another."""
+        sm = self._items
         oi, count = 0, len(others)
-        while ls and oi < count:
+        while sm and oi < count:
             other = others[oi]
-            if not isinstance(other, PascalSet):
+            if not isinstance(other, BitPascalSet):
                 # safe mode for intersection
-                other = PascalSet(i for i in other if isinstance(i, int))
-            o = other._items
-            if o:
-                sl, el = ls[0], ls[-1]
-                so, eo = o[0], o[-1]
-                if sl < so:
-                    self._remove(sl, so - 1)
-                if eo < el:
-                    self._remove(eo + 1, el)
-                i = 2
-                while ls and i < len(o):
-                    s, e = o[i - 1] + 1, o[i] - 1
-                    if s <= e:
-                        self._remove(s, e)
-                    i += 2
-            else:
-                del ls[:]
+                other = BitPascalSet(i for i in other if isinstance(i, int))
+            om = other._items
+            size = self._count
+            for k, old in safe_dict_iter(sm).items():
+                v = old & om.get(k, 0)
+                if v != old:
+                    size -= _popcount(old ^ v)
+                    if v:
+                        sm[k] = v
+                    else:
+                        del sm[k]
+            self._count = size
+            self._hash = None
             oi += 1
 
     def difference(self, *others):
-        """Return the difference of two or more sets as a new set.
+        """Return the difference of two or more bit-sets as a new set.
 
         (i.e. all elements that are in this set but not the others.)
 
@@ -1234,22 +3558,30 @@ class PascalSet(metaclass=MetaSet):
         return res
 
     def difference_update(self, *others):
-        """Remove all elements of another set from this set."""
+        """Remove all elements of another bit-set from this set."""
         for other in others:
-            if isinstance(other, PascalSet):
-                ls = other._items
-                count = len(ls)
-                i = 0
-                while i < count:
-                    self._remove(ls[i], ls[i + 1])
-                    i += 2
+            if isinstance(other, BitPascalSet):
+                sm = self._items
+                om = other._items
+                count = self._count
+                for k, v in safe_dict_iter(om).items():
+                    if k in sm:
+                        old = sm[k]
+                        v = old & ~v
+                        count -= _popcount(old ^ v)
+                        if v:
+                            sm[k] = v
+                        else:
+                            del sm[k]
+                self._count = count
+                self._hash = None
             else:
                 for i in other:
                     if isinstance(i, int):
                         self._remove(i)
 
     def symmetric_difference(self, other):
-        """Return the symmetric difference of two sets as a new set.
+        """Return the symmetric difference of two bit-sets as a new set.
 
         (i.e. all elements that are in exactly one of the sets.)
 
@@ -1259,9 +3591,9 @@ class PascalSet(metaclass=MetaSet):
         return res
 
     def symmetric_difference_update(self, other):
-        "Update a set with the symmetric difference of itself and another."
-        if not isinstance(other, PascalSet):
-            other = PascalSet(other)
+        "Update a bit-set with the symmetric difference of itself and another."
+        if not isinstance(other, BitPascalSet):
+            other = BitPascalSet(other)
         if self:
             if other:
                 # TODO: Implement more efficiently
@@ -1269,10 +3601,12 @@ class PascalSet(metaclass=MetaSet):
                 self -= other
                 self |= aux
         else:
-            self._items = other._items[:]
+            self._items = dict(other._items)
+            self._count = other._count
+            self._hash = None
 
     def discard(self, other):
-        """Remove an element from a set if it is a member.
+        """Remove an element from a bit-set if it is a member.
 
         If the element is not a member, do nothing.
 
@@ -1280,213 +3614,133 @@ class PascalSet(metaclass=MetaSet):
         self._remove(other)
 
     def remove(self, other):
-        """Remove an element from a set; it must be a member.
+        """Remove an element from a bit-set; it must be a member.
 
         If the element is not a member, raise a KeyError.
 
         """
-        if other in self:
-            self._remove(other)
-        else:
-            raise KeyError('"%s" is not a member!' % other)
+        self._remove(other, fail=True)
 
     def pop(self):
-        """Remove and return an arbitrary set element.
+        """Remove and return an arbitrary bit-set element.
 
         Raises KeyError if the set is empty.
 
         """
-        ls = self._items
-        if ls:
-            res = ls[0]
-            if ls[0] < ls[1]:
-                ls[0] += 1
+        sm = self._items
+        if sm:
+            bl = self._bit_length
+            k, v = next(iter(sm.items()))
+            assert v
+            ref = v & -v
+            res = k * bl + ref.bit_length() - 1
+            v ^= ref
+            if v:
+                sm[k] = v
             else:
-                del ls[0:2]
+                del sm[k]
+            self._count -= 1
+            self._hash = None
             return res
         else:
             raise KeyError("pop from an empty set!")
 
     def clear(self):
-        """Remove all elements from this set."""
-        self._items = []
+        """Remove all elements from this bit-set."""
+        self._items = {}
+        self._count = 0
+        self._hash = None
 
     def copy(self):
         """Return a shallow copy of a set."""
         return type(self)(self)
 
     def isdisjoint(self, other):
-        """Return True if two sets have a null intersection."""
-        if isinstance(other, PascalSet):
-            if self and other:
-                ls, o = self._items, other._items
-                i, lcount, ocount = 0, len(ls), len(o)
-                maybe = True
-                while maybe and i < lcount:
-                    found, idx = other._search(ls[i])
-                    if idx == ocount:  # exhausted
-                        # assert not found
-                        i = lcount
-                    elif found or ls[i + 1] >= o[idx]:
-                        maybe = False
-                    else:
-                        i += 2
-                return maybe
+        """Return True if two bit-sets have a null intersection."""
+        if isinstance(other, BitPascalSet):
+            sm, om = self._items, other._items
+            if sm and om:
+                return all(sm.get(k, 0) & v == 0 for k, v in om.items())
             else:
                 return True
         else:
             return not any(i in self for i in other)
 
     def issubset(self, other):
-        """Report whether another set contains this set."""
-        ls = len(self)
-        if isinstance(other, PascalSet):
-            if self:
-                if ls > len(other):  # Fast check for obvious cases
-                    return False
-                else:
-                    ls, o = self._items, other._items
-                    i, lcount = 0, len(ls)
-                    maybe = True
-                    while maybe and i < lcount:
-                        found, idx = other._search(ls[i])
-                        if found and ls[i + 1] <= o[idx + 1]:
-                            i += 2
-                        else:
-                            maybe = False
-                    return maybe
+        """Report whether another set contains this bit-set."""
+        if isinstance(other, BitPascalSet):
+            sm, om = self._items, other._items
+            if sm:
+                return all(om.get(k, 0) & v == v for k, v in sm.items())
             else:
                 return True
-        elif isinstance(other, Sized) and ls > len(other):
-            # Fast check for obvious cases
-            return False
+        elif isinstance(other, PascalSet):
+            return other.issuperset(self)
         elif isinstance(other, Container):
-            aux = next((i for i in self if i not in other), Unset)
-            return aux is Unset
+            return not any(i not in other for i in self)
         else:
             # Generator cases
-            from functools import reduce
-            from operator import add
-
-            lo = reduce(add, (i in self for i in other), 0)
-            return lo == ls
+            return sum((i in self for i in other), 0) == len(self)
 
     def issuperset(self, other):
-        """Report whether this set contains another set."""
-        ls = len(self)
-        if isinstance(other, PascalSet):
-            if other:
-                if ls < len(other):  # Fast check for obvious cases
-                    return False
-                else:
-                    ls, o = self._items, other._items
-                    i, ocount = 0, len(o)
-                    maybe = True
-                    while maybe and i < ocount:
-                        found, idx = self._search(o[i])
-                        if found and o[i + 1] <= ls[idx + 1]:
-                            i += 2
-                        else:
-                            maybe = False
-                    return maybe
+        """Report whether this bit set contains another set."""
+        if isinstance(other, BitPascalSet):
+            sm, om = self._items, other._items
+            if om:
+                return all(sm.get(k, 0) & v == v for k, v in om.items())
             else:
                 return True
-        elif isinstance(other, Sized) and ls < len(other):
-            # Fast check for obvious cases
-            return False
+        elif isinstance(other, PascalSet):
+            return other.issubset(self)
         else:
-            aux = next((i for i in other if i not in self), Unset)
-            return aux is Unset
+            return not any(i not in self for i in other)
 
     def _search(self, other):
-        """Search the pair where ``other`` is placed.
+        """Search the bit-wise value where ``other`` could be placed.
 
-        Return a duple :``(if found or not, index)``.
+        Return a duple :``(seed, bits to shift left)``.
 
         """
         if isinstance(other, int):
-            ls = self._items
-            start, end = 0, len(ls)
-            res, pivot = False, 2 * (end // 4)
-            while not res and start < end:
-                s, e = ls[pivot], ls[pivot + 1]
-                if other < s:
-                    end = pivot
-                elif other > e:
-                    start = pivot + 2
-                else:
-                    res = True
-                pivot = start + 2 * ((end - start) // 4)
-            return res, pivot
+            sm = self._items
+            bl = self._bit_length
+            k, ref = divmod(other, bl)
+            return k, ref, sm.get(k, 0)
         else:
-            raise self._invalid_value(other)
+            return None
 
-    def _insert(self, start, end=None):
-        """Insert an interval of integers."""
-        if not end:
-            end = start
-        assert start <= end
-        ls = self._items
-        count = len(ls)
-        found, idx = self._search(start)
-        if not found:
-            if idx > 0 and start == ls[idx - 1] + 1:
-                found = True
-                idx -= 2
-                ls[idx + 1] = start
-                if idx < count - 2 and end == ls[idx + 2] - 1:
-                    end = ls[idx + 3]
-            elif idx < count and end >= ls[idx] - 1:
-                found = True
-                ls[idx] = start
-        if found:
-            while end > ls[idx + 1]:
-                if idx < count - 2 and end >= ls[idx + 2] - 1:
-                    if end <= ls[idx + 3]:
-                        ls[idx + 1] = ls[idx + 3]
-                    del ls[idx + 2 : idx + 4]
-                    count -= 2
-                else:
-                    ls[idx + 1] = end
+    def _insert(self, other):
+        """Add a member in this bit-set."""
+        aux = self._search(other)
+        if aux:
+            k, ref, v = aux
+            aux = v | (1 << ref)
+            if aux != v:
+                self._items[k] = aux
+                self._count += 1
+                self._hash = None
         else:
-            if idx < count:
-                ls.insert(idx, start)
-                ls.insert(idx + 1, end)
-            else:
-                ls.extend((start, end))
-            count += 2
+            raise self._invalid_value(other)
 
-    def _remove(self, start, end=None):
-        """Remove an interval of integers."""
-        if not end:
-            end = start
-        assert start <= end
-        ls = self._items
-        sfound, sidx = self._search(start)
-        efound, eidx = self._search(end)
-        if sfound and efound and sidx == eidx:
-            first = ls[sidx] < start
-            last = ls[eidx + 1] > end
-            if first and last:
-                ls.insert(eidx + 1, end + 1)
-                ls.insert(sidx + 1, start - 1)
-            elif first:
-                ls[sidx + 1] = start - 1
-            elif last:
-                ls[eidx] = end + 1
-            else:
-                del ls[sidx : eidx + 2]
-        else:
-            if sfound and ls[sidx] < start:
-                ls[sidx + 1] = start - 1
-                sidx += 2
-            if efound:
-                if ls[eidx + 1] > end:
-                    ls[eidx] = end + 1
-                else:
-                    eidx += 2
-            if sidx < eidx:
-                del ls[sidx:eidx]
+    def _remove(self, other, fail=False):
+        """Remove an interval of integers from this bit-set."""
+        aux = self._search(other)
+        ok = False
+        if aux:
+            k, ref, v = aux
+            if v:
+                aux = v & ~(1 << ref)
+                if v != aux:
+                    ok = True
+                    self._count -= 1
+                    self._hash = None
+                    sm = self._items
+                    if aux:
+                        sm[k] = aux
+                    else:
+                        del sm[k]
+        if not ok and fail:
+            raise KeyError('"%s" is not a member!' % other)
 
     def _invalid_value(self, value):
         cls_name = type(self).__name__
@@ -1508,22 +3762,38 @@ class PascalSet(metaclass=MetaSet):
         return res
 
 
-MutableSet.register(PascalSet)
+MutableSet.register(BitPascalSet)
 
 
-class BitPascalSet(metaclass=MetaSet):
-    """Collection of unique integer elements (implemented with bit-wise sets).
+class RoaringPascalSet(metaclass=MetaSet):
+    """Collection of unique integer elements (implemented with hybrid blocks).
 
     ::
 
-        BitPascalSet(*others) -> new bit-set object
+        RoaringPascalSet(*others) -> new set object
 
-    .. versionadded:: 1.7.1
+    Modeled after `Roaring bitmaps <https://roaringbitmap.org/>`__: integers
+    are split in blocks of 65536 consecutive values and each non-empty block
+    is stored in the most compact of three containers:
+
+    - a sorted ``array('H')`` of the low 16 bits of the members (sparse
+      blocks),
+
+    - a bitmap of 65536 bits in a ``bytearray`` (dense blocks), or
+
+    - a tuple of runs ``(start1, end1, start2, end2, ...)`` (blocks with long
+      runs of consecutive members).
+
+    It has the same API of `PascalSet`:class: and `BitPascalSet`:class:.
+
+    .. versionadded:: 3.4.0
 
     """
 
-    __slots__ = ("_items",)
-    _bit_length = 62  # How many values are stored in each item
+    __slots__ = ("_items", "_count", "_sizes")
+    _block_bits = 16  # Each block holds ``2**_block_bits`` values
+    _block_mask = 0xFFFF
+    _array_limit = 4096  # Maximum cardinality of an array container
 
     def __init__(self, *others):
         """Initialize self.
@@ -1531,17 +3801,18 @@ class BitPascalSet(metaclass=MetaSet):
         :param others: Any number of integer or collection of integers that
                will be the set members.
 
-        In this case `_items` is a dictionary with keys containing number
-        division seeds and values bit-wise integers (each bit is the division
-        modulus position).
+        In this case `_items` is a dictionary with block numbers as keys and
+        containers as values.
 
         """
         self._items = {}
+        self._count = 0  # cardinality, kept in sync with `_items`
+        self._sizes = {}  # cardinality of each container
         self.update(*others)
 
     def __str__(self):
         if self:
-            return str(PascalSet(self))
+            return str(PascalSet.from_sorted(self))
         else:
             cname = type(self).__name__
             return str("%s([])") % cname
@@ -1552,21 +3823,26 @@ class BitPascalSet(metaclass=MetaSet):
         return str("%s([%s])") % (cname, res)
 
     def __iter__(self):
-        bl = self._bit_length
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+    def iter_chunks(self):
+        """Iterate over the members in sorted chunks.
+
+        Each chunk is a list with the members stored in the same block.  See
+        `BitPascalSet.iter_chunks`:meth:.
+
+        """
+        bb = self._block_bits
         sm = self._items
         for k in sorted(sm):
-            v = sm[k]
-            base = k * bl
-            i = 0
-            ref = 1
-            while i < bl:
-                if ref & v:
-                    yield base + i
-                ref <<= 1
-                i += 1
+            base = k << bb
+            yield [base + low for low in self._decode(sm[k])]
+
+    to_array = BitPascalSet.to_array
 
     def __len__(self):
-        return sum((1 for i in self), 0)
+        return self._count
 
     def __nonzero__(self):
         return bool(self._items)
@@ -1574,11 +3850,20 @@ class BitPascalSet(metaclass=MetaSet):
     __bool__ = __nonzero__
 
     def __contains__(self, other):
-        """True if this bit-set has the element ``other``, else False."""
-        res = self._search(other)
-        if res:
-            _k, ref, v = res
-            return bool(v & (1 << ref))
+        """True if this set has the element ``other``, else False."""
+        if isinstance(other, int):
+            k, low = other >> self._block_bits, other & self._block_mask
+            container = self._items.get(k)
+            if container is None:
+                return False
+            elif isinstance(container, bytearray):
+                return bool((container[low >> 3] >> (low & 7)) & 1)
+            elif isinstance(container, tuple):
+                idx = bisect_right(container, low)
+                return bool(idx & 1) or (idx > 0 and container[idx - 1] == low)
+            else:
+                idx = bisect_left(container, low)
+                return idx < len(container) and container[idx] == low
         else:
             return False
 
@@ -1587,19 +3872,14 @@ class BitPascalSet(metaclass=MetaSet):
         return Set._hash(self)
 
     def __eq__(self, other):
-        """Python 2 and 3 have several differences in operator definitions.
-
-        For example::
-
-          >>> from xotl.tools.future.collections import BitPascalSet
-          >>> s1 = BitPascalSet[0:10]
-          >>> assert s1 == set(s1)    # OK (True) in 2 and 3
-          >>> assert set(s1) == s1    # OK in 3, fails in 2
-
-        """
         if isinstance(other, Set):
-            if isinstance(other, BitPascalSet):
-                return self._items == other._items
+            if isinstance(other, RoaringPascalSet):
+                sm, om = self._items, other._items
+                if self._count == other._count and sm.keys() == om.keys():
+                    to_bitmap = self._to_bitmap
+                    return all(to_bitmap(sm[k]) == to_bitmap(om[k]) for k in sm)
+                else:
+                    return False
             else:
                 ls, lo = len(self), len(other)
                 return ls == lo == self.count(other)
@@ -1620,16 +3900,13 @@ class BitPascalSet(metaclass=MetaSet):
 
     def __ge__(self, other):
         if isinstance(other, Set):
-            return self.issuperset(other) if other else bool(self._items)
+            return self.issuperset(other)
         else:
             return NotImplemented
 
     def __lt__(self, other):
         if isinstance(other, Set):
-            if other:
-                return self.issubset(other) and len(self) < len(other)
-            else:
-                return not self._items
+            return len(self) < len(other) and self.issubset(other)
         else:
             return NotImplemented
 
@@ -1727,7 +4004,7 @@ class BitPascalSet(metaclass=MetaSet):
             return sum((i in self for i in other), 0)
 
     def add(self, other):
-        """Add an element to a bit-set.
+        """Add an element to a set.
 
         This has no effect if the element is already present.
 
@@ -1735,7 +4012,7 @@ class BitPascalSet(metaclass=MetaSet):
         self._insert(other)
 
     def union(self, *others):
-        """Return the union of bit-sets as a new set.
+        """Return the union of sets as a new set.
 
         (i.e. all elements that are in either set.)
 
@@ -1745,16 +4022,10 @@ class BitPascalSet(metaclass=MetaSet):
         return res
 
     def update(self, *others):
-        """Update a bit-set with the union of itself and others."""
+        """Update a set with the union of itself and others."""
         for other in others:
-            if isinstance(other, BitPascalSet):
-                sm = self._items
-                om = other._items
-                for k, v in safe_dict_iter(om).items():
-                    if k in sm:
-                        sm[k] |= v
-                    else:
-                        sm[k] = v
+            if isinstance(other, RoaringPascalSet):
+                self._combine(other, or_)
             elif isinstance(other, int):
                 self._insert(other)
             elif isinstance(other, Iterable):
@@ -1764,13 +4035,19 @@ class BitPascalSet(metaclass=MetaSet):
                 start, stop, step = other.start, other.stop, other.step
                 if step is None:
                     step = 1
-                for i in range(start, stop, step):
-                    self._insert(i)
+                if step in (1, -1):
+                    if step == -1:
+                        start, stop = stop + 1, start + 1
+                    if start < stop:
+                        self._insert_range(start, stop - 1)
+                else:
+                    for i in range(start, stop, step):
+                        self._insert(i)
             else:
                 raise self._invalid_value(other)
 
     def intersection(self, *others):
-        """Return the intersection of two or more bit-sets as a new set.
+        """Return the intersection of two or more sets as a new set.
 
         (i.e. elements that are common to all of the sets.)
 
@@ -1780,25 +4057,18 @@ class BitPascalSet(metaclass=MetaSet):
         return res
 
     def intersection_update(self, *others):
-        """Update a bit-set with the intersection of itself and another."""
-        sm = self._items
+        """Update a set with the intersection of itself and another."""
         oi, count = 0, len(others)
-        while sm and oi < count:
+        while self._items and oi < count:
             other = others[oi]
-            if not isinstance(other, BitPascalSet):
+            if not isinstance(other, RoaringPascalSet):
                 # safe mode for intersection
-                other = PascalSet(i for i in other if isinstance(i, int))
-            om = other._items
-            for k, v in safe_dict_iter(sm).items():
-                v &= om.get(k, 0)
-                if v:
-                    sm[k] = v
-                else:
-                    del sm[k]
+                other = RoaringPascalSet(i for i in other if isinstance(i, int))
+            self._combine(other, and_)
             oi += 1
 
     def difference(self, *others):
-        """Return the difference of two or more bit-sets as a new set.
+        """Return the difference of two or more sets as a new set.
 
         (i.e. all elements that are in this set but not the others.)
 
@@ -1808,25 +4078,17 @@ class BitPascalSet(metaclass=MetaSet):
         return res
 
     def difference_update(self, *others):
-        """Remove all elements of another bit-set from this set."""
+        """Remove all elements of another set from this set."""
         for other in others:
-            if isinstance(other, BitPascalSet):
-                sm = self._items
-                om = other._items
-                for k, v in safe_dict_iter(om).items():
-                    if k in sm:
-                        v = sm[k] & ~v
-                        if v:
-                            sm[k] = v
-                        else:
-                            del sm[k]
+            if isinstance(other, RoaringPascalSet):
+                self._combine(other, _bitmap_difference)
             else:
                 for i in other:
                     if isinstance(i, int):
                         self._remove(i)
 
     def symmetric_difference(self, other):
-        """Return the symmetric difference of two bit-sets as a new set.
+        """Return the symmetric difference of two sets as a new set.
 
         (i.e. all elements that are in exactly one of the sets.)
 
@@ -1836,20 +4098,13 @@ class BitPascalSet(metaclass=MetaSet):
         return res
 
     def symmetric_difference_update(self, other):
-        "Update a bit-set with the symmetric difference of itself and another."
-        if not isinstance(other, BitPascalSet):
-            other = BitPascalSet(other)
-        if self:
-            if other:
-                # TODO: Implement more efficiently
-                aux = other - self
-                self -= other
-                self |= aux
-        else:
-            self._items = other._items[:]
+        "Update a set with the symmetric difference of itself and another."
+        if not isinstance(other, RoaringPascalSet):
+            other = RoaringPascalSet(other)
+        self._combine(other, xor)
 
     def discard(self, other):
-        """Remove an element from a bit-set if it is a member.
+        """Remove an element from a set if it is a member.
 
         If the element is not a member, do nothing.
 
@@ -1857,7 +4112,7 @@ class BitPascalSet(metaclass=MetaSet):
         self._remove(other)
 
     def remove(self, other):
-        """Remove an element from a bit-set; it must be a member.
+        """Remove an element from a set; it must be a member.
 
         If the element is not a member, raise a KeyError.
 
@@ -1865,62 +4120,53 @@ class BitPascalSet(metaclass=MetaSet):
         self._remove(other, fail=True)
 
     def pop(self):
-        """Remove and return an arbitrary bit-set element.
+        """Remove and return an arbitrary set element.
 
         Raises KeyError if the set is empty.
 
         """
         sm = self._items
         if sm:
-            bl = self._bit_length
-            k, v = next(sm.items())
-            assert v
-            base = k * bl
-            i = 0
-            ref = 1
-            res = None
-            while res is None:
-                if ref & v:
-                    res = base + i
-                else:
-                    ref <<= 1
-                    i += 1
-            v &= ~ref
-            if v:
-                sm[k] = v
+            k = next(iter(sm))
+            container = sm[k]
+            if isinstance(container, bytearray):
+                low = self._decode(container)[0]
             else:
-                del sm[k]
+                low = container[0]
+            res = (k << self._block_bits) + low
+            self._remove(res)
             return res
         else:
             raise KeyError("pop from an empty set!")
 
     def clear(self):
-        """Remove all elements from this bit-set."""
+        """Remove all elements from this set."""
         self._items = {}
+        self._count = 0
+        self._sizes = {}
 
     def copy(self):
         """Return a shallow copy of a set."""
         return type(self)(self)
 
     def isdisjoint(self, other):
-        """Return True if two bit-sets have a null intersection."""
-        if isinstance(other, BitPascalSet):
+        """Return True if two sets have a null intersection."""
+        if isinstance(other, RoaringPascalSet):
             sm, om = self._items, other._items
-            if sm and om:
-                return all(sm.get(k, 0) & v == 0 for k, v in om.items())
-            else:
-                return True
+            to_bitmap = self._to_bitmap
+            return not any(to_bitmap(sm[k]) & to_bitmap(om[k]) for k in sm.keys() & om.keys())
         else:
             return not any(i in self for i in other)
 
     def issubset(self, other):
-        """Report whether another set contains this bit-set."""
-        if isinstance(other, BitPascalSet):
-            sm, om = self._items, other._items
-            if sm:
-                return all(om.get(k, 0) & v == v for k, v in sm.items())
+        """Report whether another set contains this set."""
+        if isinstance(other, RoaringPascalSet):
+            if self._count > other._count:
+                return False
             else:
-                return True
+                sm, om = self._items, other._items
+                to_bitmap = self._to_bitmap
+                return all(k in om and to_bitmap(c) & ~to_bitmap(om[k]) == 0 for k, c in sm.items())
         elif isinstance(other, Container):
             return not any(i not in other for i in self)
         else:
@@ -1928,78 +4174,201 @@ class BitPascalSet(metaclass=MetaSet):
             return sum((i in self for i in other), 0) == len(self)
 
     def issuperset(self, other):
-        """Report whether this bit set contains another set."""
-        if isinstance(other, BitPascalSet):
-            sm, om = self._items, other._items
-            if om:
-                return all(sm.get(k, 0) & v == v for k, v in om.items())
-            else:
-                return True
+        """Report whether this set contains another set."""
+        if isinstance(other, RoaringPascalSet):
+            return other.issubset(self)
         else:
             return not any(i not in self for i in other)
 
-    def _search(self, other):
-        """Search the bit-wise value where ``other`` could be placed.
-
-        Return a duple :``(seed, bits to shift left)``.
-
-        """
+    def _insert(self, other):
+        """Add a member in this set."""
         if isinstance(other, int):
             sm = self._items
-            bl = self._bit_length
-            k, ref = divmod(other, bl)
-            return k, ref, sm.get(k, 0)
-        else:
-            return None
-
-    def _insert(self, other):
-        """Add a member in this bit-set."""
-        aux = self._search(other)
-        if aux:
-            k, ref, v = aux
-            self._items[k] = v | (1 << ref)
+            k, low = other >> self._block_bits, other & self._block_mask
+            container = sm.get(k)
+            added = False
+            if container is None:
+                sm[k] = array("H", (low,))
+                added = True
+            elif isinstance(container, array):
+                idx = bisect_left(container, low)
+                if idx == len(container) or container[idx] != low:
+                    container.insert(idx, low)
+                    added = True
+                    if len(container) > self._array_limit:
+                        sm[k] = self._from_bitmap(self._to_bitmap(container))
+            elif isinstance(container, bytearray):
+                byte, bit = low >> 3, 1 << (low & 7)
+                if not container[byte] & bit:
+                    container[byte] |= bit
+                    added = True
+            else:
+                runs = list(container)
+                if _insert_interval(runs, low, low):
+                    sm[k] = self._from_runs(runs)
+                    added = True
+            if added:
+                sizes = self._sizes
+                sizes[k] = sizes.get(k, 0) + 1
+                self._count += 1
         else:
             raise self._invalid_value(other)
 
+    def _insert_range(self, start, end):
+        """Add all integers in the closed interval [start, end]."""
+        bb, mask = self._block_bits, self._block_mask
+        sm, sizes = self._items, self._sizes
+        for k in range(start >> bb, (end >> bb) + 1):
+            base = k << bb
+            low, high = max(start, base) - base, min(end, base + mask) - base
+            bits = ((1 << (high - low + 1)) - 1) << low
+            container = sm.get(k)
+            if container is None:
+                size = high - low + 1
+                sm[k] = self._from_bitmap(bits)
+            else:
+                new = self._to_bitmap(container) | bits
+                size = _popcount(new)
+                sm[k] = self._from_bitmap(new)
+            self._count += size - sizes.get(k, 0)
+            sizes[k] = size
+
     def _remove(self, other, fail=False):
-        """Remove an interval of integers from this bit-set."""
-        aux = self._search(other)
+        """Remove a member from this set."""
         ok = False
-        if aux:
-            k, ref, v = aux
-            if v:
-                aux = v & ~(1 << ref)
-                if v != aux:
+        if isinstance(other, int):
+            sm = self._items
+            k, low = other >> self._block_bits, other & self._block_mask
+            container = sm.get(k)
+            if isinstance(container, array):
+                idx = bisect_left(container, low)
+                if idx < len(container) and container[idx] == low:
                     ok = True
-                    sm = self._items
-                    if aux:
-                        sm[k] = aux
-                    else:
-                        del sm[k]
-        if not ok and fail:
+                    del container[idx]
+            elif isinstance(container, bytearray):
+                byte, bit = low >> 3, 1 << (low & 7)
+                if container[byte] & bit:
+                    ok = True
+                    container[byte] &= ~bit
+                    if 1 < self._sizes[k] <= self._array_limit + 1:
+                        sm[k] = self._from_bitmap(self._to_bitmap(container))
+            elif container is not None:
+                runs = list(container)
+                if _remove_interval(runs, low, low):
+                    ok = True
+                    if runs:
+                        sm[k] = self._from_runs(runs)
+        if ok:
+            sizes = self._sizes
+            if sizes[k] > 1:
+                sizes[k] -= 1
+            else:
+                del sizes[k], sm[k]
+            self._count -= 1
+        elif fail:
             raise KeyError('"%s" is not a member!' % other)
 
+    def _combine(self, other, op):
+        """Update this set with ``op(self, other)`` block by block.
+
+        `op` operates over bit-wise integers (e.g. `operator.or_`).
+
+        """
+        sm, om, sizes = self._items, other._items, self._sizes
+        to_bitmap, from_bitmap = self._to_bitmap, self._from_bitmap
+        keep_mine, keep_theirs = op(1, 0), op(0, 1)
+        count = self._count
+        for k in sm.keys() | om.keys() if keep_theirs else list(sm):
+            mine, theirs = sm.get(k), om.get(k)
+            if theirs is not None:
+                old = 0 if mine is None else to_bitmap(mine)
+                new = op(old, to_bitmap(theirs))
+                if new != old:
+                    size = _popcount(new)
+                    count += size - sizes.get(k, 0)
+                    if new:
+                        sm[k] = from_bitmap(new)
+                        sizes[k] = size
+                    else:
+                        del sm[k], sizes[k]
+            elif not keep_mine:
+                count -= sizes.pop(k)
+                del sm[k]
+        self._count = count
+
+    @staticmethod
+    def _decode(container):
+        """Return the sorted list of low values stored in `container`."""
+        res = []
+        if isinstance(container, bytearray):
+            words = array("Q", bytes(container))
+            if sys.byteorder == "big":
+                words.byteswap()
+            base = -1
+            for word in words:
+                while word:
+                    low = word & -word  # jump to the lowest set bit
+                    res.append(base + low.bit_length())
+                    word ^= low
+                base += 64
+        elif isinstance(container, tuple):
+            for i in range(0, len(container), 2):
+                res.extend(range(container[i], container[i + 1] + 1))
+        else:
+            res.extend(container)
+        return res
+
+    @classmethod
+    def _to_bitmap(cls, container):
+        """Return the bit-wise integer equivalent to `container`."""
+        if isinstance(container, bytearray):
+            return int.from_bytes(container, "little")
+        elif isinstance(container, tuple):
+            res = 0
+            for i in range(0, len(container), 2):
+                res |= (1 << (container[i + 1] + 1)) - (1 << container[i])
+            return res
+        else:
+            res = bytearray(1 << (cls._block_bits - 3))
+            for low in container:
+                res[low >> 3] |= 1 << (low & 7)
+            return int.from_bytes(res, "little")
+
+    @classmethod
+    def _from_bitmap(cls, bitmap):
+        """Return the most compact container for a non-empty bit-wise integer."""
+        size = 1 << (cls._block_bits - 3)  # in bytes
+        count = _popcount(bitmap)
+        starts = bitmap & ~(bitmap << 1)
+        # Arrays take 2 bytes per member and runs 4 bytes per run
+        if 4 * _popcount(starts) < min(2 * count, size):
+            ends = bitmap & ~(bitmap >> 1)
+            res = [None] * (2 * _popcount(starts))
+            res[::2] = cls._decode(bytearray(starts.to_bytes(size, "little")))
+            res[1::2] = cls._decode(bytearray(ends.to_bytes(size, "little")))
+            return tuple(res)
+        else:
+            res = bytearray(bitmap.to_bytes(size, "little"))
+            if count <= cls._array_limit:
+                res = array("H", cls._decode(res))
+            return res
+
+    @classmethod
+    def _from_runs(cls, runs):
+        """Return the most compact container for a non-empty list of runs."""
+        if 2 * len(runs) < min(2 * _interval_count(runs), 1 << (cls._block_bits - 3)):
+            return tuple(runs)
+        else:
+            return cls._from_bitmap(cls._to_bitmap(tuple(runs)))
+
     def _invalid_value(self, value):
         cls_name = type(self).__name__
         vname = type(value).__name__
         msg = 'Unsupported type for  value "%s" of type "%s" for a "%s", must be an integer!'
         return TypeError(msg % (value, vname, cls_name))
 
-    @classmethod
-    def _prime_numbers_until(cls, limit):
-        """This is totally a funny test method."""
-        res = cls[2:limit]
-        for i in range(2, limit // 2 + 1):
-            if i in res:
-                aux = i + i
-                while aux < limit:
-                    if aux in res:
-                        res.remove(aux)
-                    aux += i
-        return res
-
 
-MutableSet.register(BitPascalSet)
+MutableSet.register(RoaringPascalSet)
 
 
 # Smart Tools
@@ -2036,3 +4405,26 @@ def smart_iter_items(*args, **kwds):
                     raise TypeError(msg.format(type(item).__name__, item))
     for key in kwds:
         yield key, kwds[key]
+
+
+def _plain_mapping(arg):
+    """Check if `dict.update` would read the same items as `smart_iter_items`.
+
+    It's false for non-mappings and for dicts redefining ``__getitem__``
+    (`dict.update` skips it).
+
+    """
+    return isinstance(arg, Mapping) and (
+        not isinstance(arg, dict) or type(arg).__getitem__ is dict.__getitem__
+    )
+
+
+def _bulk_mappings(args, kwds):
+    """Yield mappings with the items `smart_iter_items` would yield."""
+    for arg in args:
+        if _plain_mapping(arg):
+            yield arg
+        else:
+            yield dict(smart_iter_items(arg))
+    if kwds:
+        yield kwds
@@ -22,9 +22,11 @@ You may use this module as a drop-in replacement of the standard library
 """
 
 import operator
+import sys
 from datetime import date, datetime, timedelta
 from enum import IntEnum
-from functools import reduce
+from functools import lru_cache, reduce
+from heapq import merge
 from re import compile as _regex_compile
 from time import strftime as _time_strftime
 from typing import Iterator, Optional, cast
@@ -177,9 +179,17 @@ def strftime(dt, fmt):  # pragma: no cover
 
 
 def parse_date(value=None):
+    """Parse a date in format 'YYYY-MM-DD'.
+
+    If `value` is not given, return the current date.  The results for the
+    last 4096 distinct strings are cached.  See `compile_date_parser`:func:
+    for other formats.
+
+    .. versionchanged:: 3.4.0 Cache the results.
+
+    """
     if value:
-        y, m, d = value.split("-")
-        return date(int(y), int(m), int(d))
+        return _parse_date(value)
     else:
         return date.today()
 
@@ -189,27 +199,124 @@ def parse_datetime(value=None):
 
     The hour-minute component is mandatory.
 
+    If `value` is not given, return the current date and time.  The results
+    for the last 4096 distinct strings are cached.
+
+    .. versionchanged:: 3.4.0 Cache the results.
+
     """
     if value:
-        d, t = value.split()
-        y, m, d = d.split("-")
-        if "." in t:
-            moment, ms = t.split(".")
-        else:
-            moment, ms = t, "0"
-        timing = moment.split(":")
-        if len(timing) == 2:
-            h, mn = timing
-            s = 0
-        elif len(timing) == 3:
-            h, mn, s = timing
-        else:  # pragma: no cover
-            raise ValueError("Invalid time string %r" % t)
-        return datetime(int(y), int(m), int(d), int(h), int(mn), int(s), int(ms))
+        return _parse_datetime(value)
     else:
         return datetime.now()
 
 
+@lru_cache(maxsize=4096)
+def _parse_date(value):
+    y, m, d = value.split("-")
+    return date(int(y), int(m), int(d))
+
+
+@lru_cache(maxsize=4096)
+def _parse_datetime(value):
+    d, t = value.split()
+    y, m, d = d.split("-")
+    if "." in t:
+        moment, ms = t.split(".")
+    else:
+        moment, ms = t, "0"
+    timing = moment.split(":")
+    if len(timing) == 2:
+        h, mn = timing
+        s = 0
+    elif len(timing) == 3:
+        h, mn, s = timing
+    else:  # pragma: no cover
+        raise ValueError("Invalid time string %r" % t)
+    return datetime(int(y), int(m), int(d), int(h), int(mn), int(s), int(ms))
+
+
+def compile_date_parser(fmt="%Y-%m-%d"):
+    """Return a function that parses dates in the `strptime` format `fmt`.
+
+    .. doctest::
+
+       >>> parse = compile_date_parser("%d/%m/%Y")
+       >>> parse("04/03/2020")
+       datetime.date(2020, 3, 4)
+
+    The function accepts exactly the same strings as
+    `datetime.strptime <datetime.datetime.strptime>`:meth: with `fmt` and
+    raises ValueError for the others.
+
+    For the ISO format ``'%Y-%m-%d'`` (the default), the strings with the
+    canonical form (like ``'2020-03-04'``) are parsed with
+    `date.fromisoformat <datetime.date.fromisoformat>`:meth:, several times
+    faster than `strptime`.  The other strings and formats fall back to
+    `strptime`.
+
+    .. versionadded:: 3.4.0
+
+    """
+    return _compile_parser(fmt, date)
+
+
+def compile_datetime_parser(fmt="%Y-%m-%d %H:%M:%S"):
+    """Return a function that parses datetimes in the `strptime` format `fmt`.
+
+    Like `compile_date_parser`:func:, but the function returns datetimes.
+    The fast path is taken for the ISO formats ``'%Y-%m-%d %H:%M:%S'`` (the
+    default), ``'%Y-%m-%dT%H:%M:%S'``, ``'%Y-%m-%d %H:%M'``,
+    ``'%Y-%m-%dT%H:%M'`` and ``'%Y-%m-%d'``.
+
+    .. versionadded:: 3.4.0
+
+    """
+    return _compile_parser(fmt, datetime)
+
+
+def _compile_parser(fmt, result_type):
+    from operator import itemgetter
+
+    strptime = datetime.strptime
+    if result_type is date:
+
+        def parse_generic(value):
+            return strptime(value, fmt).date()
+
+    else:
+
+        def parse_generic(value):
+            return strptime(value, fmt)
+
+    template = _ISO_TEMPLATE.sub(lambda match: _ISO_FIELDS[match.group(0)], fmt)
+    if _ISO_FORMAT.match(fmt) is None or (result_type is date and len(template) > 10):
+        return parse_generic
+
+    # The canonical form has each field zero-padded, so the separators are in
+    # fixed positions.
+    size = len(template)
+    positions = [i for i, char in enumerate(template) if char != "0"]
+    separators = itemgetter(*positions)
+    expected = separators(template)
+    fromisoformat = result_type.fromisoformat
+
+    def parse(value):
+        if len(value) == size and separators(value) == expected:
+            try:
+                return fromisoformat(value)
+            except ValueError:
+                pass  # strptime also takes non-ASCII digits; let it decide
+        return parse_generic(value)
+
+    return parse
+
+
+_ISO_FORMAT = _regex_compile(r"^%Y-%m-%d([ T]%H:%M(:%S)?)?$")
+_ISO_TEMPLATE = _regex_compile(r"%[YmdHMS]")
+_ISO_FIELDS = {"%Y": "0000", "%m": "00", "%d": "00", "%H": "00", "%M": "00", "%S": "00"}
+
+
 def get_month_first(ref=None):
     """Given a reference date, returns the first date of the same month. If
     `ref` is not given, then uses current date as the reference.
@@ -409,9 +516,31 @@ def daterange(*args):
 
     As with `range`, `stop` is never included in the yielded dates.
 
+    See `daterange_ordinals`:func: to get all the dates at once.
+
     """
     import operator
 
+    start, stop, step = _daterange_args(args)
+    if step > 0:
+        compare = operator.lt
+    else:
+        compare = operator.gt
+    step = timedelta(days=step)
+
+    # Encloses the generator so that signature validation exceptions happen
+    # without needing to call next().
+    def _generator():
+        current = start
+        while stop is None or compare(current, stop):
+            yield current
+            current += step
+
+    return _generator()
+
+
+def _daterange_args(args):
+    """Return the `start`, `stop` and `step` (in days) of `daterange`:func:."""
     # Use base classes to allow broader argument values
     from datetime import date, datetime
 
@@ -432,21 +561,168 @@ def daterange(*args):
     else:
         if stop is not None and not isinstance(stop, (date, datetime)):
             stop = start + timedelta(days=stop)
-    if step is None or step > 0:
-        compare = operator.lt
+    return start, stop, step or 1
+
+
+def _daterange_ordinals(args):
+    """Return the `range` of ordinals of `daterange`:func:."""
+    start, stop, step = _daterange_args(args)
+    if stop is None:
+        raise ValueError("stop is required")
+    # The number of dates such that ``start + n*step`` comes before `stop`.
+    count, rest = divmod(stop - start, timedelta(days=step))
+    if rest:
+        count += 1
+    first = start.toordinal()
+    return range(first, first + max(count, 0) * step, step)
+
+
+def daterange_ordinals(*args):
+    """Like `daterange`:func: but return all the dates at once as ordinals.
+
+    Return an `array.array`:class: (of type code ``'l'``) with the
+    `proleptic Gregorian ordinals <datetime.date.toordinal>`:meth: of the
+    dates `daterange`:func: would yield (for datetimes, the ordinals of their
+    dates).  Unlike `daterange`:func:, `stop` is required.
+
+    .. doctest::
+
+       >>> daterange_ordinals(date(2017, 1, 30), 3)
+       array('l', [736359, 736360, 736361])
+
+    The array is built without creating the dates, which is much faster than
+    ``[d.toordinal() for d in daterange(...)]``.  It can be transformed with
+    `get_month_first_many`:func:, `get_month_last_many`:func: and
+    `get_next_weekday_many`:func:.
+
+    .. versionadded:: 3.4.0
+
+    """
+    from array import array
+
+    return array("l", _daterange_ordinals(args))
+
+
+def daterange_datetime64(*args):
+    """Like `daterange_ordinals`:func: but return a NumPy array.
+
+    The array has type ``datetime64[D]``.  This requires NumPy.
+
+    .. versionadded:: 3.4.0
+
+    """
+    import numpy
+
+    ordinals = _daterange_ordinals(args)
+    res = numpy.arange(ordinals.start, ordinals.stop, ordinals.step, dtype=numpy.int64)
+    return (res - _EPOCH_ORDINAL).astype("datetime64[D]")
+
+
+def get_month_first_many(ordinals):
+    """Return the first date of the month of each date in `ordinals`.
+
+    `ordinals` may be any iterable of `proleptic Gregorian ordinals
+    <datetime.date.toordinal>`:meth:, like the result of
+    `daterange_ordinals`:func:; the result is an `array.array`:class: of
+    ordinals.
+
+    If `ordinals` is a NumPy array of ``datetime64`` the result is a NumPy
+    array of ``datetime64[D]``; and if it's a NumPy array of integers, the
+    result is a NumPy array of ordinals.  NumPy is not required otherwise.
+
+    .. doctest::
+
+       >>> get_month_first_many(daterange_ordinals(date(2017, 1, 30), 3))
+       array('l', [736330, 736330, 736361])
+
+    .. versionadded:: 3.4.0
+
+    """
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(ordinals, numpy.ndarray):
+        return _numpy_month_bounds(numpy, ordinals, last=False)
     else:
-        compare = operator.gt
-    step = timedelta(days=(step if step else 1))
+        return _month_bounds(ordinals, last=False)
 
-    # Encloses the generator so that signature validation exceptions happen
-    # without needing to call next().
-    def _generator():
-        current = start
-        while stop is None or compare(current, stop):
-            yield current
-            current += step
 
-    return _generator()
+def get_month_last_many(ordinals):
+    """Return the last date of the month of each date in `ordinals`.
+
+    See `get_month_first_many`:func: for the types of `ordinals` and the
+    result.
+
+    .. versionadded:: 3.4.0
+
+    """
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(ordinals, numpy.ndarray):
+        return _numpy_month_bounds(numpy, ordinals, last=True)
+    else:
+        return _month_bounds(ordinals, last=True)
+
+
+def get_next_weekday_many(ordinals, weekday):
+    """Return the next `weekday` after each date in `ordinals`.
+
+    `weekday` is a `WEEKDAY`:class: (or an integer, Monday being 0).  As in
+    `get_next_monday`:func: and its siblings, the next Monday after a Monday
+    is a week later.
+
+    See `get_month_first_many`:func: for the types of `ordinals` and the
+    result.
+
+    .. versionadded:: 3.4.0
+
+    """
+    weekday = int(weekday)
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(ordinals, numpy.ndarray):
+        if ordinals.dtype.kind == "M":
+            days = ordinals.astype("datetime64[D]")
+            # The epoch (1970-01-01) was a Thursday.
+            return days + (7 - (days.astype(numpy.int64) + 3 - weekday) % 7)
+        else:
+            return ordinals + (7 - (ordinals - 1 - weekday) % 7)
+    else:
+        from array import array
+
+        # The ordinal 1 (0001-01-01) was a Monday.
+        return array("l", [o + 7 - (o - 1 - weekday) % 7 for o in ordinals])
+
+
+def _month_bounds(ordinals, last):
+    from array import array
+    from calendar import monthrange
+
+    res = array("l")
+    append = res.append
+    first = end = 0
+    for o in ordinals:
+        # Consecutive dates are usually in the same month.
+        if not first <= o <= end:
+            d = date.fromordinal(o)
+            first = o - d.day + 1
+            end = first + monthrange(d.year, d.month)[1] - 1
+        append(end if last else first)
+    return res
+
+
+def _numpy_month_bounds(numpy, ordinals, last):
+    if ordinals.dtype.kind == "M":
+        months = ordinals.astype("datetime64[M]")
+    else:
+        months = (ordinals - _EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]")
+    if last:
+        res = (months + 1).astype("datetime64[D]") - 1
+    else:
+        res = months.astype("datetime64[D]")
+    if ordinals.dtype.kind == "M":
+        return res
+    else:
+        return res.astype(numpy.int64) + _EPOCH_ORDINAL
+
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 
 
 class DateField:
@@ -468,6 +744,14 @@ class DateField:
             return self
 
     def __set__(self, instance, value):
+        instance.__dict__[self.name] = self.coerce(value)
+
+    def coerce(self, value):
+        """Return the date `value` would be set to.
+
+        .. versionadded:: 3.4.0
+
+        """
         if value in (None, False):
             # We regard False as None, so that working with Odoo is easier:
             # missing values in Odoo, often come as False instead of None.
@@ -479,7 +763,7 @@ class DateField:
             value = value.date()
         elif not isinstance(value, date):
             value = parse_date(value)
-        instance.__dict__[self.name] = value
+        return value
 
 
 class DateTimeField(object):
@@ -509,6 +793,14 @@ class DateTimeField(object):
             return self  # pragma: no cover
 
     def __set__(self, instance, value):
+        instance.__dict__[self.name] = self.coerce(value)
+
+    def coerce(self, value):
+        """Return the datetime `value` would be set to.
+
+        .. versionadded:: 3.4.0
+
+        """
         if value in (None, False):
             # We regard False as None, so that working with Odoo is easier:
             # missing values in Odoo, often come as False instead of None.
@@ -529,10 +821,8 @@ class DateTimeField(object):
             try:
                 value = parse_datetime(value)
             except ValueError:
-                value = parse_date(value)
-                self.__set__(instance, value)  # lazy me
-                return
-        instance.__dict__[self.name] = value
+                value = self.coerce(parse_date(value))  # lazy me
+        return value
 
 
 class TimeSpan:
@@ -583,7 +873,7 @@ class TimeSpan:
 
     .. warning:: Time spans don't implement the union or difference operations
        expected in sets because the difference/union of two span is not
-       necessarily *continuous*.
+       necessarily *continuous*.  Use `TimeSpanSet`:class: for those.
 
     """
 
@@ -612,6 +902,16 @@ class TimeSpan:
         """Return a new time span that covers a single `date`."""
         return self(start_date=date, end_date=date)
 
+    @classmethod
+    def _from_trusted(cls, start, end):
+        """Protected method to create a span of the class from valid ends.
+
+        The span operations use it for their results; so sub-classes can
+        skip the validation of the ends.
+
+        """
+        return cls(start, end)
+
     @property
     def past_unbound(self) -> bool:
         "True if the time span is not bound into the past."
@@ -725,8 +1025,6 @@ class TimeSpan:
         intersection.
 
         """
-        from xotl.tools.infinity import Infinity
-
         if isinstance(other, _EmptyTimeSpan):
             return other
         elif isinstance(other, date):
@@ -734,15 +1032,16 @@ class TimeSpan:
         elif isinstance(other, DateTimeSpan):
             return other & self
         elif not isinstance(other, TimeSpan):  # pragma: no cover
-            raise TypeError("Invalid type '%s'" % type(other).__name__)
-        start = max(self.start_date or -Infinity, other.start_date or -Infinity)
-        end = min(self.end_date or Infinity, other.end_date or Infinity)
-        if start <= end:
-            if start is -Infinity:
-                start = None
-            if end is Infinity:
-                end = None
-            return type(self)(start, end)
+            return NotImplemented
+        # None stands for the unbound ends
+        start, other_start = self.start_date, other.start_date
+        if start is None or (other_start is not None and other_start > start):
+            start = other_start
+        end, other_end = self.end_date, other.end_date
+        if end is None or (other_end is not None and other_end < end):
+            end = other_end
+        if start is None or end is None or start <= end:
+            return self._from_trusted(start, end)
         else:
             return EmptyTimeSpan
 
@@ -790,7 +1089,7 @@ class TimeSpan:
             delta = timedelta(days=delta)  # noqa
         start = self.start_date - delta if self.start_date else None
         end = self.end_date - delta if self.end_date else None
-        return type(self)(start, end)
+        return self._from_trusted(start, end)
 
     def __rshift__(self, delta):
         """Return the time span displaced to the future in `delta`.
@@ -856,17 +1155,17 @@ class TimeSpan:
             if self.start_date == other.start_date:
                 return (
                     EmptyTimeSpan,  # type: ignore
-                    TimeSpan(other.end_date + day, self.end_date),
+                    self._from_trusted(other.end_date + day, self.end_date),
                 )
             elif self.end_date == other.end_date:
                 return (
-                    TimeSpan(self.start_date, other.start_date - day),
+                    self._from_trusted(self.start_date, other.start_date - day),
                     EmptyTimeSpan,
                 )
             else:
                 return (
-                    TimeSpan(self.start_date, other.start_date - day),
-                    TimeSpan(other.end_date + day, self.end_date),
+                    self._from_trusted(self.start_date, other.start_date - day),
+                    self._from_trusted(other.end_date + day, self.end_date),
                 )
 
     def __repr__(self):
@@ -933,7 +1232,7 @@ class _EmptyTimeSpan:
         if isinstance(which, (TimeSpan, date, _EmptyTimeSpan)):
             return which
         else:  # pragma: no cover
-            raise TypeError
+            return NotImplemented
 
     __or__ = __add__
 
@@ -942,7 +1241,7 @@ class _EmptyTimeSpan:
         if isinstance(other, (TimeSpan, date, _EmptyTimeSpan)):
             return self
         else:  # pragma: no cover
-            raise TypeError
+            return NotImplemented
 
     __and__ = __mul__
 
@@ -1227,8 +1526,6 @@ class DateTimeSpan(TimeSpan):
         unchanged to the constructor.
 
         """
-        from xotl.tools.infinity import Infinity
-
         if isinstance(other, _EmptyTimeSpan):
             return other
         elif isinstance(other, date):  # pragma: no cover
@@ -1236,15 +1533,16 @@ class DateTimeSpan(TimeSpan):
         elif isinstance(other, TimeSpan):
             other = DateTimeSpan.from_timespan(other)
         elif not isinstance(other, TimeSpan):  # pragma: no cover
-            raise TypeError("Invalid type '%s'" % type(other).__name__)
-        start = max(self.start_datetime or -Infinity, other.start_datetime or -Infinity)
-        end = min(self.end_datetime or Infinity, other.end_datetime or Infinity)
-        if start <= end:
-            if start is -Infinity:
-                start = None
-            if end is Infinity:
-                end = None
-            return type(self)(start, end)
+            return NotImplemented
+        # None stands for the unbound ends
+        start, other_start = self.start_datetime, other.start_datetime
+        if start is None or (other_start is not None and other_start > start):
+            start = other_start
+        end, other_end = self.end_datetime, other.end_datetime
+        if end is None or (other_end is not None and other_end < end):
+            end = other_end
+        if start is None or end is None or start <= end:
+            return self._from_trusted(start, end)
         else:
             return EmptyTimeSpan
 
@@ -1274,7 +1572,7 @@ class DateTimeSpan(TimeSpan):
             delta = timedelta(days=delta)
         start = self.start_datetime - delta if self.start_datetime else None
         end = self.end_datetime - delta if self.end_datetime else None
-        return type(self)(start, end)
+        return self._from_trusted(start, end)
 
     def __rshift__(self, delta):
         # type: (Union[int, timedelta]) -> DateTimeSpan
@@ -1333,17 +1631,17 @@ class DateTimeSpan(TimeSpan):
             if self.start_datetime == other.start_datetime:
                 return (
                     EmptyTimeSpan,
-                    DateTimeSpan(other.end_datetime + sec, self.end_datetime),
+                    self._from_trusted(other.end_datetime + sec, self.end_datetime),
                 )
             elif self.end_datetime == other.end_datetime:
                 return (
-                    DateTimeSpan(self.start_datetime, other.start_datetime - sec),
+                    self._from_trusted(self.start_datetime, other.start_datetime - sec),
                     EmptyTimeSpan,
                 )
             else:
                 return (
-                    DateTimeSpan(self.start_datetime, other.start_datetime - sec),
-                    DateTimeSpan(other.end_datetime + sec, self.end_datetime),
+                    self._from_trusted(self.start_datetime, other.start_datetime - sec),
+                    self._from_trusted(other.end_datetime + sec, self.end_datetime),
                 )
 
     def __repr__(self):
@@ -1356,4 +1654,875 @@ class DateTimeSpan(TimeSpan):
     __str__ = __repr__
 
 
+_setattr = object.__setattr__
+
+
+class FrozenTimeSpan(TimeSpan):
+    """An immutable `TimeSpan`:class:.
+
+    Its dates are kept in slots, they are validated only by the constructor,
+    and the results of the operations (intersection, displacement, `diff
+    <TimeSpan.diff>`:meth:, etc.) are created without validating them again.
+    Use it when creating lots of spans.
+
+    Frozen time spans are equal (and have the same hash) to the
+    `TimeSpan`:class: with the same dates.
+
+    Since `TimeSpan`:class: has no slots, instances still have a
+    ``__dict__``; setting and deleting attributes raises an AttributeError,
+    but the dictionary itself isn't locked.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    __slots__ = ("start_date", "end_date")
+
+    def __init__(self, start_date=None, end_date=None):
+        _setattr(self, "start_date", TimeSpan.start_date.coerce(start_date))
+        _setattr(self, "end_date", TimeSpan.end_date.coerce(end_date))
+
+    @classmethod
+    def _from_trusted(cls, start, end):
+        self = object.__new__(cls)
+        _setattr(self, "start_date", start)
+        _setattr(self, "end_date", end)
+        return self
+
+    def replace(self, *, start_date: Optional[date] = Unset, end_date: Optional[date] = Unset):
+        """Create a copy with possibly changed attributes."""
+        if start_date is Unset:
+            start_date = self.start_date
+        if end_date is Unset:
+            end_date = self.end_date
+        return type(self)(start_date, end_date)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def __iter__(self):
+        return iter((self.start_date, self.end_date))
+
+    def __getitem__(self, index):
+        return (self.start_date, self.end_date)[index]
+
+    __hash__ = TimeSpan.__hash__
+
+    def __reduce__(self):
+        return type(self), (self.start_date, self.end_date)
+
+    def __repr__(self):
+        return "Frozen" + super().__repr__()
+
+    __str__ = __repr__
+
+
+class FrozenDateTimeSpan(DateTimeSpan):
+    """An immutable `DateTimeSpan`:class:.
+
+    See `FrozenTimeSpan`:class:.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    __slots__ = ("start_datetime", "end_datetime")
+
+    def __init__(self, start_datetime=None, end_datetime=None):
+        start = DateTimeSpan.start_datetime.coerce(start_datetime)
+        end = DateTimeSpan.end_datetime.coerce(end_datetime)
+        _setattr(self, "start_datetime", start)
+        _setattr(self, "end_datetime", end)
+
+    @classmethod
+    def _from_trusted(cls, start, end):
+        self = object.__new__(cls)
+        _setattr(self, "start_datetime", start)
+        _setattr(self, "end_datetime", end)
+        return self
+
+    @property
+    def start_date(self):
+        start = self.start_datetime
+        return start.date() if start is not None else None
+
+    @property
+    def end_date(self):
+        end = self.end_datetime
+        return end.date() if end is not None else None
+
+    def replace(
+        self,
+        *,
+        start_datetime: Optional[datetime] = Unset,
+        end_datetime: Optional[datetime] = Unset,
+    ):
+        """Create a copy with possibly changed attributes."""
+        if start_datetime is Unset:
+            start_datetime = self.start_datetime
+        if end_datetime is Unset:
+            end_datetime = self.end_datetime
+        return type(self)(start_datetime, end_datetime)
+
+    __setattr__ = FrozenTimeSpan.__setattr__
+    __delattr__ = FrozenTimeSpan.__delattr__
+
+    def __iter__(self):
+        return iter((self.start_datetime, self.end_datetime))
+
+    def __getitem__(self, index):
+        return (self.start_datetime, self.end_datetime)[index]
+
+    __hash__ = DateTimeSpan.__hash__
+
+    def __reduce__(self):
+        return type(self), (self.start_datetime, self.end_datetime)
+
+    def __repr__(self):
+        return "Frozen" + super().__repr__()
+
+    __str__ = __repr__
+
+
+class TimeSpanSet:
+    """An immutable set of dates made of disjoint time spans.
+
+    It can be built from any number of time spans, dates (a single day) and
+    other time span sets; the result is the union of all of them:
+
+    .. doctest::
+
+       >>> spans = TimeSpanSet(TimeSpan('2017-08-01', '2017-08-10'),
+       ...                     TimeSpan('2017-08-05', '2017-08-15'),
+       ...                     date(2017, 8, 16))
+       >>> list(spans)
+       [FrozenTimeSpan('2017-08-01', '2017-08-16')]
+
+    The spans are kept sorted and coalesced: neither overlapping nor adjacent
+    spans.  Iterating the set yields those spans (as `FrozenTimeSpan`:class:
+    objects) and `len` is the number of spans.
+
+    Sets support the set operations: union (``|``), intersection (``&``),
+    difference (``-``), symmetric difference (``^``), complement (``~``),
+    comparison by inclusion (``<=``, ``<``, etc.) and `isdisjoint`:meth:.
+    The other operand can be a time span set, a time span or a date.  The
+    spans of a `DateTimeSpanSet`:class: are coerced like date time spans are
+    (every date they touch is in), and the result is always of the type of
+    `self`.  All operations merge the sorted spans of both operands in
+    linear time.  A set is only equal to a set of the same kind with the same
+    spans, never to a time span or a date.
+
+    Ends unbound into the past or the future are kept as -`Infinity
+    <xotl.tools.infinity.Infinity>`:obj: and `Infinity
+    <xotl.tools.infinity.Infinity>`:obj:, so the complement of an empty set
+    is a single span unbound in both directions.
+
+    A date is `in <__contains__>`:meth: the set if any of its spans contains
+    it.  A time span is in the set if it's a subset of it.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    __slots__ = ("_starts", "_ends")
+
+    #: The type of the spans in the set.
+    span_type = FrozenTimeSpan
+
+    # The least distance between non-adjacent spans.
+    _unit = timedelta(days=1)
+
+    def __init__(self, *spans):
+        from xotl.tools.infinity import Infinity
+
+        bounds = []
+        for span in spans:
+            if isinstance(span, TimeSpanSet) and span.span_type is self.span_type:
+                bounds.extend(zip(span._starts, span._ends))
+            elif isinstance(span, _EmptyTimeSpan):
+                pass
+            else:
+                # The spans of a set of the other kind need to be coerced.
+                for which in span if isinstance(span, TimeSpanSet) else (span,):
+                    start, end = self._coerce_span(which)
+                    if start is None:
+                        start = -Infinity
+                    if end is None:
+                        end = Infinity
+                    if start <= end:
+                        bounds.append((start, end))
+        bounds.sort(key=_first)
+        self._set_bounds(self._coalesce(bounds))
+
+    @classmethod
+    def _coerce_span(cls, span):
+        """Protected method to get the (start, end) of `span`."""
+        if isinstance(span, date):
+            span = cls.span_type.from_date(span)
+        elif not isinstance(span, TimeSpan):
+            raise TypeError("Invalid type '%s'" % type(span).__name__)
+        return span.start_date, span.end_date
+
+    @classmethod
+    def _from_bounds(cls, bounds):
+        """Protected method to create a set from sorted, coalesced bounds."""
+        self = object.__new__(cls)
+        self._set_bounds(bounds)
+        return self
+
+    def _set_bounds(self, bounds):
+        if bounds:
+            self._starts, self._ends = map(tuple, zip(*bounds))
+        else:
+            self._starts = self._ends = ()
+
+    def _coalesce(self, bounds):
+        """Merge overlapping and adjacent spans of `bounds` sorted by start."""
+        unit = self._unit
+        res = []
+        for start, end in bounds:
+            if res:
+                last_start, last_end = res[-1]
+                if not isinstance(last_end, date):
+                    # It's unbound into the future, it includes the rest.
+                    break
+                if start <= last_end or (isinstance(start, date) and start - last_end <= unit):
+                    if end > last_end:
+                        res[-1] = (last_start, end)
+                    continue
+            res.append((start, end))
+        return res
+
+    def _complement(self):
+        """Return the bounds of the complement."""
+        from xotl.tools.infinity import Infinity
+
+        unit = self._unit
+        res = []
+        last = -Infinity
+        for start, end in zip(self._starts, self._ends):
+            if isinstance(start, date):
+                try:
+                    before = start - unit
+                except OverflowError:
+                    pass  # Nothing before the minimal date
+                else:
+                    res.append((last, before))
+            if isinstance(end, date):
+                try:
+                    last = end + unit
+                except OverflowError:
+                    return res  # Nothing after the maximal date
+            else:
+                return res
+        res.append((last, Infinity))
+        return res
+
+    def _intersection(self, starts, ends):
+        """Return the bounds of the intersection with other bounds."""
+        res = []
+        s1, e1, s2, e2 = self._starts, self._ends, starts, ends
+        i, j, n1, n2 = 0, 0, len(s1), len(s2)
+        while i < n1 and j < n2:
+            start, end = max(s1[i], s2[j]), min(e1[i], e2[j])
+            if start <= end:
+                res.append((start, end))
+            if e1[i] < e2[j]:
+                i += 1
+            else:
+                j += 1
+        return res
+
+    def _coerce(self, other):
+        """Return `other` as a set of the same type, or None."""
+        if isinstance(other, TimeSpanSet) and other.span_type is self.span_type:
+            return other
+        elif isinstance(other, (TimeSpanSet, TimeSpan, date, _EmptyTimeSpan)):
+            return type(self)(other)
+        else:
+            return None
+
+    def __or__(self, other):
+        """Return the union with `other`."""
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        bounds = merge(
+            zip(self._starts, self._ends),
+            zip(other._starts, other._ends),
+            key=_first,
+        )
+        return self._from_bounds(self._coalesce(bounds))
+
+    __ror__ = __or__
+
+    def __and__(self, other):
+        """Return the intersection with `other`."""
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return self._from_bounds(self._intersection(other._starts, other._ends))
+
+    __rand__ = __and__
+
+    def __sub__(self, other):
+        """Return the dates in `self` which are not in `other`."""
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return self & ~other
+
+    def __rsub__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return other - self
+
+    def __xor__(self, other):
+        """Return the dates in either `self` or `other` but not in both."""
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return (self - other) | (other - self)
+
+    __rxor__ = __xor__
+
+    def __invert__(self):
+        """Return the complement: the dates not in `self`."""
+        return self._from_bounds(self._complement())
+
+    def union(self, *others):
+        "Return ``self [| other1 | ...]``."
+        return reduce(operator.or_, others, self)
+
+    def intersection(self, *others):
+        "Return ``self [& other1 & ...]``."
+        return reduce(operator.and_, others, self)
+
+    def difference(self, *others):
+        "Return ``self [- other1 - ...]``."
+        return reduce(operator.sub, others, self)
+
+    def symmetric_difference(self, other):
+        "Return ``self ^ other``."
+        return self ^ other
+
+    def isdisjoint(self, other):
+        """True if `self` and `other` have no date in common."""
+        return not self & other
+
+    def __le__(self, other):
+        "True if `other` is a superset."
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return not self - other
+
+    issubset = __le__
+
+    def __ge__(self, other):
+        "True if `other` is a subset."
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return not other - self
+
+    issuperset = covers = __ge__
+
+    def __lt__(self, other):
+        "True if `other` is a proper superset."
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return self != other and self <= other
+
+    def __gt__(self, other):
+        "True if `other` is a proper subset."
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return self != other and self >= other
+
+    def __eq__(self, other):
+        if not isinstance(other, TimeSpanSet) or other.span_type is not self.span_type:
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __ne__(self, other):
+        res = self.__eq__(other)
+        return res if res is NotImplemented else not res
+
+    def __hash__(self):
+        return hash((TimeSpanSet, self._starts, self._ends))
+
+    def __contains__(self, other):
+        """Test if a date, or all the dates of a time span, are in the set."""
+        from bisect import bisect_right
+
+        if isinstance(other, date):
+            other = self._coerce_span(other)[0]
+            pos = bisect_right(self._starts, other) - 1
+            return pos >= 0 and other <= self._ends[pos]
+        elif isinstance(other, (TimeSpan, TimeSpanSet, _EmptyTimeSpan)):
+            return self._coerce(other) <= self
+        else:
+            return False
+
+    def __bool__(self):
+        return bool(self._starts)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        from xotl.tools.infinity import Infinity
+
+        new = self.span_type._from_trusted
+        for start, end in zip(self._starts, self._ends):
+            yield new(None if start is -Infinity else start, None if end is Infinity else end)
+
+    def __reduce__(self):
+        return type(self), tuple(self)
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join(map(repr, self)))
+
+    __str__ = __repr__
+
+
+class DateTimeSpanSet(TimeSpanSet):
+    """An immutable set of datetimes made of disjoint date time spans.
+
+    Like `TimeSpanSet`:class: but with `date time spans <DateTimeSpan>`:class:
+    (as in `DateTimeSpan.diff`:meth:, spans less than a second apart are
+    adjacent).  Dates are taken as the whole day.
+
+    The set is made of whole seconds: the microseconds of the bounds are
+    dropped, so a span covers every second it touches (its start is floored
+    and its end ceiled to the second); and a datetime is in the set if its
+    second is.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    __slots__ = ()
+
+    span_type = FrozenDateTimeSpan
+
+    _unit = timedelta(seconds=1)
+
+    @classmethod
+    def _coerce_span(cls, span):
+        if isinstance(span, date):
+            span = cls.span_type.from_datetime(span)
+        elif isinstance(span, TimeSpan):
+            span = cls.span_type.from_timespan(span)
+        else:
+            raise TypeError("Invalid type '%s'" % type(span).__name__)
+        return _to_second(span.start_datetime), _to_second(span.end_datetime)
+
+    def __contains__(self, other):
+        """Test if a datetime, or a date time span, are in the set.
+
+        Dates are taken as their first second (00:00:00), as in
+        `DateTimeSpan.__contains__`:meth:.
+
+        """
+        if isinstance(other, date) and not isinstance(other, datetime):
+            other = datetime(other.year, other.month, other.day)
+        return super().__contains__(other)
+
+    def __hash__(self):
+        return hash((DateTimeSpanSet, self._starts, self._ends))
+
+
+class TimeSpanIndex:
+    """An index of time spans, each with a value, for overlap queries.
+
+    It can be built from an iterable of ``(span, value)`` pairs.  The span
+    can be a `TimeSpan`:class: (possibly unbound) or a date (a single day):
+
+    .. doctest::
+
+       >>> bookings = TimeSpanIndex([
+       ...     (TimeSpan('2017-08-01', '2017-08-10'), 'Alice'),
+       ...     (TimeSpan('2017-08-05', '2017-08-15'), 'Bob'),
+       ...     (TimeSpan('2017-09-01'), 'Carol'),
+       ... ])
+       >>> [value for _, value in bookings.overlapping(TimeSpan('2017-08-09', '2017-08-20'))]
+       ['Alice', 'Bob']
+
+       >>> [value for _, value in bookings.containing(date(2017, 9, 15))]
+       ['Carol']
+
+       >>> bookings.nearest(date(2017, 8, 20))
+       (TimeSpan('2017-08-05', '2017-08-15'), 'Bob')
+
+    Spans can be added and removed afterwards with `add`:meth: and
+    `remove`:meth:.  The span itself is returned in the results, but the
+    index keeps the dates it had when it was added; so you should not change
+    a span while it's in the index.
+
+    The index is a balanced binary search tree (a treap) of the spans sorted
+    by their start, where each node also keeps the latest end of its subtree.
+    Adding or removing a span takes O(log n) time.  Queries skip the
+    subtrees which end before the query, but they may still visit the
+    ancestors of each match; so they return ``k`` spans in O(min(n, k log n))
+    time, instead of the O(n) of testing every span.  Iterating the index
+    yields the ``(span, value)`` pairs sorted by the start of the spans
+    (unbound into the past first).
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    __slots__ = ("_root", "_len", "_seq")
+
+    # The type of set whose coercion of dates and spans is used.
+    _set_type = TimeSpanSet
+
+    def __init__(self, items=()):
+        from random import random
+
+        nodes = []
+        for span, value in items:
+            start, end = self._bounds(span)
+            nodes.append(_SpanNode(start, end, 0, span, value, random()))
+        nodes.sort(key=operator.attrgetter("start"))
+        for seq, node in enumerate(nodes):
+            node.seq = seq
+        self._root = _SpanNode.build(nodes)
+        self._len = self._seq = len(nodes)
+
+    def _bounds(self, span):
+        """Protected method to get the (start, end) of `span`.
+
+        Unbound ends are -`Infinity <xotl.tools.infinity.Infinity>`:obj: and
+        `Infinity <xotl.tools.infinity.Infinity>`:obj:.
+
+        """
+        from xotl.tools.infinity import Infinity
+
+        start, end = self._set_type._coerce_span(span)
+        if start is None:
+            start = -Infinity
+        if end is None:
+            end = Infinity
+        if start > end:
+            raise ValueError("Invalid time span %r" % (span,))
+        return start, end
+
+    def _point(self, which):
+        """Protected method to get the date (or datetime) of `which`."""
+        if not isinstance(which, date):
+            raise TypeError("Invalid type '%s'" % type(which).__name__)
+        return self._set_type._coerce_span(which)[0]
+
+    def add(self, span, value=None):
+        """Add `span` with its `value` to the index."""
+        from random import random
+
+        start, end = self._bounds(span)
+        node = _SpanNode(start, end, self._seq, span, value, random())
+        self._root = _SpanNode.insert(self._root, node)
+        self._seq += 1
+        self._len += 1
+
+    def remove(self, span, value=None):
+        """Remove `span` with the given `value` from the index.
+
+        If the same span was added several times with equal values, only the
+        first one is removed.  Raise a KeyError if it's not in the index.
+
+        """
+        start, end = self._bounds(span)
+        for node in self._walk(start):
+            if node.start != start:
+                break
+            elif node.end == end and (node.value is value or node.value == value):
+                self._root = _SpanNode.remove(self._root, node)
+                self._len -= 1
+                return
+        raise KeyError((span, value))
+
+    def discard(self, span, value=None):
+        """Like `remove`:meth: but do nothing if it's not in the index."""
+        try:
+            self.remove(span, value)
+        except KeyError:
+            pass
+
+    def clear(self):
+        """Remove all the spans from the index."""
+        self._root = None
+        self._len = 0
+
+    def overlapping(self, span):
+        """Return the ``(span, value)`` pairs overlapping `span`.
+
+        `span` may also be a date, taken as the whole day (as in
+        `TimeSpan.from_date`:meth:).  In a `DateTimeSpanIndex`:class: that's
+        not the same as `containing`:meth:, which takes a date as its first
+        second.  The pairs are sorted by the start of their spans.
+
+        """
+        if isinstance(span, _EmptyTimeSpan):
+            return []
+        from xotl.tools.infinity import Infinity
+
+        start, end = self._set_type._coerce_span(span)
+        if start is None:
+            start = -Infinity
+        if end is None:
+            end = Infinity
+        if start > end:
+            return []
+        return [(node.span, node.value) for node in self._search(start, end)]
+
+    def containing(self, which):
+        """Return the ``(span, value)`` pairs whose span contains date `which`.
+
+        The pairs are sorted by the start of their spans.
+
+        """
+        which = self._point(which)
+        return [(node.span, node.value) for node in self._search(which, which)]
+
+    def nearest(self, which):
+        """Return the ``(span, value)`` pair whose span is nearest to `which`.
+
+        If several spans contain date `which`, return the one that starts
+        first.  Otherwise, return the span that ends or starts nearest to it;
+        if there's a tie, the one that ends before `which`.  Return None if
+        the index is empty.
+
+        """
+        which = self._point(which)
+        node = next(self._search(which, which), None)
+        if node is None:
+            # No span contains `which`, so every span that starts before
+            # `which` also ends before it.
+            before = _SpanNode.latest_end(self._root, which)
+            after = next(self._walk(which), None)
+            if before is None or (after is not None and after.start - which < which - before.end):
+                node = after
+            else:
+                node = before
+        return (node.span, node.value) if node is not None else None
+
+    def _search(self, start, end):
+        """Yield the nodes overlapping the bounds sorted by their start."""
+        stack = []
+        node = self._root
+        while True:
+            if node is not None and node.maxend >= start:
+                stack.append(node)
+                node = node.left
+            elif stack:
+                node = stack.pop()
+                if node.start > end:
+                    return
+                if node.end >= start:
+                    yield node
+                node = node.right
+            else:
+                return
+
+    def _walk(self, start):
+        """Yield the nodes which start at or after `start` in order."""
+        stack = []
+        node = self._root
+        while True:
+            if node is not None:
+                if node.start < start:
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.left
+            elif stack:
+                node = stack.pop()
+                yield node
+                node = node.right
+            else:
+                return
+
+    def __iter__(self):
+        from xotl.tools.infinity import Infinity
+
+        for node in self._walk(-Infinity):
+            yield node.span, node.value
+
+    def __len__(self):
+        return self._len
+
+    def __bool__(self):
+        return self._root is not None
+
+    def __reduce__(self):
+        return type(self), (list(self),)
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, list(self))
+
+    __str__ = __repr__
+
+
+class DateTimeSpanIndex(TimeSpanIndex):
+    """An index of date time spans, each with a value, for overlap queries.
+
+    Like `TimeSpanIndex`:class: but with `date time spans
+    <DateTimeSpan>`:class:.  Time spans and dates are taken as whole days,
+    except in `containing`:meth: and `nearest`:meth: where a date is taken as
+    its first second (00:00:00), as in `DateTimeSpan.__contains__`:meth:.
+    Like in `DateTimeSpanSet`:class:, the microseconds are dropped.
+
+    .. versionadded:: 3.4.0
+
+    """
+
+    __slots__ = ()
+
+    _set_type = DateTimeSpanSet
+
+
+class _SpanNode:
+    """A node of the tree in `TimeSpanIndex`:class:."""
+
+    __slots__ = ("start", "end", "seq", "span", "value", "priority", "maxend", "left", "right")
+
+    def __init__(self, start, end, seq, span, value, priority):
+        self.start = start
+        self.end = self.maxend = end
+        self.seq = seq
+        self.span = span
+        self.value = value
+        self.priority = priority
+        self.left = self.right = None
+
+    def update(self):
+        maxend = self.end
+        left, right = self.left, self.right
+        if left is not None and left.maxend > maxend:
+            maxend = left.maxend
+        if right is not None and right.maxend > maxend:
+            maxend = right.maxend
+        self.maxend = maxend
+
+    def precedes(self, other):
+        return self.start < other.start or (self.start == other.start and self.seq < other.seq)
+
+    @staticmethod
+    def build(nodes):
+        """Return the root of the tree of the sorted `nodes`."""
+        stack = []
+        for node in nodes:
+            last = None
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+                last.update()
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+        root = stack[0] if stack else None
+        while stack:
+            stack.pop().update()
+        return root
+
+    @staticmethod
+    def insert(root, node):
+        if root is None:
+            return node
+        elif node.priority > root.priority:
+            node.left, node.right = _SpanNode.split(root, node)
+            node.update()
+            return node
+        elif node.precedes(root):
+            root.left = _SpanNode.insert(root.left, node)
+        else:
+            root.right = _SpanNode.insert(root.right, node)
+        root.update()
+        return root
+
+    @staticmethod
+    def split(root, pivot):
+        """Split the tree in the nodes before `pivot` and the rest."""
+        if root is None:
+            return None, None
+        elif root.precedes(pivot):
+            root.right, rest = _SpanNode.split(root.right, pivot)
+            root.update()
+            return root, rest
+        else:
+            before, root.left = _SpanNode.split(root.left, pivot)
+            root.update()
+            return before, root
+
+    @staticmethod
+    def merge(first, second):
+        """Merge two trees, all nodes in `first` precede those in `second`."""
+        if first is None:
+            return second
+        elif second is None:
+            return first
+        elif first.priority > second.priority:
+            first.right = _SpanNode.merge(first.right, second)
+            first.update()
+            return first
+        else:
+            second.left = _SpanNode.merge(first, second.left)
+            second.update()
+            return second
+
+    @staticmethod
+    def remove(root, node):
+        if root is node:
+            return _SpanNode.merge(node.left, node.right)
+        elif node.precedes(root):
+            root.left = _SpanNode.remove(root.left, node)
+        else:
+            root.right = _SpanNode.remove(root.right, node)
+        root.update()
+        return root
+
+    @staticmethod
+    def latest_end(root, which):
+        """Return the node with the latest end among those starting before
+        `which`.
+
+        """
+        best = end = None  # The node or subtree with the latest end so far.
+        node = root
+        while node is not None:
+            if node.start <= which:
+                left = node.left
+                if left is not None and (best is None or left.maxend > end):
+                    best, end = left, left.maxend
+                if best is None or node.end > end:
+                    best, end = node, node.end
+                node = node.right
+            else:
+                node = node.left
+        node = best
+        while node is not None and node.end != end:
+            if node.left is not None and node.left.maxend == end:
+                node = node.left
+            else:
+                node = node.right
+        return node
+
+
+def _first(pair):
+    return pair[0]
+
+
+def _to_second(dt):
+    """Drop the microseconds of `dt`, which may be None."""
+    return dt.replace(microsecond=0) if dt is not None and dt.microsecond else dt
+
+
 del IntEnum
@@ -1,4 +1,5 @@
 # flake8: noqa
+from array import array
 from datetime import *
 from typing import *
 
@@ -11,6 +12,8 @@ def strfdelta(delta: timedelta) -> str: ...
 def strftime(dt: date, fmt: str) -> str: ...
 def parse_date(value: Optional[str] = None) -> date: ...
 def parse_datetime(value: Optional[str] = None) -> datetime: ...
+def compile_date_parser(fmt: str = "%Y-%m-%d") -> Callable[[str], date]: ...
+def compile_datetime_parser(fmt: str = "%Y-%m-%d %H:%M:%S") -> Callable[[str], datetime]: ...
 def get_month_first(ref: Optional[date] = None) -> date: ...
 def get_month_last(ref: Optional[date] = None) -> date: ...
 def get_next_month(ref: Optional[date] = None, lastday: bool = False) -> date: ...
@@ -71,6 +74,11 @@ def get_previous_saturday(ref: date) -> date: ...
 def get_previous_sunday(ref: datetime) -> datetime: ...
 @overload
 def get_previous_sunday(ref: date) -> date: ...
+def daterange_ordinals(*args: Union[date, int, None]) -> array[int]: ...
+def daterange_datetime64(*args: Union[date, int, None]) -> Any: ...
+def get_month_first_many(ordinals: Any) -> Any: ...
+def get_month_last_many(ordinals: Any) -> Any: ...
+def get_next_weekday_many(ordinals: Any, weekday: int) -> Any: ...
 
 class flextime(timedelta):
     @classmethod
@@ -138,3 +146,88 @@ class DateTimeSpan(TimeSpan):
     def diff(self, other: TimeSpan) -> Tuple["DateTimeSpan", "DateTimeSpan"]: ...
 
 EmptyTimeSpan: DateTimeSpan
+
+class FrozenTimeSpan(TimeSpan):
+    @property  # type: ignore[override]
+    def start_date(self) -> Optional[date]: ...
+    @property  # type: ignore[override]
+    def end_date(self) -> Optional[date]: ...
+    def replace(
+        self, *, start_date: Optional[date] = ..., end_date: Optional[date] = ...
+    ) -> "FrozenTimeSpan": ...
+    def __hash__(self) -> int: ...
+    def __and__(self, other: TimeSpan) -> "FrozenTimeSpan": ...
+    def __lshift__(self, delta: Union[int, timedelta]) -> "FrozenTimeSpan": ...
+    def __rshift__(self, delta: Union[int, timedelta]) -> "FrozenTimeSpan": ...
+    def intersection(self, *others: TimeSpan) -> "FrozenTimeSpan": ...
+    def diff(self, other: TimeSpan) -> Tuple["FrozenTimeSpan", "FrozenTimeSpan"]: ...
+
+class FrozenDateTimeSpan(DateTimeSpan):
+    @property  # type: ignore[override]
+    def start_datetime(self) -> Optional[datetime]: ...
+    @property  # type: ignore[override]
+    def end_datetime(self) -> Optional[datetime]: ...
+    @property  # type: ignore[override]
+    def start_date(self) -> Optional[date]: ...
+    @property  # type: ignore[override]
+    def end_date(self) -> Optional[date]: ...
+    def replace(
+        self, *, start_datetime: Optional[datetime] = ..., end_datetime: Optional[datetime] = ...
+    ) -> "FrozenDateTimeSpan": ...
+    def __hash__(self) -> int: ...
+    def __and__(self, other: TimeSpan) -> "FrozenDateTimeSpan": ...
+    def __lshift__(self, delta: Union[int, timedelta]) -> "FrozenDateTimeSpan": ...
+    def __rshift__(self, delta: Union[int, timedelta]) -> "FrozenDateTimeSpan": ...
+    def intersection(self, *others: TimeSpan) -> "FrozenDateTimeSpan": ...
+    def diff(self, other: TimeSpan) -> Tuple["FrozenDateTimeSpan", "FrozenDateTimeSpan"]: ...
+
+_SpanLike = Union["TimeSpanSet", TimeSpan, date]
+_TSS = TypeVar("_TSS", bound="TimeSpanSet")
+
+class TimeSpanSet:
+    span_type: ClassVar[Type[TimeSpan]]
+    def __init__(self, *spans: _SpanLike) -> None: ...
+    def __or__(self: _TSS, other: _SpanLike) -> _TSS: ...
+    def __ror__(self: _TSS, other: _SpanLike) -> _TSS: ...
+    def __and__(self: _TSS, other: _SpanLike) -> _TSS: ...
+    def __rand__(self: _TSS, other: _SpanLike) -> _TSS: ...
+    def __sub__(self: _TSS, other: _SpanLike) -> _TSS: ...
+    def __rsub__(self: _TSS, other: _SpanLike) -> _TSS: ...
+    def __xor__(self: _TSS, other: _SpanLike) -> _TSS: ...
+    def __rxor__(self: _TSS, other: _SpanLike) -> _TSS: ...
+    def __invert__(self: _TSS) -> _TSS: ...
+    def union(self: _TSS, *others: _SpanLike) -> _TSS: ...
+    def intersection(self: _TSS, *others: _SpanLike) -> _TSS: ...
+    def difference(self: _TSS, *others: _SpanLike) -> _TSS: ...
+    def symmetric_difference(self: _TSS, other: _SpanLike) -> _TSS: ...
+    def isdisjoint(self, other: _SpanLike) -> bool: ...
+    def __le__(self, other: _SpanLike) -> bool: ...
+    def issubset(self, other: _SpanLike) -> bool: ...
+    def __ge__(self, other: _SpanLike) -> bool: ...
+    def issuperset(self, other: _SpanLike) -> bool: ...
+    def covers(self, other: _SpanLike) -> bool: ...
+    def __lt__(self, other: _SpanLike) -> bool: ...
+    def __gt__(self, other: _SpanLike) -> bool: ...
+    def __hash__(self) -> int: ...
+    def __contains__(self, other: object) -> bool: ...
+    def __bool__(self) -> bool: ...
+    def __len__(self) -> int: ...
+    def __iter__(self) -> Iterator[FrozenTimeSpan]: ...
+
+class DateTimeSpanSet(TimeSpanSet):
+    def __iter__(self) -> Iterator[FrozenDateTimeSpan]: ...  # type: ignore[override]
+
+class TimeSpanIndex:
+    def __init__(self, items: Iterable[Tuple[Union[TimeSpan, date], Any]] = ...) -> None: ...
+    def add(self, span: Union[TimeSpan, date], value: Any = None) -> None: ...
+    def remove(self, span: Union[TimeSpan, date], value: Any = None) -> None: ...
+    def discard(self, span: Union[TimeSpan, date], value: Any = None) -> None: ...
+    def clear(self) -> None: ...
+    def overlapping(self, span: Union[TimeSpan, date]) -> List[Tuple[Any, Any]]: ...
+    def containing(self, which: date) -> List[Tuple[Any, Any]]: ...
+    def nearest(self, which: date) -> Optional[Tuple[Any, Any]]: ...
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]: ...
+    def __len__(self) -> int: ...
+    def __bool__(self) -> bool: ...
+
+class DateTimeSpanIndex(TimeSpanIndex): ...